@@ -17,6 +17,7 @@ set -e
 if [ "X$DJANGO_RUN_MIGRATIONS" = 'Xyes' ]; then
     echo "running migrations"
     python manage.py migrate --noinput
+    python manage.py createcachetable --database cache
 
     if [ "X$DJANGO_RECREATE_TEST_DATA" = 'Xyes' ]; then
         echo "clearing data from the database"
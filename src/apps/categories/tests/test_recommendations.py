@@ -1,5 +1,7 @@
 from datetime import timedelta as delta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
@@ -8,7 +10,7 @@ from rest_framework.test import APITestCase, APIClient
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.categories.views import UpsaleRecommendationsView
 from src.apps.core import utils
-from src.apps.masters.models import Master, TimeSlot, Time
+from src.apps.masters.models import Master, TimeSlot
 from src.utils.object_creation import make_everything, make_client
 
 
@@ -24,9 +26,9 @@ class RecommendationTestCase(APITestCase):
     def test_recommendation(self):
         master = Master.objects.get(first_name='VASYA')
         schedule = master.get_schedule(timezone.now() + delta(days=1))
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+        TimeSlot.objects.create(start=13 * 60,
                                 taken=False, schedule=schedule)
         services = list(master.services.all())
         order_service = services[0]
@@ -46,3 +48,54 @@ class RecommendationTestCase(APITestCase):
             'master_id': master.id,
             'service_id': services[1].id
         }])
+
+    def _recommend(self, order_items):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(
+                reverse(UpsaleRecommendationsView.view_name), data={
+                    'date': utils.get_date(1),
+                    'time': '11:00',
+                    'order_items': order_items
+                }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data, len(queries)
+
+    def test_recommendation_constant_queries(self):
+        vasya = Master.objects.get(first_name='VASYA')
+        petya = Master.objects.get(first_name='PETYA')
+        vasya_services = list(vasya.services.all())
+        schedule = vasya.get_schedule(timezone.now() + delta(days=1))
+        TimeSlot.objects.create(start=12 * 60 + 30,
+                                taken=False, schedule=schedule)
+        TimeSlot.objects.create(start=13 * 60,
+                                taken=False, schedule=schedule)
+        _, single_item_queries = self._recommend([{
+            'locked': False,
+            'master_id': vasya.id,
+            'service_ids': [vasya_services[0].id]
+        }])
+
+        data, queries = self._recommend([{
+            'locked': False,
+            'master_id': vasya.id,
+            'service_ids': [vasya_services[0].id]
+        }, {
+            'locked': False,
+            'master_id': petya.id,
+            'service_ids': [service.id for service in petya.services.all()]
+        }, {
+            'locked': False,
+            'master_id': vasya.id,
+            'service_ids': [service.id for service in vasya_services]
+        }, {
+            # does not exist
+            'locked': False,
+            'master_id': 100500,
+            'service_ids': [vasya_services[0].id]
+        }])
+        self.assertEqual(queries, single_item_queries)
+        # petya and the second vasya's item have no other services
+        self.assertEqual(data, [{
+            'master_id': vasya.id,
+            'service_id': vasya_services[1].id
+        }])
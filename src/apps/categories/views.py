@@ -158,13 +158,17 @@ class UpsaleRecommendationsView(views.APIView):
         order_time = serializer.validated_data['time']
         order_items = serializer.validated_data['order_items']
 
+        # durations of all ordered services in a single query
+        durations = dict(Service.objects.filter(
+            pk__in={service_id for item in order_items
+                    for service_id in item['service_ids']}
+        ).values_list('id', 'max_duration'))
         for item in order_items:
             # expected service execution start time
             item['time'] = add_time(
                 source_time=order_time,
-                minutes=sum(
-                    [service.max_duration for service in
-                     Service.objects.filter(pk__in=item['service_ids'])]))
+                minutes=sum(durations.get(service_id, 0)
+                            for service_id in set(item['service_ids'])))
 
         result = master_utils.upsale_search(order_items, order_date)
         return Response(data=result)
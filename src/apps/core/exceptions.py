@@ -12,6 +12,10 @@ class ApplicationError(Exception):
         PAYMENT_ERROR = 200
         APPLICATION_ERROR = 300
         ORDER_CREATION_ERROR = 310
+        # time slots were booked by someone else in the meantime
+        ORDER_SLOT_TAKEN = 311
+        # an unpaid order has lost its time slots
+        ORDER_HOLD_EXPIRED = 312
         ORDER_START_TOO_EARLY = 320
         ORDER_START_WRONG_DAY = 321
 
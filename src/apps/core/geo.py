@@ -0,0 +1,101 @@
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371
+# size of a grid cell in degrees, roughly 11 km along a meridian
+CELL_SIZE = 0.1
+_COLUMNS = int(360 / CELL_SIZE)
+# searching for more cells than that is pointless,
+# the bounding box does the job just fine
+MAX_CELLS = 400
+
+
+def distances(lat, lon, points):
+    """
+    Returns great circle distances in km from the point
+    to each of the (lat, lon) `points`.
+    Trigonometry of the origin is computed once for all points
+    """
+    lat, lon = math.radians(lat), math.radians(lon)
+    sin_lat, cos_lat = math.sin(lat), math.cos(lat)
+
+    result = []
+    for point_lat, point_lon in points:
+        point_lat = math.radians(point_lat)
+        value = cos_lat * math.cos(point_lat) * \
+                math.cos(math.radians(point_lon) - lon) + \
+                sin_lat * math.sin(point_lat)
+        # rounding errors may push the value out of acos domain
+        result.append(EARTH_RADIUS_KM * math.acos(min(1.0, max(-1.0, value))))
+    return result
+
+
+def cell(lat, lon):
+    """
+    Returns the id of the grid cell containing the point
+    """
+    row = int(math.floor((lat + 90) / CELL_SIZE))
+    column = int(math.floor((lon + 180) / CELL_SIZE)) % _COLUMNS
+    return row * _COLUMNS + column
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Returns (min_lat, max_lat, min_lon, max_lon) of the box containing
+    the circle of `radius_km` around the point or None if the box
+    covers a pole or crosses the 180th meridian
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return None
+
+    # the widest part of the circle is closer to the pole
+    widest_lat = max(abs(min_lat), abs(max_lat))
+    delta_lon = math.degrees(
+        radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(widest_lat))))
+    min_lon, max_lon = lon - delta_lon, lon + delta_lon
+    if min_lon < -180 or max_lon >= 180:
+        return None
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def cells_in_box(box):
+    """
+    Returns ids of all grid cells intersecting the `box`
+    or None if there are more than MAX_CELLS of them
+    """
+    min_lat, max_lat, min_lon, max_lon = box
+    first, last = cell(min_lat, min_lon), cell(max_lat, max_lon)
+    first_row, first_column = divmod(first, _COLUMNS)
+    last_row, last_column = divmod(last, _COLUMNS)
+
+    rows = last_row - first_row + 1
+    columns = last_column - first_column + 1
+    if rows * columns > MAX_CELLS:
+        return None
+    return [row * _COLUMNS + column
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)]
+
+
+def within_radius(lat, lon, radius_km, prefix=''):
+    """
+    Returns a Q object that selects locations which may lie
+    within `radius_km` from the point. The check is coarse,
+    exact distances should be verified afterwards
+
+    :param prefix: lookup path to the location, e.g. 'location__'
+    """
+    box = bounding_box(lat, lon, radius_km)
+    if not box:
+        return Q()
+
+    min_lat, max_lat, min_lon, max_lon = box
+    query = Q(**{f'{prefix}lat__gte': min_lat, f'{prefix}lat__lte': max_lat,
+                 f'{prefix}lon__gte': min_lon, f'{prefix}lon__lte': max_lon})
+    cells = cells_in_box(box)
+    if cells is not None:
+        query &= Q(**{f'{prefix}cell__in': cells})
+    return query
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2018-02-06 10:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from src.apps.core import geo
+
+
+def fill_cells(apps, schema_editor):
+    Location = apps.get_model('core', 'Location')
+    for location in Location.objects.iterator():
+        location.cell = geo.cell(location.lat, location.lon)
+        location.save(update_fields=['cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='cell',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='location',
+            index_together=set([('lat', 'lon')]),
+        ),
+        migrations.RunPython(fill_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from django.db import models
+from django.dispatch import receiver
+
+from . import geo
+from .models import Location
+
+
+@receiver(models.signals.pre_save, sender=Location)
+def add_location_cell(sender, instance, **kwargs):
+    """
+    Adds a grid 'cell' to the Location instance
+    """
+    instance.cell = geo.cell(instance.lat, instance.lon)
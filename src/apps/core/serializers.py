@@ -24,4 +24,4 @@ class LocationSerializer(serializers.ModelSerializer):
     # TODO both fields are required
     class Meta:
         model = Location
-        exclude = ('id',)
+        exclude = ('id', 'cell')
@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from src.apps.core import geo
+from src.apps.core.models import Location
+
+
+class GeoTestCase(TestCase):
+    def test_cell(self):
+        self.assertEqual(geo.cell(10.01, 11.01), geo.cell(10.09, 11.09))
+        self.assertNotEqual(geo.cell(10.01, 11.01), geo.cell(10.11, 11.01))
+        self.assertNotEqual(geo.cell(10.01, 11.01), geo.cell(10.01, 11.11))
+
+    def test_bounding_box_contains_circle(self):
+        lat, lon = 55.03, 82.92
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, 20)
+        location = Location(lat=lat, lon=lon)
+        self.assertAlmostEqual(location.distance(max_lat, lon), 20, places=3)
+        self.assertAlmostEqual(location.distance(min_lat, lon), 20, places=3)
+        self.assertGreater(location.distance(lat, max_lon), 20)
+        self.assertGreater(location.distance(lat, min_lon), 20)
+
+    def test_huge_radius(self):
+        self.assertIsNone(geo.bounding_box(55.03, 82.92, 10 ** 6))
+        self.assertIsNone(geo.bounding_box(10, 179.9, 20))
+
+    def test_cells_in_box(self):
+        box = geo.bounding_box(10.05, 11.05, 5)
+        self.assertEqual(geo.cells_in_box(box), [geo.cell(10.05, 11.05)])
+        box = geo.bounding_box(10.05, 11.05, 20)
+        # about 0.18 degrees each way
+        self.assertEqual(len(geo.cells_in_box(box)), 25)
+        box = geo.bounding_box(10.05, 11.05, 500)
+        self.assertIsNone(geo.cells_in_box(box))
+
+    def test_location_cell(self):
+        location = Location.objects.create(lat=10.05, lon=11.05)
+        self.assertEqual(location.cell, geo.cell(10.05, 11.05))
+        location.lat = 20.05
+        location.save()
+        self.assertEqual(Location.objects.get(pk=location.pk).cell,
+                         geo.cell(20.05, 11.05))
+
+    def test_within_radius(self):
+        near = Location.objects.create(lat=10.05, lon=11.05)
+        Location.objects.create(lat=10.05, lon=12.05)
+        found = Location.objects.filter(geo.within_radius(10.0, 11.0, 20))
+        self.assertEqual(list(found), [near])
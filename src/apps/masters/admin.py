@@ -1,11 +1,12 @@
 from django.contrib import admin
 
 from .models import Schedule, TimeSlot, Master, Feedback, PortfolioImage, \
-    Balance
+    Balance, ScheduleTemplate
 
 admin.site.register(Master)
 admin.site.register(Balance)
 admin.site.register(Schedule)
 admin.site.register(TimeSlot)
+admin.site.register(ScheduleTemplate)
 admin.site.register(Feedback)
 admin.site.register(PortfolioImage)
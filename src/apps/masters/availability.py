@@ -0,0 +1,295 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from src.apps.clients.models import Address
+from . import gmaps_utils, time_slot_utils
+from .models import DayAvailability, Master, Schedule, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilitySnapshot:
+    """
+    An in-memory snapshot of everything the filtering functions need
+    to know about a set of masters: their services, schedules
+    within the date range and time slots of those schedules.
+
+    The snapshot is loaded in a fixed number of queries regardless
+    of the number of masters, schedules or slots, after that
+    all lookups are done in memory
+    """
+
+    def __init__(self, masters: Iterable[Master], date_from, date_to):
+        self.masters = list(masters)
+        master_ids = [master.id for master in self.masters]
+        logger.info(f'Loading availability snapshot for '
+                    f'{len(master_ids)} masters, '
+                    f'dates=[{date_from}, {date_to}]')
+
+        self._services = defaultdict(list)
+        master_services = Master.services.through.objects.filter(
+            master_id__in=master_ids).select_related('service')
+        for master_service in master_services:
+            self._services[master_service.master_id].append(
+                master_service.service)
+
+        self._schedules = defaultdict(list)
+        # orders and home addresses of clients are needed
+        # to check if a master can get to the next client
+        schedules = Schedule.objects.filter(
+            master_id__in=master_ids,
+            date__gte=date_from,
+            date__lte=date_to).order_by('date').prefetch_related(
+            Prefetch('time_slots',
+                     queryset=TimeSlot.objects.select_related(
+                         'order_item__order__client')),
+            Prefetch('time_slots__order_item__order__client__addresses',
+                     queryset=Address.objects.select_related('location')))
+        for schedule in schedules:
+            self._schedules[schedule.master_id].append(schedule)
+        self._day_masks = {}
+        self._slot_maps = {}
+
+    def services(self, master: Master, service_ids=None):
+        """
+        Returns services of the `master`, optionally limited
+        to the ones with ids in `service_ids`
+        """
+        services = self._services[master.id]
+        if service_ids is None:
+            return list(services)
+        # ids may come as strings straight from the query params
+        service_ids = {int(service_id) for service_id in service_ids}
+        return [service for service in services if service.id in service_ids]
+
+    def schedules(self, master: Master):
+        """
+        Returns schedules of the `master` ordered by date
+        """
+        return self._schedules[master.id]
+
+    def schedule(self, master: Master, date):
+        """
+        Returns the schedule of the `master` at `date` or None
+        """
+        for schedule in self._schedules[master.id]:
+            if schedule.date == date:
+                return schedule
+        return None
+
+    @staticmethod
+    def time_slots(schedule: Schedule, time_from=None):
+        """
+        Returns time slots of the `schedule` ordered by time,
+        optionally starting from `time_from`
+        """
+        time_slots = sorted(schedule.time_slots.all(),
+                            key=lambda slot: slot.value)
+        if time_from is not None:
+            time_slots = [slot for slot in time_slots
+                          if slot.value >= time_from]
+        return time_slots
+
+    def slot_map(self, schedule: Schedule):
+        """
+        Returns a `gmaps_utils.make_slot_map` map of the `schedule`
+        """
+        slot_map = self._slot_maps.get(schedule.id)
+        if slot_map is None:
+            slot_map = gmaps_utils.make_slot_map(schedule.time_slots.all())
+            self._slot_maps[schedule.id] = slot_map
+        return slot_map
+
+    def day_mask(self, schedule: Schedule):
+        """
+        Returns a `time_slot_utils.DayMask` of the `schedule`
+        """
+        day_mask = self._day_masks.get(schedule.id)
+        if day_mask is None:
+            day_mask = time_slot_utils.make_day_mask(
+                schedule.time_slots.all())
+            self._day_masks[schedule.id] = day_mask
+        return day_mask
+
+
+# ids of schedules whose availability updates are postponed
+# by `deferred_updates` in the current thread
+_deferred = threading.local()
+
+
+def _deferred_schedule_ids():
+    return getattr(_deferred, 'schedule_ids', None)
+
+
+@contextmanager
+def deferred_updates():
+    """
+    Postpones availability updates of modified time slots until
+    the end of the block and then refreshes every affected schedule once.
+    Should be used for batch modifications of time slots
+    """
+    if _deferred_schedule_ids() is not None:
+        # nested block, the outermost one does the job
+        yield
+        return
+
+    _deferred.schedule_ids = set()
+    try:
+        yield
+    finally:
+        schedule_ids = _deferred.schedule_ids
+        _deferred.schedule_ids = None
+    for schedule_id in schedule_ids:
+        refresh_schedule(schedule_id)
+
+
+def _fill(availability: DayAvailability, free: int, exists: int):
+    availability.free_mask = free
+    availability.exists_mask = exists
+    availability.longest_free_run = time_slot_utils.longest_run(free)
+    if free:
+        availability.earliest_free_start = time_slot_utils.slot_time(
+            time_slot_utils.mask_indices(free & -free)[0])
+    else:
+        availability.earliest_free_start = None
+
+
+def refresh_schedule(schedule_id):
+    """
+    Recomputes availability of the schedule from its time slots
+    """
+    try:
+        schedule = Schedule.objects.get(pk=schedule_id)
+    except Schedule.DoesNotExist:
+        # deleted in the meantime, the availability is gone as well
+        return
+
+    with transaction.atomic():
+        # slots are read after the row is locked, so that concurrent
+        # refreshes of the schedule don't overwrite each other
+        availability = DayAvailability.objects.select_for_update() \
+            .filter(schedule=schedule).first()
+        if availability is None:
+            availability, _ = DayAvailability.objects.get_or_create(
+                schedule=schedule, defaults={'master_id': schedule.master_id,
+                                             'date': schedule.date})
+        day_mask = time_slot_utils.make_day_mask(
+            TimeSlot.objects.filter(schedule=schedule))
+        _fill(availability, day_mask.free, day_mask.exists)
+        availability.save()
+    logger.debug(f'Refreshed {availability}')
+
+
+# ids of schedules to refresh after the current transaction commits
+_on_commit = threading.local()
+
+
+def _refresh_committed():
+    schedule_ids = getattr(_on_commit, 'schedule_ids', None)
+    _on_commit.schedule_ids = set()
+    # the same order of locking for everyone
+    for schedule_id in sorted(schedule_ids or ()):
+        refresh_schedule(schedule_id)
+
+
+def refresh_on_commit(schedule_id):
+    """
+    Refreshes availability of the schedule once the current transaction
+    commits. Unlike flipping bits in place, this doesn't keep the
+    availability row locked till the end of the transaction, so bookings
+    of a master on the same day only wait for each other on their slots
+    """
+    schedule_ids = _deferred_schedule_ids()
+    if schedule_ids is not None:
+        schedule_ids.add(schedule_id)
+        return
+
+    if getattr(_on_commit, 'schedule_ids', None) is None:
+        _on_commit.schedule_ids = set()
+    _on_commit.schedule_ids.add(schedule_id)
+    # the first callback to run refreshes everything, the rest find nothing
+    transaction.on_commit(_refresh_committed)
+
+
+def replace_schedules(day_masks):
+    """
+    Replaces availability rows of schedules at once.
+    Should be used when time slots are created or deleted in bulk
+
+    :param day_masks: list of (Schedule, DayMask) tuples
+    """
+    DayAvailability.objects.filter(
+        schedule_id__in=[schedule.id for schedule, _ in day_masks]).delete()
+    availabilities = []
+    for schedule, day_mask in day_masks:
+        availability = DayAvailability(schedule_id=schedule.id,
+                                       master_id=schedule.master_id,
+                                       date=schedule.date)
+        _fill(availability, day_mask.free, day_mask.exists)
+        availabilities.append(availability)
+    DayAvailability.objects.bulk_create(availabilities, batch_size=500)
+
+
+def schedule_saved(schedule: Schedule):
+    """
+    Makes sure there is an availability row for the `schedule`
+    """
+    availability, created = DayAvailability.objects.get_or_create(
+        schedule=schedule,
+        defaults={'master_id': schedule.master_id, 'date': schedule.date})
+    if not created and availability.date != schedule.date:
+        availability.date = schedule.date
+        availability.save()
+
+
+def slot_changed(time_slot: TimeSlot, deleted=False):
+    """
+    Flips the bits of the `time_slot` in the availability of its schedule
+    """
+    schedule_ids = _deferred_schedule_ids()
+    if schedule_ids is not None:
+        schedule_ids.add(time_slot.schedule_id)
+        return
+
+    with transaction.atomic():
+        try:
+            availability = DayAvailability.objects.select_for_update().get(
+                schedule_id=time_slot.schedule_id)
+            bit = 1 << time_slot_utils.slot_index(time_slot.value)
+        except DayAvailability.DoesNotExist:
+            if not deleted:
+                refresh_schedule(time_slot.schedule_id)
+            # otherwise the whole schedule is being deleted
+            return
+
+        free = availability.free_mask
+        exists = availability.exists_mask
+        if deleted:
+            free &= ~bit
+            exists &= ~bit
+        else:
+            exists |= bit
+            if time_slot.taken:
+                free &= ~bit
+            else:
+                free |= bit
+        _fill(availability, free, exists)
+        availability.save()
+
+
+def masters_with_free_run(slot_number, date_from, date_to):
+    """
+    Returns ids of masters who have at least `slot_number` adjacent
+    free slots on any date between `date_from` and `date_to`
+
+    :return: a values queryset, that may be used as a subquery
+    """
+    return DayAvailability.objects.filter(
+        date__gte=date_from, date__lte=date_to,
+        longest_free_run__gte=slot_number).values('master_id')
@@ -0,0 +1,64 @@
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import CacheVersion
+
+logger = logging.getLogger(__name__)
+
+# versions without a row
+INITIAL_VERSION = 1
+
+_pending = threading.local()
+
+
+def get_many(keys):
+    """
+    Returns a dict of key -> current version
+    """
+    versions = dict(CacheVersion.objects.filter(key__in=keys)
+                    .values_list('key', 'version'))
+    return {key: versions.get(key, INITIAL_VERSION) for key in keys}
+
+
+def get(key):
+    return get_many([key])[key]
+
+
+def _bump(keys):
+    updated = CacheVersion.objects.filter(key__in=keys).update(
+        version=F('version') + 1)
+    if updated == len(keys):
+        return
+    existing = set(CacheVersion.objects.filter(key__in=keys)
+                   .values_list('key', flat=True))
+    for key in keys:
+        if key not in existing:
+            # a concurrent bump may have created it, that's enough
+            CacheVersion.objects.get_or_create(
+                key=key, defaults={'version': INITIAL_VERSION + 1})
+
+
+def _flush():
+    keys = getattr(_pending, 'keys', None)
+    _pending.keys = set()
+    if keys:
+        logger.debug(f'Bumping cache versions of {keys}')
+        _bump(list(keys))
+
+
+def bump(*keys):
+    """
+    Bumps versions of `keys` once the current transaction is committed,
+    so that nothing is cached under the new versions before the data
+    is visible, and no version row stays locked till the end of a request.
+    Each key is bumped once per transaction
+    """
+    if getattr(_pending, 'keys', None) is None:
+        _pending.keys = set()
+    _pending.keys.update(keys)
+    # the first callback to run bumps everything, the rest find nothing.
+    # Keys of rolled back transactions are bumped by the next commit
+    transaction.on_commit(_flush)
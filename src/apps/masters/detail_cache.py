@@ -0,0 +1,85 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache_versions
+
+logger = logging.getLogger(__name__)
+
+# parts of the detailed representation of a master,
+# which are cached and invalidated independently
+PROFILE = 'profile'
+PORTFOLIO = 'portfolio'
+FEEDBACK = 'feedback'
+SCHEDULE = 'schedule'
+FRAGMENTS = (PROFILE, PORTFOLIO, FEEDBACK, SCHEDULE)
+
+# changes to services affect profiles of all masters
+VERSION_KEY = 'masters:detail:version'
+
+
+def _version_key(master_id, fragment):
+    return f'masters:detail:{master_id}:{fragment}:version'
+
+
+def _versions(master_id):
+    """
+    Returns a dict of version key -> current version
+    """
+    return cache_versions.get_many(
+        [VERSION_KEY] + [_version_key(master_id, fragment)
+                         for fragment in FRAGMENTS])
+
+
+def invalidate(master_id, *fragments):
+    """
+    Drops cached `fragments` of a master, all of them if none are given.
+    Takes effect once the current transaction commits
+    """
+    logger.debug(f'Dropping cached {fragments or FRAGMENTS} '
+                 f'of master {master_id}')
+    cache_versions.bump(*[_version_key(master_id, fragment)
+                          for fragment in fragments or FRAGMENTS])
+
+
+def invalidate_all():
+    """
+    Drops all cached fragments of all masters
+    once the current transaction commits
+    """
+    cache_versions.bump(VERSION_KEY)
+
+
+def get_fragments(master_id, variant, builders: dict):
+    """
+    Returns cached fragments of a master, missing ones are built and cached
+
+    :param master_id:
+    :param variant: anything else the fragments depend on, e.g. the host
+    that is used in urls of images
+    :param builders: a dict of fragment -> function, which builds it
+    :return: a dict of fragment -> data
+    """
+    versions = _versions(master_id)
+    digest = hashlib.md5(repr(variant).encode('utf-8')).hexdigest()
+    keys = {
+        fragment: f'masters:detail:{versions[VERSION_KEY]}:{master_id}:'
+                  f'{fragment}:{versions[_version_key(master_id, fragment)]}:'
+                  f'{digest}'
+        for fragment in builders
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    result = {}
+    missing = {}
+    for fragment, key in keys.items():
+        if key in cached:
+            result[fragment] = cached[key]
+        else:
+            logger.info(f'Building {fragment} of master {master_id}')
+            result[fragment] = missing[key] = builders[fragment]()
+    if missing:
+        cache.set_many(missing, timeout=settings.DETAIL_CACHE_TIMEOUT_SECONDS)
+    return result
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'gmaps:eta'
+# coordinates are rounded to ~100 m
+COORDINATES_PRECISION = 3
+# traffic is assumed to be the same within a bucket on the same weekday
+BUCKET_MINUTES = 15
+
+
+class LRUCache:
+    """
+    A tiny thread-safe in-process LRU cache with expiring entries
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value, timeout):
+        with self._lock:
+            self._items[key] = value, time.monotonic() + timeout
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_local = LRUCache(settings.ETA_CACHE_LRU_SIZE)
+_stats = Counter()
+
+
+def make_key(coords_from: tuple, coords_to: tuple, departure_time: datetime):
+    """
+    Returns a cache key for a trip between snapped coordinates
+    starting on the weekday and within the time bucket of `departure_time`
+    """
+    points = ':'.join(f'{lat:.{COORDINATES_PRECISION}f},'
+                      f'{lon:.{COORDINATES_PRECISION}f}'
+                      for lat, lon in (coords_from, coords_to))
+    bucket = (departure_time.hour * 60 +
+              departure_time.minute) // BUCKET_MINUTES
+    return f'{KEY_PREFIX}:{points}:{departure_time.weekday()}:{bucket}'
+
+
+def get(key):
+    """
+    Returns a cached ETA in seconds or None,
+    looking in the in-process tier first and then in the shared one
+    """
+    eta = _local.get(key)
+    if eta is not None:
+        _stats['local_hits'] += 1
+        return eta
+
+    eta = cache.get(key)
+    if eta is not None:
+        _stats['shared_hits'] += 1
+        _local.put(key, eta, settings.ETA_CACHE_TIMEOUT_SECONDS)
+        return eta
+
+    _stats['misses'] += 1
+    logger.info(f'ETA cache miss for {key}. stats={stats()}')
+    return None
+
+
+def put(key, eta):
+    _local.put(key, eta, settings.ETA_CACHE_TIMEOUT_SECONDS)
+    cache.set(key, eta, timeout=settings.ETA_CACHE_TIMEOUT_SECONDS)
+
+
+def stats():
+    """
+    Returns a dict with numbers of hits of each tier and misses
+    """
+    return {
+        'local_hits': _stats['local_hits'],
+        'shared_hits': _stats['shared_hits'],
+        'misses': _stats['misses'],
+    }
+
+
+def clear():
+    """
+    Clears the in-process tier and the counters
+    """
+    _local.clear()
+    _stats.clear()
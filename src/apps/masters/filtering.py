@@ -1,4 +1,7 @@
+import base64
+import binascii
 import datetime
+import json
 import logging
 import time
 from collections import defaultdict
@@ -13,15 +16,36 @@ from rest_framework.exceptions import ValidationError
 from src.apps.categories.models import Service
 from src.apps.masters.time_slot_utils import add_time
 from . import time_slot_utils, gmaps_utils, utils
+from .availability import AvailabilitySnapshot
 from .models import Master
 
 available_params = ['date_range', 'time_range', 'services',
                     'service', 'coordinates', 'distance', 'date',
-                    'time']
+                    'time', 'limit', 'cursor']
 
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(position: tuple):
+    """
+    Encodes a position in a ranked list of masters into an opaque string
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps(list(position)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str):
+    """
+    Decodes a string made by `encode_cursor` or raises ValueError
+    """
+    try:
+        group, score, master_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return int(group), float(score), int(master_id)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise ValueError(f'invalid cursor {cursor}')
+
+
 class FilteringParams:
     def __init__(self, query_params: dict, client=None, request=None,
                  coords_required=True, ignore_taken_slots=False):
@@ -38,6 +62,8 @@ class FilteringParams:
         if coords_required:
             self.coordinates = self._parse_coordinates(query_params)
         self.distance = self._parse_distance(query_params)
+        self.limit = self._parse_limit(query_params)
+        self.cursor = self._parse_cursor(query_params)
 
         if client:
             self.target_client = client
@@ -162,6 +188,33 @@ class FilteringParams:
             logger.debug(f'Parsed distance {distance}')
             return float(distance)
 
+    @staticmethod
+    def _parse_limit(query_params):
+        limit = query_params.get('limit')
+        if not limit:
+            logger.debug(f'No limit param')
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError("'limit' parameter must be an integer")
+        if limit <= 0:
+            raise ValidationError("'limit' parameter must be positive")
+        logger.debug(f'Parsed limit {limit}')
+        return limit
+
+    @staticmethod
+    def _parse_cursor(query_params):
+        cursor = query_params.get('cursor')
+        if not cursor:
+            return None
+        try:
+            position = decode_cursor(cursor)
+            logger.debug(f'Parsed cursor {position}')
+            return position
+        except ValueError:
+            raise ValidationError('Invalid cursor')
+
     @staticmethod
     def _parse_client(request):
         # hail python magic
@@ -221,25 +274,26 @@ class FilteringFunctions(Enum):
         time = params.time
         target_client = params.target_client
 
-        logger.info(f'Using a datetime filter on masters {masters} '
+        snapshot = AvailabilitySnapshot(masters, date, date)
+        logger.info(f'Using a datetime filter on masters {snapshot.masters} '
                     f'with params: services={service_ids}, date={date}, '
                     f'time={time}, client_id={target_client.id}, '
                     f'client_name={target_client.first_name}')
 
         result = set()
         good_slots = defaultdict(list)
-        for master in masters:
+        for master in snapshot.masters:
             logger.info(f'Checking master {master.first_name}')
 
             duration = sum([service.max_duration for service in
-                            master.services.filter(pk__in=service_ids)])
-            schedule = master.get_schedule(date)
+                            snapshot.services(master, service_ids)])
+            schedule = snapshot.schedule(master, date)
             if not schedule:
                 continue
 
             can_service = time_slot_utils \
-                .duration_fits_into_slots(
-                    duration, schedule.time_slots.all(),
+                .duration_fits_into_mask(
+                    duration, snapshot.day_mask(schedule),
                     time_from=time,
                     time_to=add_time(time, minutes=duration),
                     ignore_taken_slots=params.ignore_taken_slots)
@@ -247,7 +301,8 @@ class FilteringFunctions(Enum):
                         f'{service_ids} on {date} = {can_service}')
             # checking the closest order that goes before `time`
             if can_service and gmaps_utils.can_reach(
-                    schedule, target_client.home_address.location, time):
+                    schedule, target_client.home_address.location, time,
+                    slot_map=snapshot.slot_map(schedule)):
                 logger.info(f'Selecting master {master.first_name}')
                 result.add(master)
             good_slots[master.id].append({
@@ -271,56 +326,65 @@ class FilteringFunctions(Enum):
         service_ids = params.services
         target_client = params.target_client
 
-        logger.info(f'Using an anytime filter on masters {masters} '
+        snapshot = AvailabilitySnapshot(masters, *date_range)
+        logger.info(f'Using an anytime filter on masters {snapshot.masters} '
                     f'with params: services={service_ids}, '
                     f'date_range={date_range}, '
                     f'client_id={target_client.id}, '
                     f'client_name={target_client.first_name}')
 
-        result = set()
-        good_slots = defaultdict(list)
-        for master in masters:
+        # collecting all slot groups first, so that the possibility
+        # to get to the client is checked in a single batch
+        reachability = gmaps_utils.BatchReachability(
+            target_client.home_address.location)
+        candidates = []
+        for master in snapshot.masters:
             logger.info(f'Checking master {master.first_name}')
             duration = sum([service.max_duration for service in
-                            master.services.filter(pk__in=service_ids)])
-            for schedule in master.schedule.filter(date__gte=date_range[0],
-                                                   date__lte=date_range[1]):
+                            snapshot.services(master, service_ids)])
+            for schedule in snapshot.schedules(master):
                 logger.info(f'Checking schedule on {schedule.date}')
-                schedule_slots = []
                 # finding all slots that can be used to do the service
                 # TODO will break in case of multiple timezones
-
+                day_mask = snapshot.day_mask(schedule)
                 if schedule.date == timezone.now().date():
-                    time_slots = schedule.time_slots.filter(
-                        time__value__gte=timezone.now().time())
-                else:
-                    time_slots = schedule.time_slots.all()
-
-                start_slots = \
-                    time_slot_utils.find_available_starting_slots_for_duration(
-                        duration, time_slots)
-
-                logger.info(f'Possible starting slots = \"'
-                            f'{[slot.time for slot in start_slots]}\"')
-                groups = time_slot_utils.split_slots(start_slots)
+                    day_mask = time_slot_utils.clip_mask(
+                        day_mask, time_from=timezone.now().time())
+
+                start_mask = \
+                    time_slot_utils.find_available_starting_slots_mask(
+                        duration, day_mask)
+
+                groups = [[time_slot_utils.slot_time(index) for index in group]
+                          for group in time_slot_utils.split_mask(start_mask)]
+                logger.info(f'Possible starting slots = \"{groups}\"')
                 for group in groups:
-                    # checking if the master can get to the next address in time
-                    logger.info(f'Checking first slot {group[0].value} '
-                                f'in a group {group}')
-                    if gmaps_utils.can_reach(schedule,
-                                             target_client.home_address.location,
-                                             group[0].value):
-                        result.add(master)
-                        for slot in group:
-                            schedule_slots.append(
-                                datetime.time.strftime(slot.value, '%H:%M'))
-                    logger.info(f'Selected slots {schedule_slots}')
-
-                if schedule_slots:
-                    good_slots[master.id].append({
-                        'date': schedule.date.strftime('%Y-%m-%d'),
-                        'time_slots': schedule_slots
-                    })
+                    reachability.add(schedule, group[0],
+                                     slot_map=snapshot.slot_map(schedule))
+                candidates.append((master, schedule, groups))
+
+        reachability.resolve()
+
+        result = set()
+        good_slots = defaultdict(list)
+        for master, schedule, groups in candidates:
+            schedule_slots = []
+            for group in groups:
+                # checking if the master can get to the next address in time
+                logger.info(f'Checking first slot {group[0]} '
+                            f'in a group {group}')
+                if reachability.can_reach(schedule, group[0]):
+                    result.add(master)
+                    for slot_time in group:
+                        schedule_slots.append(
+                            datetime.time.strftime(slot_time, '%H:%M'))
+                logger.info(f'Selected slots {schedule_slots}')
+
+            if schedule_slots:
+                good_slots[master.id].append({
+                    'date': schedule.date.strftime('%Y-%m-%d'),
+                    'time_slots': schedule_slots
+                })
 
         return result, good_slots
 
@@ -337,7 +401,8 @@ class FilteringFunctions(Enum):
         date_range = params.date_range
         time_range = params.time_range
 
-        logger.info(f'Using an search filter on masters {masters} '
+        snapshot = AvailabilitySnapshot(masters, *date_range)
+        logger.info(f'Using an search filter on masters {snapshot.masters} '
                     f'with params: date_range={date_range}, '
                     f'time_range={time_range}, '
                     f'and all services')
@@ -345,15 +410,15 @@ class FilteringFunctions(Enum):
         # taking the maximum duration of all services of the master and
         # checking if there exists a required number of adjacent empty slots
         result = set()
-        for master in masters:
+        for master in snapshot.masters:
             logger.info(f'Checking master {master.first_name}')
             # checking if a master can do any service during his work day
-            service = min(master.services.all(), key=lambda _: _.max_duration)
-            for schedule in master.schedule.filter(date__gte=date_range[0],
-                                                   date__lte=date_range[1]):
+            service = min(snapshot.services(master),
+                          key=lambda _: _.max_duration)
+            for schedule in snapshot.schedules(master):
                 logger.info(f'Checking schedule on {schedule.date}')
-                if time_slot_utils.service_fits_into_slots(
-                        service, schedule.time_slots.all(),
+                if time_slot_utils.duration_fits_into_mask(
+                        service.max_duration, snapshot.day_mask(schedule),
                         time_from=time_range[0],
                         time_to=time_range[1]):
                     logger.info(f'Master can do one of the services '
@@ -1,4 +1,6 @@
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import googlemaps
@@ -7,6 +9,7 @@ from googlemaps import exceptions as gmaps_exceptions
 
 from src.apps.core.exceptions import ApplicationError
 from src.apps.core.models import Location
+from src.apps.masters import eta_cache, travel_estimator
 from src.apps.masters.models import Schedule, TimeSlot
 
 gmaps = googlemaps.Client(key=settings.GMAPS_API_KEY)
@@ -15,6 +18,11 @@ logger = logging.getLogger(__name__)
 DURATION_SECONDS = TimeSlot.DURATION * 60
 MAX_DURATION = 1_000_000_000
 
+# distance matrix API limits
+MAX_MATRIX_DIMENSION = 25
+MAX_MATRIX_ELEMENTS = 100
+MAX_CONCURRENT_REQUESTS = 4
+
 
 # TODO exception handling
 def _calculate_eta(coords_from: tuple, coords_to: tuple,
@@ -53,46 +61,280 @@ def _calculate_eta(coords_from: tuple, coords_to: tuple,
         return seconds
 
 
-def can_reach(schedule: Schedule, location: Location, time: datetime.time):
+def calculate_eta(coords_from: tuple, coords_to: tuple,
+                  departure_time: datetime):
+    """
+    Same as `_calculate_eta`, but the results are cached,
+    see `eta_cache.py`
     """
+    if not settings.USE_ETA_CACHE:
+        eta_seconds = _calculate_eta(coords_from, coords_to, departure_time)
+        travel_estimator.calibrate(coords_from, coords_to, departure_time,
+                                   eta_seconds)
+        return eta_seconds
 
-    :param schedule:
-    :param location:
-    :param time:
-    :return: True if it's possible to reach `location` at `time`
-    considering `schedule`
+    key = eta_cache.make_key(coords_from, coords_to, departure_time)
+    eta_seconds = eta_cache.get(key)
+    if eta_seconds is None:
+        eta_seconds = _calculate_eta(coords_from, coords_to, departure_time)
+        travel_estimator.calibrate(coords_from, coords_to, departure_time,
+                                   eta_seconds)
+        eta_cache.put(key, eta_seconds)
+    return eta_seconds
+
+
+def _estimate_reachability(trip: tuple):
     """
-    if not settings.USE_GMAPS_API:
-        logger.info(f'GMAPS_API is disabled. can_reach=True')
-        return True
+    Checks if the trip obviously takes less or more than a slot
+    using the local travel time estimator
 
-    logger.info(f'Checking if a master can reach '
-                f'client on {schedule.date} at {time}')
+    :return: True or False, or None if the estimate is too close
+    to the slot duration and the API should be called
+    """
+    if not settings.USE_TRAVEL_ESTIMATOR:
+        return None
+
+    eta_seconds = travel_estimator.estimate(*trip)
+    band = DURATION_SECONDS * settings.TRAVEL_ESTIMATE_BAND
+    result = None
+    if eta_seconds < DURATION_SECONDS - band:
+        result = True
+    elif eta_seconds > DURATION_SECONDS + band:
+        result = False
+    travel_estimator.count(avoided=result is not None)
+    logger.info(f'Estimated travel time {int(eta_seconds)}s. '
+                f'can_reach={result}')
+    return result
+
+
+def _chunks(items: list, size: int):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _distance_matrix(maps_client, origins: list, destinations: list,
+                     departure_time: datetime):
+    """
+    Calculates estimated times of travel between each of `origins`
+    and each of `destinations` at specified `departure_time`
+    in a single distance matrix request
+
+    :return: dict of ETAs in seconds by (origin, destination, departure_time)
+    """
+    try:
+        logger.info(f'Calling GMaps API to get a distance matrix. '
+                    f'From {origins} To {destinations} at {departure_time}')
+        response = maps_client.distance_matrix(
+            origins, destinations, mode="driving", language='en',
+            departure_time=departure_time + timedelta(hours=7))
+    except gmaps_exceptions.ApiError as error:
+        raise ApplicationError(error)
+    except Exception as ex:
+        raise ApplicationError(ex)
+
+    etas = {}
+    for origin, row in zip(origins, response.get('rows', [])):
+        for destination, element in zip(destinations,
+                                         row.get('elements', [])):
+            duration = element.get('duration_in_traffic',
+                                   element.get('duration'))
+            if element.get('status') == 'OK' and duration:
+                eta_seconds = duration['value']
+            else:
+                eta_seconds = MAX_DURATION
+            etas[(origin, destination, departure_time)] = eta_seconds
+    return etas
+
+
+def resolve_etas(trips, maps_client=None):
+    """
+    Calculates estimated times of travel for many
+    (coords_from, coords_to, departure_time) trips at once.
+    Trips are grouped by departure time and resolved with distance matrix
+    requests, chunked to the API limits and executed concurrently
+
+    :param maps_client: googlemaps.Client or anything that quacks like it
+    :return: dict of ETAs in seconds by trip
+    """
+    maps_client = maps_client or gmaps
+    result = {}
+    pending = defaultdict(set)
+    for trip in set(trips):
+        eta_seconds = None
+        if settings.USE_ETA_CACHE:
+            eta_seconds = eta_cache.get(eta_cache.make_key(*trip))
+        if eta_seconds is not None:
+            result[trip] = eta_seconds
+        else:
+            pending[trip[2]].add(trip)
+
+    requests = []
+    for departure_time, departure_trips in pending.items():
+        origins = sorted({trip[0] for trip in departure_trips})
+        destinations = sorted({trip[1] for trip in departure_trips})
+        for destination_chunk in _chunks(destinations, MAX_MATRIX_DIMENSION):
+            origin_chunk_size = min(
+                MAX_MATRIX_DIMENSION,
+                MAX_MATRIX_ELEMENTS // len(destination_chunk))
+            for origin_chunk in _chunks(origins, origin_chunk_size):
+                requests.append((origin_chunk, destination_chunk,
+                                 departure_time))
+    if not requests:
+        return result
+
+    logger.info(f'Resolving {len(result) + sum(map(len, pending.values()))} '
+                f'trips, {len(result)} are cached, '
+                f'making {len(requests)} distance matrix requests')
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS,
+                                            len(requests))) as executor:
+        responses = list(executor.map(
+            lambda request: _distance_matrix(maps_client, *request),
+            requests))
+
+    for etas in responses:
+        for trip, eta_seconds in etas.items():
+            travel_estimator.calibrate(*trip, eta_seconds)
+            if trip in pending[trip[2]]:
+                result[trip] = eta_seconds
+                if settings.USE_ETA_CACHE:
+                    eta_cache.put(eta_cache.make_key(*trip), eta_seconds)
+    return result
+
+
+def make_slot_map(time_slots):
+    """
+    Builds a map of slot time -> (taken, location of the client) for
+    `time_slots` of a single schedule. Slots should have their orders,
+    clients and addresses preloaded, otherwise it costs a few queries
+    per taken slot
+    """
+    slot_map = {}
+    for slot in time_slots:
+        location = None
+        if slot.taken and slot.order_item:
+            # wow, that's a long call chain
+            location = slot.order_item.order.client.home_address.location
+        slot_map[slot.value] = slot.taken, location
+    return slot_map
+
+
+def _previous_trip(schedule: Schedule, location: Location,
+                   time: datetime.time, slot_map: dict = None):
+    """
+    Returns a (coords_from, coords_to, departure_time) trip a master
+    has to make to get to `location` at `time` or None if there's no trip
 
+    :param slot_map: made by `make_slot_map`, loaded from db if None
+    """
     dt = datetime.combine(schedule.date, time) - \
          timedelta(minutes=TimeSlot.DURATION)
 
     prev_time = dt.time()
 
     logger.info(f'Selecting previous slot at {prev_time}')
-    prev_slot = schedule.get_slot(prev_time)
-    if prev_slot:
+    if slot_map is None:
+        prev_slot = schedule.get_slot(prev_time)
+        slot_map = make_slot_map([prev_slot] if prev_slot else [])
+    if prev_time in slot_map:
+        taken, prev_location = slot_map[prev_time]
         # we assume that a person can get anywhere within an hour
-        if not prev_slot.taken:
+        if not taken:
             logger.info(f'Previous slot for slot at {time} is empty. '
                         f'can_reach=True')
-            return True
+            return None
+        if not prev_location:
+            logger.info(f'Previous slot for slot at {time} is taken '
+                        f'without an order. can_reach=True')
+            return None
 
-        # wow, that's a long call chain
-        prev_address = prev_slot.order_item.order.client.home_address
-        eta_seconds = _calculate_eta(prev_address.location.as_tuple(),
-                                     location.as_tuple(), dt)
-        # can get to the point in 30 minutes * 60
-        result = eta_seconds < DURATION_SECONDS
-        logger.info(f'Gmaps produced a result. can_reach={result}')
-        return result
+        return prev_location.as_tuple(), location.as_tuple(), dt
     else:
         logger.info(f'Slot at {time} is the first slot of the day. '
                     f'can_reach=True')
         # first slot of the day?
+        return None
+
+
+def can_reach(schedule: Schedule, location: Location, time: datetime.time,
+              slot_map: dict = None):
+    """
+
+    :param schedule:
+    :param location:
+    :param time:
+    :param slot_map: preloaded slots of the `schedule`, see `make_slot_map`
+    :return: True if it's possible to reach `location` at `time`
+    considering `schedule`
+    """
+    if not settings.USE_GMAPS_API:
+        logger.info(f'GMAPS_API is disabled. can_reach=True')
         return True
+
+    logger.info(f'Checking if a master can reach '
+                f'client on {schedule.date} at {time}')
+
+    trip = _previous_trip(schedule, location, time, slot_map)
+    if not trip:
+        return True
+
+    estimate = _estimate_reachability(trip)
+    if estimate is not None:
+        return estimate
+
+    eta_seconds = calculate_eta(*trip)
+    # can get to the point in 30 minutes * 60
+    result = eta_seconds < DURATION_SECONDS
+    logger.info(f'Gmaps produced a result. can_reach={result}')
+    return result
+
+
+class BatchReachability:
+    """
+    Answers `can_reach` questions about many slots of many schedules
+    for a single `location`.
+
+    All slots should be added first, then `resolve` calculates every trip
+    in a few batched requests, see `resolve_etas`
+    """
+
+    def __init__(self, location: Location, maps_client=None):
+        self.location = location
+        self.maps_client = maps_client
+        self._trips = {}
+        self._estimates = {}
+        self._etas = {}
+
+    def add(self, schedule: Schedule, time: datetime.time,
+            slot_map: dict = None):
+        """
+        :param slot_map: preloaded slots of the `schedule`,
+        see `make_slot_map`
+        """
+        if not settings.USE_GMAPS_API:
+            return
+        self._trips[(schedule.id, time)] = _previous_trip(
+            schedule, self.location, time, slot_map)
+
+    def resolve(self):
+        trips = {trip for trip in self._trips.values() if trip}
+        for trip in trips:
+            self._estimates[trip] = _estimate_reachability(trip)
+        trips = [trip for trip in trips if self._estimates[trip] is None]
+        self._etas = resolve_etas(trips, self.maps_client)
+
+    def can_reach(self, schedule: Schedule, time: datetime.time):
+        """
+        :return: True if it's possible to reach the location at `time`
+        considering `schedule`
+        """
+        if not settings.USE_GMAPS_API:
+            logger.info(f'GMAPS_API is disabled. can_reach=True')
+            return True
+
+        trip = self._trips[(schedule.id, time)]
+        if not trip:
+            return True
+        if self._estimates[trip] is not None:
+            return self._estimates[trip]
+        result = self._etas[trip] < DURATION_SECONDS
+        logger.info(f'Distance matrix produced a result. can_reach={result}')
+        return result
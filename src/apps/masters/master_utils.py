@@ -2,31 +2,44 @@ import heapq
 import logging
 from typing import Iterable
 
+from django.db.models import Min
+
+from src.apps.categories.models import Service
 from src.apps.clients.models import Client
-from src.apps.masters import time_slot_utils
-from src.apps.masters.filtering import FilteringParams
-from src.apps.masters.models import Master, MasterStatus
-from src.apps.masters.serializers import SimpleMasterSerializer
+from src.apps.core import geo
+from src.apps.masters import availability, search_cache, time_slot_utils, \
+    travel_estimator
+from src.apps.masters.filtering import FilteringFunctions, FilteringParams, \
+    encode_cursor
+from src.apps.masters.models import Master, MasterStatus, TimeSlot
+from src.apps.orders.models import OrderItem
+from src.apps.masters.serializers import serialize_master_list
 
 logger = logging.getLogger(__name__)
 
 
-class MasterComparable:
-    def __init__(self, master, value):
-        self.master = master
-        self.value = value
-
-    def __lt__(self, other):
-        # max sort
-        return other.value < self.value
-
-
 def _evaluate_master(distance, max_distance, rating,
                      max_rating=Master.MAX_RATING):
     return (1 - (distance / max_distance)) * 3 + (rating / max_rating) * 7
 
 
-def sort_masters(masters: Iterable[Master], coordinates: tuple,
+def master_distances(masters: Iterable[Master], coordinates: tuple):
+    """
+    Returns a dict of distances from `coordinates` to each of the `masters`
+    by master id, computed in a single pass
+    """
+    masters = list(masters)
+    located = [master for master in masters if master.location]
+    distances = dict.fromkeys([master.id for master in masters],
+                              Master.NO_DISTANCE)
+    distances.update(zip(
+        [master.id for master in located],
+        geo.distances(*coordinates,
+                      [master.location.as_tuple() for master in located])))
+    return distances
+
+
+def rank_masters(masters: Iterable[Master], coordinates: tuple,
                  max_distance: float):
     """
     Sorts `masters` according to rating and distance to `coordinates`
@@ -35,16 +48,46 @@ def sort_masters(masters: Iterable[Master], coordinates: tuple,
     :param max_distance:
     :param masters:
     :param coordinates:
-    :return:
+    :return: <tuple> sorted list of masters, dict of distances by master id
     """
-    result = []
-    for master in masters:
-        distance = master.distance(*coordinates) if coordinates else 0
-        value = _evaluate_master(distance=distance,
-                                 max_distance=max_distance,
-                                 rating=master.rating)
-        heapq.heappush(result, MasterComparable(master, value))
-    return [comp.master for comp in result]
+    masters = list(masters)
+    if coordinates:
+        distances = master_distances(masters, coordinates)
+    else:
+        distances = {master.id: 0 for master in masters}
+
+    scores = {master.id: _evaluate_master(distance=distances[master.id],
+                                          max_distance=max_distance,
+                                          rating=master.rating)
+              for master in masters}
+    # ids make the order total
+    masters.sort(key=lambda master: (-scores[master.id], master.id))
+    return masters, distances
+
+
+def sort_masters(masters: Iterable[Master], coordinates: tuple,
+                 max_distance: float):
+    """
+    Same as `rank_masters`, but returns only the sorted list
+    """
+    masters, _ = rank_masters(masters, coordinates, max_distance)
+    return masters
+
+
+def _min_slot_number(params: FilteringParams, filter_function):
+    """
+    Returns the number of adjacent free slots every master
+    accepted by the `filter_function` is guaranteed to have
+    """
+    if params.ignore_taken_slots:
+        return 0
+    services = Service.objects.all()
+    # the search filter checks the shortest service of a master,
+    # others check the requested services
+    if filter_function is not FilteringFunctions.search:
+        services = services.filter(id__in=params.services)
+    duration = services.aggregate(Min('max_duration'))['max_duration__min']
+    return int((duration or 0) / TimeSlot.DURATION)
 
 
 def search(params: FilteringParams, filter_function):
@@ -57,12 +100,27 @@ def search(params: FilteringParams, filter_function):
     logger.info(f'Initiating master search with params: '
                 f'date_range={date_range}, services={services}, '
                 f'coordinates={coordinates}, max_distance={max_distance}')
+    travel_estimator.start_counting()
+    # only masters who have enough free slots on any of the dates
+    # according to the availability table
+    # only the datetime filter is limited to a single date
+    if params.date and filter_function is FilteringFunctions.datetime:
+        dates = (params.date, params.date)
+    else:
+        dates = date_range
+    slot_number = _min_slot_number(params, filter_function)
+    master_ids = availability.masters_with_free_run(slot_number, *dates)
     # queryset
-    queryset = Master.objects.filter(schedule__date__gte=date_range[0],
-                                     schedule__date__lte=date_range[1],
+    # services, schedules and time slots are loaded by the filter function
+    # in a single AvailabilitySnapshot, no need to prefetch them here
+    # masters outside of the search radius are dropped by the grid cell
+    # and bounding box of their location, exact distance is checked later
+    in_radius = geo.within_radius(*coordinates, max_distance,
+                                  prefix='location__')
+    queryset = Master.objects.filter(in_radius,
+                                     id__in=master_ids,
                                      services__in=services,
                                      status=MasterStatus.VERIFIED).distinct() \
-        .prefetch_related('services').prefetch_related('schedule__time_slots') \
         .select_related('location')
 
     # search filter
@@ -70,40 +128,83 @@ def search(params: FilteringParams, filter_function):
 
     logger.info(f'Found {len(masters)} masters. Running distance filter')
     # distance filter
-    masters = list(filter(lambda m: m.distance(*coordinates) < max_distance,
-                          masters))
+    distances = master_distances(masters, coordinates)
+    masters = [master for master in masters
+               if distances[master.id] < max_distance]
     logger.info(f'Total masters found: {len(masters)}')
+    avoided, made = travel_estimator.counters()
+    logger.info(f'Travel time estimator avoided {avoided} '
+                f'of {avoided + made} gmaps calls')
+    return masters, slots
+
+
+def cached_search(params: FilteringParams, filter_function):
+    """
+    Same as `search`, but the results are cached for a short period
+    of time and shared between clients, see `search_cache.py`.
+    Personal parts, like splitting favorites, should be done afterwards
+    """
+    key = search_cache.make_key(params, filter_function)
+    cached = search_cache.get_result(key)
+    if cached is not None:
+        master_ids, slots = cached
+        logger.info(f'Using cached search results, '
+                    f'{len(master_ids)} masters')
+        masters = Master.objects.filter(id__in=master_ids) \
+            .select_related('location')
+        return list(masters), slots
+
+    masters, slots = search(params, filter_function)
+    search_cache.store_result(key, [master.id for master in masters], slots)
     return masters, slots
 
 
 def upsale_search(order_items, order_date):
     """
     Returns masters and services that they can do on `order_date`
-    with respect to the `order_items`
+    with respect to the `order_items`.
 
-    :param order_items:
+    Masters, their services and slots on `order_date` are loaded
+    at once in an `AvailabilitySnapshot`, then all checks are done in memory
+
+    :param order_items: dicts with 'master_id', 'service_ids' and 'time'
+    which is the expected time of the upsale service
     :param order_date:
-    :return:
+    :return: a list of {'master_id', 'service_id'} dicts
     """
     logger.info(f'Using an upsale search filter on items {order_items} '
                 f'with params: date={order_date}')
 
+    masters = Master.objects.filter(
+        pk__in={item['master_id'] for item in order_items})
+    snapshot = availability.AvailabilitySnapshot(masters, order_date,
+                                                 order_date)
+    masters = {master.id: master for master in snapshot.masters}
+
     # taking the maximum duration of all services of the master and
     # checking if there exists a required number of adjacent empty slots
     result = []
     for item in order_items:
-        master = Master.objects.get(pk=item['master_id'])
-
+        master = masters.get(item['master_id'])
+        if not master:
+            logger.info(f'Master {item["master_id"]} does not exist')
+            continue
         logger.info(f'Checking master {master.first_name}')
-        schedule = master.get_schedule(order_date)
-        logger.info(f'Checking schedule on {schedule.date}')
-
-        for service in master.services.exclude(pk__in=item['service_ids']):
-            # ignoring certain services
-            time = item['time']
-            if time_slot_utils.service_fits_into_slots(
-                    service, schedule.time_slots.all(),
-                    time_from=time):
+        schedule = snapshot.schedule(master, order_date)
+        if not schedule:
+            logger.info(f'Master {master.first_name} has no schedule '
+                        f'on {order_date}')
+            continue
+        day_mask = snapshot.day_mask(schedule)
+
+        time = item['time']
+        ordered = set(item['service_ids'])
+        for service in snapshot.services(master):
+            # ignoring services which are already in the order
+            if service.id in ordered:
+                continue
+            if time_slot_utils.duration_fits_into_mask(
+                    service.max_duration, day_mask, time_from=time):
                 logger.info(f'Master can do service {service.name} '
                             f'on {schedule.date} at {time}')
                 result.append({
@@ -113,6 +214,25 @@ def upsale_search(order_items, order_date):
     return result
 
 
+def favorite_master_ids(client: Client):
+    """
+    Returns a set of ids of masters, who have served the `client`
+    at least once
+    """
+    if not client:
+        return set()
+    return set(OrderItem.objects.filter(order__client=client)
+               .values_list('master_id', flat=True).distinct())
+
+
+def has_served(master: Master, client: Client):
+    """
+    Returns True if the `master` has served the `client` at least once
+    """
+    return OrderItem.objects.filter(order__client=client,
+                                    master=master).exists()
+
+
 def split(masters, target_client: Client):
     """
     splits `masters` into two lists - favorites, who have served
@@ -126,9 +246,9 @@ def split(masters, target_client: Client):
 
     logger.info(f'Splitting {len(masters)} masters')
 
+    favorite_ids = favorite_master_ids(target_client)
     for master in masters:
-        # TODO cache
-        if target_client and master.times_served(target_client) > 0:
+        if master.id in favorite_ids:
             favorites.append(master)
         else:
             regular.append(master)
@@ -147,12 +267,67 @@ def sort_and_serialize_masters(request, masters: Iterable[Master],
     :param slots: a dict, which contains
     :return:
     """
-    masters = sort_masters(masters, params.coordinates, params.distance)
+    masters, distances = rank_masters(masters, params.coordinates,
+                                      params.distance)
     # TODO JUNK!!!
-    logging.info(f'Serializing sorted master list len={len(masters)}')
-    serializer = SimpleMasterSerializer(masters, many=True, context={
+    logger.info(f'Serializing sorted master list len={len(masters)}')
+    return serialize_master_list(masters, context={
         'request': request,
         'coordinates': params.coordinates,
+        'distances': distances,
         'available_slots': slots
     })
-    return serializer.data
+
+
+def paginate_and_serialize_masters(request, favorites: Iterable[Master],
+                                   others: Iterable[Master],
+                                   params: FilteringParams, slots: dict):
+    """
+    Ranks `favorites` followed by `others` and serializes only
+    `params.limit` masters that go after `params.cursor`.
+    Only the top of the ranking is selected, the rest is never sorted
+
+    :return: a dict with 'favorites', 'others' and an opaque 'next' cursor,
+    which is None on the last page
+    """
+    favorites, others = list(favorites), list(others)
+    distances = master_distances(favorites + others, params.coordinates)
+
+    entries = []
+    for group, masters in enumerate((favorites, others)):
+        for master in masters:
+            score = _evaluate_master(distance=distances[master.id],
+                                     max_distance=params.distance,
+                                     rating=master.rating)
+            entries.append(((group, -score, master.id), master))
+
+    if params.cursor:
+        group, score, master_id = params.cursor
+        position = (group, -score, master_id)
+        entries = [entry for entry in entries if entry[0] > position]
+
+    page = heapq.nsmallest(params.limit + 1, entries,
+                           key=lambda entry: entry[0])
+    next_cursor = None
+    if len(page) > params.limit:
+        page = page[:params.limit]
+        group, score, master_id = page[-1][0]
+        next_cursor = encode_cursor((group, -score, master_id))
+
+    logger.info(f'Serializing a page of {len(page)} masters '
+                 f'out of {len(entries)}')
+    context = {
+        'request': request,
+        'coordinates': params.coordinates,
+        'distances': distances,
+        'available_slots': slots
+    }
+    return {
+        'favorites': serialize_master_list(
+            [master for (group, _, _), master in page if group == 0],
+            context=context),
+        'others': serialize_master_list(
+            [master for (group, _, _), master in page if group == 1],
+            context=context),
+        'next': next_cursor
+    }
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2018-02-05 12:10
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SLOT_DURATION = 30
+
+
+def fill_day_availability(apps, schema_editor):
+    Schedule = apps.get_model('masters', 'Schedule')
+    TimeSlot = apps.get_model('masters', 'TimeSlot')
+    DayAvailability = apps.get_model('masters', 'DayAvailability')
+
+    masks = {}
+    for slot in TimeSlot.objects.select_related('time').iterator():
+        free, exists = masks.get(slot.schedule_id, (0, 0))
+        value = slot.time.hour * 60 + slot.time.minute
+        bit = 1 << (value // SLOT_DURATION)
+        exists |= bit
+        if not slot.taken:
+            free |= bit
+        masks[slot.schedule_id] = free, exists
+
+    availabilities = []
+    for schedule in Schedule.objects.iterator():
+        free, exists = masks.get(schedule.id, (0, 0))
+        longest_free_run = 0
+        run = free
+        while run:
+            run &= run >> 1
+            longest_free_run += 1
+        earliest_free_start = None
+        if free:
+            minutes = ((free & -free).bit_length() - 1) * SLOT_DURATION
+            earliest_free_start = datetime.time(hour=minutes // 60,
+                                                minute=minutes % 60)
+        availabilities.append(DayAvailability(
+            schedule_id=schedule.id, master_id=schedule.master_id,
+            date=schedule.date, free_mask=free, exists_mask=exists,
+            longest_free_run=longest_free_run,
+            earliest_free_start=earliest_free_start))
+    DayAvailability.objects.bulk_create(availabilities, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0019_auto_20180125_2023'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayAvailability',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('free_mask', models.BigIntegerField(default=0)),
+                ('exists_mask', models.BigIntegerField(default=0)),
+                ('longest_free_run', models.IntegerField(default=0)),
+                ('earliest_free_start', models.TimeField(null=True)),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='masters.Master')),
+                ('schedule', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='masters.Schedule')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='dayavailability',
+            index_together=set([('date', 'longest_free_run')]),
+        ),
+        migrations.RunPython(fill_day_availability,
+                             migrations.RunPython.noop),
+    ]
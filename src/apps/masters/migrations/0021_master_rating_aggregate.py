@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2018-02-07 14:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_aggregate(apps, schema_editor):
+    Master = apps.get_model('masters', 'Master')
+    Feedback = apps.get_model('masters', 'Feedback')
+
+    aggregates = Feedback.objects.values('master_id').annotate(
+        rating_sum=Sum('rating'), rating_count=Count('id'))
+    for aggregate in aggregates:
+        Master.objects.filter(pk=aggregate['master_id']).update(
+            rating_sum=aggregate['rating_sum'],
+            rating_count=aggregate['rating_count'],
+            rating=aggregate['rating_sum'] / aggregate['rating_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0020_day_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='rating_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(fill_rating_aggregate,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2018-02-09 11:05
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+SLOT_DURATION = 30
+
+FILL_START = '''
+UPDATE masters_timeslot
+SET start = t.hour * 60 + t.minute
+FROM masters_time t
+WHERE t.id = masters_timeslot.time_id
+'''
+
+TAKEN_DUPLICATES = '''
+SELECT s.schedule_id, s.start, array_agg(s.order_item_id)
+FROM masters_timeslot s
+WHERE s.taken
+GROUP BY s.schedule_id, s.start
+HAVING count(*) > 1
+'''
+
+# a schedule may contain a couple of slots at the same time,
+# only free ones are deleted, a taken one or the oldest one is kept
+DELETE_DUPLICATES = '''
+DELETE FROM masters_timeslot s
+USING masters_timeslot d
+WHERE s.schedule_id = d.schedule_id
+  AND s.start = d.start
+  AND NOT s.taken
+  AND (d.taken OR d.id < s.id)
+RETURNING s.schedule_id
+'''
+
+
+def check_taken_duplicates(apps, schema_editor):
+    """
+    Fails if a schedule has several taken slots at the same time,
+    since one of the orders would lose its slot
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(TAKEN_DUPLICATES)
+        conflicts = cursor.fetchall()
+    if conflicts:
+        details = '; '.join(
+            f'schedule {schedule_id} at {start // 60:02}:{start % 60:02}, '
+            f'order items {order_item_ids}'
+            for schedule_id, start, order_item_ids in conflicts)
+        raise RuntimeError(
+            f'Unable to make time slots unique, these slots are taken '
+            f'by several orders and must be resolved manually: {details}')
+
+
+def delete_duplicates(apps, schema_editor):
+    """
+    Deletes free duplicates and rebuilds availability of their schedules,
+    which was filled by 0020 with the deleted slots counted as free
+    """
+    TimeSlot = apps.get_model('masters', 'TimeSlot')
+    DayAvailability = apps.get_model('masters', 'DayAvailability')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(DELETE_DUPLICATES)
+        schedule_ids = {row[0] for row in cursor.fetchall()}
+
+    masks = {schedule_id: (0, 0) for schedule_id in schedule_ids}
+    for schedule_id, start, taken in TimeSlot.objects.filter(
+            schedule_id__in=schedule_ids).values_list('schedule_id', 'start',
+                                                      'taken'):
+        free, exists = masks[schedule_id]
+        bit = 1 << (start // SLOT_DURATION)
+        masks[schedule_id] = free | (0 if taken else bit), exists | bit
+
+    for schedule_id, (free, exists) in masks.items():
+        longest_free_run = 0
+        run = free
+        while run:
+            run &= run >> 1
+            longest_free_run += 1
+        earliest_free_start = None
+        if free:
+            minutes = ((free & -free).bit_length() - 1) * SLOT_DURATION
+            earliest_free_start = datetime.time(hour=minutes // 60,
+                                                minute=minutes % 60)
+        DayAvailability.objects.filter(schedule_id=schedule_id).update(
+            free_mask=free, exists_mask=exists,
+            longest_free_run=longest_free_run,
+            earliest_free_start=earliest_free_start)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0021_master_rating_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='start',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunSQL(FILL_START, migrations.RunSQL.noop),
+        migrations.RunPython(check_taken_duplicates,
+                             migrations.RunPython.noop),
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timeslot',
+            name='start',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timeslot',
+            unique_together=set([('schedule', 'start')]),
+        ),
+        migrations.RemoveField(
+            model_name='timeslot',
+            name='time',
+        ),
+        migrations.DeleteModel(
+            name='Time',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2018-02-12 10:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0022_timeslot_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleTemplate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')])),
+                ('time_slots', models.CharField(max_length=256)),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_templates', to='masters.Master')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='scheduletemplate',
+            unique_together=set([('master', 'weekday')]),
+        ),
+    ]
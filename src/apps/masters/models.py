@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import datetime
 import logging
-from time import strptime
+from time import sleep, strptime
 
-from django.db import models
+from django.conf import settings
+from django.db import DatabaseError, models, transaction
+from django.db.models import Count, ExpressionWrapper, F, Func
 
 from src.apps.authentication.models import UserProfile
 from src.apps.categories.models import Service
@@ -33,6 +35,8 @@ class MasterStatus:
 
 class Master(UserProfile):
     MAX_RATING = 5.0
+    # distance to a master without a location
+    NO_DISTANCE = 1_000_000_000
 
     location = models.OneToOneField(Location, on_delete=models.CASCADE,
                                     related_name='+', null=True)
@@ -40,6 +44,10 @@ class Master(UserProfile):
     services = models.ManyToManyField(Service, related_name='masters')
 
     rating = models.FloatField(default=0.0)
+    # rating = rating_sum / rating_count
+    # updated along with every new feedback, see `add_rating`
+    rating_sum = models.FloatField(default=0.0)
+    rating_count = models.IntegerField(default=0)
 
     about = models.TextField(max_length=512, blank=True)
 
@@ -61,14 +69,39 @@ class Master(UserProfile):
         return self.status == MasterStatus.VERIFIED
 
     def add_rating(self, new_rating):
-        self.rating = (self.rating + new_rating) / self.feedbacks.count()
+        """
+        Adds `new_rating` to the rating aggregate in a single UPDATE,
+        so that concurrent feedback is not lost
+        """
+        Master.objects.filter(pk=self.pk).update(
+            rating_sum=F('rating_sum') + new_rating,
+            rating_count=F('rating_count') + 1,
+            rating=ExpressionWrapper(
+                (F('rating_sum') + new_rating) / (F('rating_count') + 1),
+                output_field=models.FloatField()))
+        self.refresh_from_db(fields=['rating', 'rating_sum', 'rating_count'])
+
+    def rating_histogram(self):
+        """
+        Returns a dict of stars -> number of feedbacks,
+        ratings are rounded to the nearest star
+        """
+        histogram = {stars: 0 for stars in range(1, int(self.MAX_RATING) + 1)}
+        buckets = self.feedbacks.annotate(
+            stars=Func(F('rating'), function='ROUND',
+                       output_field=models.IntegerField())) \
+            .values_list('stars').annotate(count=Count('id'))
+        for stars, count in buckets:
+            stars = min(max(int(stars), 1), int(self.MAX_RATING))
+            histogram[stars] += count
+        return histogram
 
     def distance(self, lat, lon):
         if self.location:
             return self.location.distance(lat, lon)
         else:
             # TODO REALLY??
-            return 1_000_000_000
+            return self.NO_DISTANCE
 
     # TODO money is stored in ints WHAT?
     def complete_order_payment(self, order, order_item):
@@ -145,9 +178,7 @@ class Master(UserProfile):
         """
         Returns a number of orders that this master had with the `client`
         """
-        # a pinch of python functional magic
-        return sum(map(lambda item: item.order.client == client,
-                       self.order_items.all()))
+        return self.order_items.filter(order__client=client).count()
 
     def __str__(self):
         return self.first_name
@@ -206,38 +237,46 @@ class PortfolioImage(models.Model):
                                on_delete=models.CASCADE)
 
 
-class Time(models.Model):
-    hour = models.IntegerField()
-    minute = models.IntegerField()
-    # populated at insertion time
-    # used only for filtering
-    value = models.TimeField(blank=True, null=True, editable=False)
-
-    def __str__(self):
-        minute = self.minute
-
-        if minute == 0:
-            minute = '00'
-        return f'{self.hour}:{minute}'
-
-
 class TimeSlot(models.Model):
     DURATION = 30
-    # TODO unique schedule+time
-    time = models.ForeignKey(Time, on_delete=models.CASCADE, related_name='+')
+    # minutes after midnight
+    start = models.PositiveSmallIntegerField()
     taken = models.BooleanField(default=False)
     schedule = models.ForeignKey('Schedule', related_name='time_slots')
 
     order_item = models.ForeignKey('orders.OrderItem', blank=True, null=True)
+    # a taken slot of an unpaid order is released after that time
+    held_until = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    @staticmethod
+    def minutes(time_: datetime.time):
+        """
+        Returns `start` of a slot at `time_`
+        """
+        return time_.hour * 60 + time_.minute
+
+    @staticmethod
+    def time_of(start: int):
+        """
+        Returns the `datetime.time` of a slot with `start`
+        """
+        return datetime.time(hour=start // 60, minute=start % 60)
 
     @property
     def value(self):
-        return self.time.value
+        return self.time_of(self.start)
+
+    @value.setter
+    def value(self, time_: datetime.time):
+        self.start = self.minutes(time_)
 
     def __str__(self):
         taken = 'taken' if self.taken else 'available'
-        return f'{self.time} {taken}. ' \
-               f'Item ID:{self.order_item and self.order_item.id}'
+        return f'{self.value:%H:%M} {taken}. ' \
+               f'Item ID:{self.order_item_id}'
+
+    class Meta:
+        unique_together = ('schedule', 'start')
 
 
 class Schedule(models.Model):
@@ -261,7 +300,7 @@ class Schedule(models.Model):
             time_ = datetime.time(hour=time_.tm_hour, minute=time_.tm_min)
 
         try:
-            return self.time_slots.get(time__value=time_)
+            return self.time_slots.get(start=TimeSlot.minutes(time_))
         except TimeSlot.DoesNotExist:
             return None
 
@@ -279,12 +318,82 @@ class Schedule(models.Model):
                 slot.delete()
             else:
                 raise ApplicationError(
-                    f'Slot at {slot.time} can not be deleted '
+                    f'Slot at {slot.value:%H:%M} can not be deleted '
                     f'because there is an order at that time')
 
+    def delete_slots(self, times):
+        """
+        Deletes time slots at specified `times` at once or raises
+        ApplicationError listing all of them which are taken.
+        Times without a slot are ignored.
+
+        :param times: iterable of time instances
+        :return: number of deleted slots
+        """
+        from src.apps.masters import availability, detail_cache, \
+            receivers, search_cache
+
+        starts = {TimeSlot.minutes(time_) for time_ in times}
+        with transaction.atomic():
+            slots = self.time_slots.select_for_update().filter(
+                start__in=starts)
+            found = list(slots.values_list('start', 'taken'))
+            taken = sorted(start for start, is_taken in found if is_taken)
+            if taken:
+                times_str = ', '.join(f'{TimeSlot.time_of(start):%H:%M}'
+                                      for start in taken)
+                raise ApplicationError(
+                    f'Slots at {times_str} can not be deleted '
+                    f'because there are orders at that time')
+            if not found:
+                return 0
+
+            # the schedule is refreshed once instead of once per slot
+            with receivers.muted_slot_receivers():
+                self.time_slots.filter(start__in=starts).delete()
+            availability.refresh_schedule(self.id)
+        search_cache.invalidate()
+        detail_cache.invalidate(self.master_id, detail_cache.SCHEDULE)
+        return len(found)
+
+    def lock_slots(self, start_time: datetime.time,
+                   end_time: datetime.time = None):
+        """
+        Locks time slots between `start_time` and `end_time` till the end
+        of the current transaction. `end_time` is excluded.
+        Slots locked by another transaction are waited for
+        `settings.BOOKING_LOCK_RETRIES` times, then ApplicationError is raised
+
+        :param start_time:
+        :param end_time: if None, equals to the end of the day
+        :return: list of locked slots ordered by time
+        """
+        slots = self.time_slots.filter(start__gte=TimeSlot.minutes(start_time))
+        if end_time is not None:
+            slots = slots.filter(start__lt=TimeSlot.minutes(end_time))
+        # the same order of locking for everyone
+        slots = slots.select_for_update(nowait=True).order_by('start')
+
+        for attempt in range(settings.BOOKING_LOCK_RETRIES + 1):
+            if attempt:
+                sleep(settings.BOOKING_LOCK_RETRY_DELAY_SECONDS)
+            try:
+                # a failed lock breaks the transaction,
+                # so every attempt gets its own savepoint
+                with transaction.atomic():
+                    return list(slots)
+            except DatabaseError:
+                logger.info(f'Slots of {self} after {start_time} '
+                            f'are locked, attempt {attempt + 1}')
+
+        raise ApplicationError(
+            f'Time slots at {start_time:%H:%M} are being booked '
+            f'by someone else',
+            error_type=ApplicationError.ErrorTypes.ORDER_SLOT_TAKEN)
+
     def assign_time(self, start_time: datetime.time,
                     end_time: datetime.time, order_item=None,
-                    taken=True):
+                    taken=True, held_until=None):
         """
         Marks slots between `start_time` and `end_time` as Taken.
         `end_time` is excluded
@@ -293,45 +402,111 @@ class Schedule(models.Model):
         :param start_time:
         :param end_time:
         :param taken:
+        :param held_until: the time the slots are released at unless
+        the order is paid for
         :return: time <datetime> of the next available time slot or None if
         the last processed slot marks the end of the work day
         """
-        from src.apps.masters import time_slot_utils
+        from src.apps.masters import availability, detail_cache, search_cache
         if not start_time:
             raise ValueError('start_time argument should not be None')
 
         logging.info(f'Setting slots between [{start_time},{end_time}] '
                      f'to Taken')
 
-        time_slots = sorted(self.time_slots.all(), key=lambda slot: slot.value)
-
-        # looking for the first timeslot
-        for first_slot_index, time_slot in enumerate(time_slots):
-            if time_slot.value == start_time:
-                break
-        else:
-            raise ValueError('time not found')
-
-        # TODO index error
-        # TODO this method blows, potential performance issues
-        shift = 0
-        cur_time = start_time
-        while cur_time < end_time:
-            ts = self.time_slots.get(pk=time_slots[first_slot_index + shift].id)
-            ts.taken = taken
-            ts.order_item = order_item
-            ts.save()
-
-            cur_time = time_slot_utils.add_time(cur_time,
-                                                minutes=TimeSlot.DURATION)
-            shift += 1
-
-        next_index = first_slot_index + shift
-        if next_index == len(time_slots):
+        start = TimeSlot.minutes(start_time)
+        end = TimeSlot.minutes(end_time)
+        expected = len(range(start, end, TimeSlot.DURATION))
+        # all slots are marked in a single UPDATE, signals are not sent
+        with transaction.atomic():
+            updated = self.time_slots.filter(start__gte=start,
+                                             start__lt=end).update(
+                taken=taken, order_item=order_item, held_until=held_until)
+            if updated != expected:
+                # rolling the update back
+                raise ValueError(f'Expected {expected} slots between '
+                                 f'{start_time} and {end_time}, '
+                                 f'found {updated}')
+            # bookings of other slots must not wait for this transaction
+            availability.refresh_on_commit(self.id)
+            search_cache.invalidate()
+            detail_cache.invalidate(self.master_id, detail_cache.SCHEDULE)
+
+        next_start = self.time_slots.filter(start__gte=end) \
+            .order_by('start').values_list('start', flat=True).first()
+        if next_start is None:
             logging.info(f'No next slot, last slot of the day is filled')
             return None
 
-        return time_slots[next_index].value
+        return TimeSlot.time_of(next_start)
+
+
+class ScheduleTemplate(models.Model):
+    """
+    Working hours of a master on a day of the week.
+    Templates are expanded into schedules by `schedule_templates.expand`
+    """
+    WEEKDAYS = (
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    )
+
+    master = models.ForeignKey(Master, on_delete=models.CASCADE,
+                               related_name='schedule_templates')
+    # same as `date.weekday()`, i.e. Monday is 0
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    # formatted like '10:00-13:30,15:00', every slot is included
+    time_slots = models.CharField(max_length=256)
+
+    class Meta:
+        unique_together = ('master', 'weekday')
+
+    def __str__(self):
+        return f'{self.get_weekday_display()} {self.time_slots}'
+
+
+class DayAvailability(models.Model):
+    """
+    Denormalized availability of a master on a single date.
+
+    Rows are maintained by receivers on Schedule and TimeSlot,
+    see `availability.py` for the mask format
+    """
+    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE,
+                                    related_name='availability')
+    master = models.ForeignKey(Master, on_delete=models.CASCADE,
+                               related_name='+')
+    date = models.DateField()
+    # bit `i` stands for the slot at `i * TimeSlot.DURATION` minutes
+    free_mask = models.BigIntegerField(default=0)
+    exists_mask = models.BigIntegerField(default=0)
+    # number of slots in the longest sequence of adjacent free slots
+    longest_free_run = models.IntegerField(default=0)
+    earliest_free_start = models.TimeField(null=True)
+
+    class Meta:
+        index_together = ('date', 'longest_free_run')
+
+    def __str__(self):
+        return f'availability of master {self.master_id} on {self.date}'
+
+
+class CacheVersion(models.Model):
+    """
+    A version of cached data, bumping it drops everything cached
+    under the old one. Versions are rows rather than cache entries,
+    so that they are never evicted
+    """
+    key = models.CharField(max_length=100, unique=True)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
 
 
 # DON'T DELETE
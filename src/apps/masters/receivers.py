@@ -1,15 +1,170 @@
 # -*- coding: utf-8 -*-
-from datetime import time
+import threading
+from contextlib import contextmanager
 
 from django.db import models
 from django.dispatch import receiver
 
-from .models import Time
+from src.apps.authentication.models import PhoneAuthUser
+from src.apps.categories.models import Service, ServiceCategory
+from src.apps.clients.models import Client
+from src.apps.core.models import Location
+from . import availability, detail_cache, search_cache
+from .models import Master, Schedule, TimeSlot, Balance, Feedback, \
+    PortfolioImage
 
+_muted = threading.local()
 
-@receiver(models.signals.pre_save, sender=Time)
-def add_time_value(sender, instance, **kwargs):
+
+@contextmanager
+def muted_slot_receivers():
+    """
+    Silences the time slot receivers below within the block.
+    Should be used for batch modifications of time slots, the caller
+    refreshes availability and invalidates caches once afterwards
+    """
+    previous = getattr(_muted, 'active', False)
+    _muted.active = True
+    try:
+        yield
+    finally:
+        _muted.active = previous
+
+
+def _slot_receivers_muted(sender):
+    return sender is TimeSlot and getattr(_muted, 'active', False)
+
+
+@receiver(models.signals.post_save, sender=Schedule)
+def create_day_availability(sender, instance, **kwargs):
+    """
+    Creates an availability row for a new schedule
+    """
+    availability.schedule_saved(instance)
+
+
+@receiver(models.signals.post_save, sender=TimeSlot)
+def update_day_availability(sender, instance, **kwargs):
+    """
+    Marks the slot as existing and either free or taken
     """
-    Adds a 'value' TimeField to the Time instance
+    if _slot_receivers_muted(sender):
+        return
+    availability.slot_changed(instance)
+
+
+@receiver(models.signals.post_delete, sender=TimeSlot)
+def clear_day_availability(sender, instance, **kwargs):
+    """
+    Removes the slot from the availability of its schedule
+    """
+    if _slot_receivers_muted(sender):
+        return
+    availability.slot_changed(instance, deleted=True)
+
+
+@receiver(models.signals.post_save, sender=Master)
+@receiver(models.signals.post_save, sender=Schedule)
+@receiver(models.signals.post_delete, sender=Schedule)
+@receiver(models.signals.post_save, sender=TimeSlot)
+@receiver(models.signals.post_delete, sender=TimeSlot)
+def invalidate_search_cache(sender, instance, **kwargs):
     """
-    instance.value = time(hour=instance.hour, minute=instance.minute)
+    Drops cached search results, since availability of masters has changed
+    """
+    if _slot_receivers_muted(sender):
+        return
+    search_cache.invalidate()
+
+
+@receiver(models.signals.post_save, sender=Master)
+@receiver(models.signals.post_save, sender=Balance)
+@receiver(models.signals.post_delete, sender=Balance)
+def invalidate_master_profile(sender, instance, **kwargs):
+    """
+    Drops the cached profile of a master
+    """
+    master_id = instance.id if sender is Master else instance.master_id
+    detail_cache.invalidate(master_id, detail_cache.PROFILE)
+
+
+@receiver(models.signals.post_save, sender=Location)
+@receiver(models.signals.post_save, sender=PhoneAuthUser)
+def invalidate_master_profile_of_related(sender, instance, **kwargs):
+    """
+    Drops the cached profile of a master with this location or phone
+    """
+    lookup = 'location' if sender is Location else 'user'
+    for master_id in Master.objects.filter(**{lookup: instance}) \
+            .values_list('id', flat=True):
+        detail_cache.invalidate(master_id, detail_cache.PROFILE)
+
+
+@receiver(models.signals.m2m_changed, sender=Master.services.through)
+def invalidate_master_services(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """
+    Drops cached profiles of masters whose services have changed
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        detail_cache.invalidate(instance.id, detail_cache.PROFILE)
+    elif pk_set:
+        for master_id in pk_set:
+            detail_cache.invalidate(master_id, detail_cache.PROFILE)
+    else:
+        detail_cache.invalidate_all()
+
+
+@receiver(models.signals.post_save, sender=Service)
+@receiver(models.signals.post_delete, sender=Service)
+@receiver(models.signals.post_save, sender=ServiceCategory)
+@receiver(models.signals.post_delete, sender=ServiceCategory)
+def invalidate_all_master_profiles(sender, instance, **kwargs):
+    """
+    Drops all cached profiles, since services are a part of them
+    """
+    detail_cache.invalidate_all()
+
+
+@receiver(models.signals.post_save, sender=PortfolioImage)
+@receiver(models.signals.post_delete, sender=PortfolioImage)
+def invalidate_master_portfolio(sender, instance, **kwargs):
+    detail_cache.invalidate(instance.master_id, detail_cache.PORTFOLIO)
+
+
+@receiver(models.signals.post_save, sender=Feedback)
+@receiver(models.signals.post_delete, sender=Feedback)
+def invalidate_master_feedback(sender, instance, **kwargs):
+    # the rating histogram is a part of the profile
+    detail_cache.invalidate(instance.master_id, detail_cache.FEEDBACK,
+                            detail_cache.PROFILE)
+
+
+@receiver(models.signals.post_save, sender=Client)
+def invalidate_feedback_of_client(sender, instance, **kwargs):
+    """
+    Drops cached feedback of masters who were rated by the client,
+    since the client is a part of it
+    """
+    for master_id in Feedback.objects.filter(client=instance) \
+            .values_list('master_id', flat=True).distinct():
+        detail_cache.invalidate(master_id, detail_cache.FEEDBACK)
+
+
+@receiver(models.signals.post_save, sender=Schedule)
+@receiver(models.signals.post_delete, sender=Schedule)
+def invalidate_master_schedule(sender, instance, **kwargs):
+    detail_cache.invalidate(instance.master_id, detail_cache.SCHEDULE)
+
+
+@receiver(models.signals.post_save, sender=TimeSlot)
+@receiver(models.signals.post_delete, sender=TimeSlot)
+def invalidate_master_schedule_of_slot(sender, instance, **kwargs):
+    if _slot_receivers_muted(sender):
+        return
+    # the schedule may be already deleted
+    for master_id in Schedule.objects.filter(pk=instance.schedule_id) \
+            .values_list('master_id', flat=True):
+        detail_cache.invalidate(master_id, detail_cache.SCHEDULE)
@@ -0,0 +1,104 @@
+import datetime
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import availability, detail_cache, search_cache, time_slot_utils
+from .models import Schedule, ScheduleTemplate, TimeSlot
+from .utils import get_default_date_range
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+
+def parse_starts(time_slots: str):
+    """
+    Returns a sorted list of starts (in minutes) of slots
+    in a template string, every slot is included
+    """
+    return sorted(time_slot_utils.parse_slot_starts(time_slots,
+                                                    include_last=True))
+
+
+def _load_patterns(master_ids):
+    # master_id -> weekday -> starts
+    templates = ScheduleTemplate.objects.all()
+    if master_ids is not None:
+        templates = templates.filter(master_id__in=master_ids)
+
+    patterns = defaultdict(dict)
+    # many masters share the same working hours
+    parsed = {}
+    for master_id, weekday, time_slots in templates.values_list(
+            'master_id', 'weekday', 'time_slots'):
+        if time_slots not in parsed:
+            parsed[time_slots] = parse_starts(time_slots)
+        patterns[master_id][weekday] = parsed[time_slots]
+    return patterns
+
+
+def expand(master_ids=None, date_range=None):
+    """
+    Materializes schedule templates of masters into schedules
+    for every date within `date_range`.
+
+    Only dates without a schedule are materialized, existing schedules
+    may have been edited by the master and are left as they are.
+    Schedules, slots and availability rows are inserted in batches,
+    so the number of queries doesn't depend on the number of masters
+
+    :param master_ids: ids of masters to expand templates of,
+    all masters are processed if None
+    :param date_range: a (date_from, date_to) tuple, both are included,
+    `get_default_date_range()` if None
+    :return: number of materialized schedules
+    """
+    date_from, date_to = date_range or get_default_date_range()
+    patterns = _load_patterns(master_ids)
+    if not patterns:
+        return 0
+
+    logger.info(f'Expanding schedule templates of {len(patterns)} masters '
+                f'between {date_from} and {date_to}')
+    dates = [date_from + datetime.timedelta(days=i)
+             for i in range((date_to - date_from).days + 1)]
+
+    with transaction.atomic():
+        existing = set(Schedule.objects.filter(
+            master_id__in=patterns, date__gte=date_from, date__lte=date_to
+        ).values_list('master_id', 'date'))
+
+        new_schedules = [
+            Schedule(master_id=master_id, date=date)
+            for master_id, pattern in patterns.items() for date in dates
+            if date.weekday() in pattern and (master_id, date) not in existing]
+        # ids of created rows are returned by postgres
+        Schedule.objects.bulk_create(new_schedules, batch_size=BATCH_SIZE)
+
+        time_slots = []
+        day_masks = []
+        for schedule in new_schedules:
+            starts = patterns[schedule.master_id][schedule.date.weekday()]
+            time_slots.extend(TimeSlot(schedule_id=schedule.id, start=start,
+                                       taken=False) for start in starts)
+            mask = 0
+            for start in starts:
+                mask |= 1 << (start // TimeSlot.DURATION)
+            day_masks.append(
+                (schedule, time_slot_utils.DayMask(free=mask, exists=mask)))
+        TimeSlot.objects.bulk_create(time_slots, batch_size=BATCH_SIZE)
+        availability.replace_schedules(day_masks)
+
+    # same as the receivers do for each schedule and slot
+    search_cache.invalidate()
+    if master_ids is None:
+        detail_cache.invalidate_all()
+    else:
+        for master_id in patterns:
+            detail_cache.invalidate(master_id, detail_cache.SCHEDULE)
+
+    logger.info(f'Created {len(new_schedules)} schedules, '
+                f'{len(time_slots)} time slots')
+    return len(day_masks)
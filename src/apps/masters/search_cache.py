@@ -0,0 +1,70 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import cache_versions
+from .filtering import FilteringFunctions, FilteringParams
+from .models import TimeSlot
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'masters:search:version'
+# coordinates are rounded to ~100 m,
+# so that requests from nearby points share the results
+COORDINATES_PRECISION = 3
+
+
+def _snap(coordinates):
+    if not coordinates:
+        return None
+    return tuple(round(value, COORDINATES_PRECISION) for value in coordinates)
+
+
+def invalidate():
+    """
+    Drops all cached search results once the current transaction commits
+    """
+    cache_versions.bump(VERSION_KEY)
+
+
+def make_key(params: FilteringParams, filter_function):
+    """
+    Returns a cache key for a search with `params` and `filter_function`
+    """
+    target_client = getattr(params, 'target_client', None)
+    home_address = target_client and target_client.home_address
+    now = timezone.now()
+    normalized = (
+        filter_function.__name__,
+        sorted(int(service) for service in params.services),
+        [str(date) for date in params.date_range],
+        [str(time) for time in params.time_range],
+        str(params.date), str(params.time),
+        _snap(getattr(params, 'coordinates', None)),
+        float(params.distance),
+        params.ignore_taken_slots,
+        # the search filter does not depend on the client,
+        # others check if masters can get to the client's home
+        filter_function is not FilteringFunctions.search and
+        home_address and _snap(home_address.location.as_tuple()),
+        # slots before the current time are not available
+        now.date().isoformat(),
+        (now.hour * 60 + now.minute) // TimeSlot.DURATION,
+    )
+    digest = hashlib.md5(repr(normalized).encode('utf-8')).hexdigest()
+    return f'masters:search:{cache_versions.get(VERSION_KEY)}:{digest}'
+
+
+def get_result(key):
+    """
+    Returns cached (master_ids, slots) or None
+    """
+    return cache.get(key)
+
+
+def store_result(key, master_ids, slots):
+    cache.set(key, (master_ids, dict(slots)),
+              timeout=settings.SEARCH_CACHE_TIMEOUT_SECONDS)
@@ -1,6 +1,10 @@
 import datetime
 import logging
+from collections import OrderedDict
+from typing import Iterable
 
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -12,10 +16,11 @@ from src.apps.core.exceptions import ApplicationError
 from src.apps.core.mixins import FilterEmptyFieldsMixin
 from src.apps.core.models import Location
 from src.apps.core.serializers import LocationSerializer
-from src.apps.masters import time_slot_utils
+from src.apps.masters import availability, detail_cache, search_cache, \
+    time_slot_utils
 from src.apps.orders.models import Order
-from .models import Master, Schedule, TimeSlot, Time, MasterStatus, Feedback, \
-    Balance
+from .models import Master, Schedule, TimeSlot, MasterStatus, Feedback, \
+    Balance, ScheduleTemplate
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +30,11 @@ class TimeSlotSerializer(serializers.ModelSerializer):
     order_id = serializers.SerializerMethodField()
 
     def get_order_id(self, time_slot):
-        return time_slot.order_item and \
-               time_slot.order_item.order and \
-               time_slot.order_item.order.id
+        # the order itself is not needed, so it's not loaded
+        return time_slot.order_item and time_slot.order_item.order_id
 
     def get_time(self, time_slot: TimeSlot):
-        # chopping off seconds
-        return str(time_slot.time.value)[:-3]
+        return time_slot.value.strftime('%H:%M')
 
     class Meta:
         model = TimeSlot
@@ -60,10 +63,10 @@ class CreateFeedbackSerializer(serializers.ModelSerializer):
                                            master=master,
                                            order=order,
                                            **validated_data)
-        master.add_rating(feedback.rating)
         logger.info(f'Adding {feedback.rating} star feedback '
                     f'to master {master.first_name}')
-        master.save()
+        # no need to save, the rating is updated in place
+        master.add_rating(feedback.rating)
         return feedback
 
     class Meta:
@@ -111,6 +114,10 @@ class MasterSerializer(serializers.ModelSerializer):
     feedback = serializers.SerializerMethodField(read_only=True)
     balance = BalanceSerializer(read_only=True)
     phone = serializers.CharField(source='user.phone', read_only=True)
+    rating_histogram = serializers.SerializerMethodField(read_only=True)
+
+    def get_rating_histogram(self, master: Master):
+        return master.rating_histogram()
 
     def get_portfolio(self, master: Master):
         portfolio = master.portfolio.order_by('added').all()
@@ -128,17 +135,66 @@ class MasterSerializer(serializers.ModelSerializer):
 
     def get_schedule(self, master: Master):
         """
-        Only schedules for upcoming dates are returned
+        Only schedules for upcoming dates are returned.
+        Slots of all schedules are loaded in a single query
         """
         # TODO timezone fail?
+        time_slots = TimeSlot.objects.select_related('order_item') \
+            .order_by('start')
         schedules = master.schedule.filter(date__gte=timezone.now()) \
-            .order_by('date').all()
+            .order_by('date') \
+            .prefetch_related(Prefetch('time_slots', queryset=time_slots))
         serializer = ScheduleSerializer(many=True, instance=schedules)
         return serializer.data
 
     class Meta:
         model = Master
-        exclude = ('user',)
+        exclude = ('user', 'rating_sum')
+        # the aggregate is maintained by `Master.add_rating`
+        read_only_fields = ('rating', 'rating_count')
+
+
+class CachedMasterSerializer(MasterSerializer):
+    """
+    Same as `MasterSerializer`, but the representation is assembled
+    from fragments cached by `detail_cache`
+    """
+    FRAGMENT_FIELDS = {
+        detail_cache.PORTFOLIO: 'portfolio',
+        detail_cache.FEEDBACK: 'feedback',
+        detail_cache.SCHEDULE: 'schedule',
+    }
+
+    def _profile(self, master: Master):
+        """
+        Represents all fields but the cached separately ones
+        """
+        ret = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in self.FRAGMENT_FIELDS.values():
+                continue
+            attribute = field.get_attribute(master)
+            ret[field.field_name] = None if attribute is None \
+                else field.to_representation(attribute)
+        return ret
+
+    def to_representation(self, master: Master):
+        request = self.context.get('request')
+        # urls of images contain the host, upcoming schedules depend on date
+        variant = (request and request.build_absolute_uri('/'),
+                   timezone.now().date().isoformat())
+        fragments = detail_cache.get_fragments(master.id, variant, {
+            detail_cache.PROFILE: lambda: self._profile(master),
+            detail_cache.PORTFOLIO: lambda: self.get_portfolio(master),
+            detail_cache.FEEDBACK: lambda: self.get_feedback(master),
+            detail_cache.SCHEDULE: lambda: self.get_schedule(master),
+        })
+        data = dict(fragments[detail_cache.PROFILE])
+        for fragment, field_name in self.FRAGMENT_FIELDS.items():
+            data[field_name] = fragments[fragment]
+        # same order of fields as in MasterSerializer
+        return OrderedDict((field.field_name, data[field.field_name])
+                           for field in self._readable_fields)
 
 
 class SimpleMasterSerializer(FilterEmptyFieldsMixin,
@@ -163,8 +219,11 @@ class SimpleMasterSerializer(FilterEmptyFieldsMixin,
         coordinates = self.context.get('coordinates')
         if not coordinates:
             return self.DISTANCE_NOT_AVAILABLE
-        else:
-            return master.distance(*coordinates)
+        # distances may be already computed while sorting masters
+        distances = self.context.get('distances', {})
+        if master.id in distances:
+            return distances[master.id]
+        return master.distance(*coordinates)
 
     def _available_slots(self, master: Master):
         return self.context.get('available_slots', {}).get(master.id, [])
@@ -175,6 +234,98 @@ class SimpleMasterSerializer(FilterEmptyFieldsMixin,
                   'location', 'distance', 'available_slots')
 
 
+def _file_url(file, request):
+    # same as rest_framework.fields.FileField.to_representation
+    if not file or not getattr(file, 'url', None):
+        return None
+    if request is not None:
+        return request.build_absolute_uri(file.url)
+    return file.url
+
+
+def serialize_master_list(masters: Iterable[Master], context: dict):
+    """
+    Produces the same output as `SimpleMasterSerializer(many=True)`,
+    but builds plain dicts instead of going through DRF fields,
+    which is a lot faster for long lists of masters.
+
+    Services and locations are loaded in bulk unless they are preloaded.
+    A dict of each service is built once and shared between masters
+
+    :param masters:
+    :param context: same as the context of `SimpleMasterSerializer`
+    :return: a list of dicts
+    """
+    masters = list(masters)
+    prefetch_related_objects(masters, 'location', Prefetch(
+        'services', queryset=Service.objects.select_related('category')))
+
+    request = context.get('request')
+    coordinates = context.get('coordinates')
+    distances = context.get('distances', {})
+    available_slots = context.get('available_slots', {})
+
+    service_dicts = {}
+
+    def service_dict(service: Service):
+        if service.id not in service_dicts:
+            category = service.category
+            service_dicts[service.id] = {
+                'id': service.id,
+                'category': {
+                    'name': category.name,
+                    'image': _file_url(category.image, request),
+                    'id': category.id,
+                },
+                'name': service.name,
+                'description': service.description,
+                'cost': service.cost,
+                'min_duration': service.min_duration,
+                'max_duration': service.max_duration,
+            }
+        return service_dicts[service.id]
+
+    result = []
+    for master in masters:
+        if not coordinates:
+            distance = SimpleMasterSerializer.DISTANCE_NOT_AVAILABLE
+        elif master.id in distances:
+            distance = distances[master.id]
+        else:
+            distance = master.distance(*coordinates)
+        location = master.location
+        fields = (
+            ('id', master.id),
+            ('about', master.about),
+            ('first_name', master.first_name),
+            ('avatar', _file_url(master.avatar, request)),
+            ('services', [service_dict(service)
+                          for service in master.services.all()]),
+            ('location', location and {'lat': location.lat,
+                                       'lon': location.lon}),
+            ('distance', distance),
+            ('available_slots', available_slots.get(master.id, [])),
+        )
+        # empty fields are dropped, see `FilterEmptyFieldsMixin`
+        result.append({name: value for name, value in fields if value})
+    return result
+
+
+def _validate_time_slots(time_slots):
+    try:
+        starts = time_slot_utils.parse_slot_starts(time_slots,
+                                                   include_last=True)
+    except ValueError:
+        raise ValidationError(detail='Invalid time_slots format')
+    # availability is stored as a bitmask of a 30-minute grid
+    for start in starts:
+        if start % TimeSlot.DURATION != 0:
+            raise ValidationError(
+                detail=f'Time slots must start at multiples of '
+                       f'{TimeSlot.DURATION} minutes')
+    return time_slots
+
+
 class CreateScheduleSerializer(serializers.ModelSerializer):
     time_slots = serializers.CharField(write_only=True)
     date = serializers.DateField(write_only=True)
@@ -185,28 +336,27 @@ class CreateScheduleSerializer(serializers.ModelSerializer):
         schedule, created = Schedule.objects.get_or_create(
             master=master, date=validated_data['date'],
         )
-        time_tuples = time_slot_utils.parse_time_slots(
+        starts = time_slot_utils.parse_slot_starts(
             validated_data['time_slots'], include_last=True)
-        # TODO that's not fool proof
         # timeslots may not be overwritten
         logging.info(f'Creating schedule on {schedule.date} '
                      f'for master {master.first_name}. '
-                     f'time_slots={time_tuples}')
-        for time_tuple in time_tuples:
-            try:
-                target_time = datetime.time(hour=time_tuple.hour,
-                                            minute=time_tuple.minute)
-                TimeSlot.objects.get(schedule=schedule,
-                                     time__value=target_time)
-            except TimeSlot.DoesNotExist:
-                TimeSlot.objects.create(
-                    time=Time.objects.create(hour=time_tuple.hour,
-                                             minute=time_tuple.minute),
-                    schedule=schedule,
-                    taken=False)
-            else:
-                raise ApplicationError(f'Trying to overwrite time slot'
-                                       f' at {target_time}')
+                     f'time_slots={validated_data["time_slots"]}')
+        existing_starts = set(schedule.time_slots.values_list('start',
+                                                              flat=True))
+        overwritten = sorted(existing_starts & starts)
+        if overwritten:
+            raise ApplicationError(f'Trying to overwrite time slot'
+                                   f' at {TimeSlot.time_of(overwritten[0])}')
+        time_slots = [TimeSlot(start=start, schedule=schedule, taken=False)
+                      for start in starts]
+
+        with transaction.atomic():
+            TimeSlot.objects.bulk_create(time_slots)
+            # same as the TimeSlot receivers do for each slot
+            availability.refresh_schedule(schedule.id)
+            search_cache.invalidate()
+            detail_cache.invalidate(master.id, detail_cache.SCHEDULE)
         return schedule
 
     def validate_date(self, date_value):
@@ -219,14 +369,31 @@ class CreateScheduleSerializer(serializers.ModelSerializer):
         return date_value
 
     def validate_time_slots(self, time_slots):
-        # TODO verify time_slots
-        return time_slots
+        return _validate_time_slots(time_slots)
 
     class Meta:
         model = Schedule
         fields = ('time_slots', 'date')
 
 
+class ScheduleTemplateListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        weekdays = [template['weekday'] for template in attrs]
+        if len(weekdays) != len(set(weekdays)):
+            raise ValidationError(detail='Weekdays must not repeat')
+        return attrs
+
+
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    def validate_time_slots(self, time_slots):
+        return _validate_time_slots(time_slots)
+
+    class Meta:
+        model = ScheduleTemplate
+        fields = ('weekday', 'time_slots')
+        list_serializer_class = ScheduleTemplateListSerializer
+
+
 class IdListField(serializers.Field):
     def to_internal_value(self, data):
         if isinstance(data, str):
@@ -1,5 +1,7 @@
 from datetime import timedelta as delta
+from io import StringIO
 
+from django.core.management import call_command
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
@@ -81,3 +83,34 @@ class AddFeedbackTestCase(APITestCase):
         feedback_items = list(self.master_object.feedbacks.all())
         self.assertEqual(len(feedback_items), 2)
         self.assertEqual(self.master_object.rating, 4.5)
+
+    def test_rating_aggregate(self):
+        for rating in [5, 4, 2.6, 3.4]:
+            Feedback.objects.create(client=self.client_object,
+                                    master=self.master_object,
+                                    rating=rating, text='kek',
+                                    date=utils.get_date(0))
+            # the UPDATE and the refresh
+            with self.assertNumQueries(2):
+                self.master_object.add_rating(rating)
+        self.assertEqual(self.master_object.rating_count, 4)
+        self.assertAlmostEqual(self.master_object.rating_sum, 15)
+        self.assertAlmostEqual(self.master_object.rating, 3.75)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.master_object.rating_histogram(),
+                             {1: 0, 2: 0, 3: 2, 4: 1, 5: 1})
+
+    def test_recompute_ratings(self):
+        Feedback.objects.create(client=self.client_object,
+                                master=self.master_object,
+                                rating=5, text='kek', date=utils.get_date(0))
+        Feedback.objects.create(client=self.client_object,
+                                master=self.master_object,
+                                rating=2, text='kek', date=utils.get_date(0))
+        self.master_object.add_rating(5)
+
+        call_command('recompute_ratings', chunk_size=1, stdout=StringIO())
+        self.master_object.refresh_from_db()
+        self.assertEqual(self.master_object.rating_count, 2)
+        self.assertEqual(self.master_object.rating_sum, 7)
+        self.assertEqual(self.master_object.rating, 3.5)
@@ -0,0 +1,111 @@
+import datetime
+from datetime import timedelta as delta
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from src.apps.masters import gmaps_utils
+from src.apps.masters.availability import AvailabilitySnapshot
+from src.apps.masters.filtering import FilteringFunctions, FilteringParams
+from src.apps.masters.models import Master, Schedule, TimeSlot
+from src.apps.masters.utils import get_default_date_range
+from src.utils.object_creation import make_everything, make_master, \
+    make_client, make_order
+
+
+class AvailabilitySnapshotTestCase(APITestCase):
+    def setUp(self):
+        make_everything()
+
+    def _add_master(self, name, service):
+        master = make_master(name, 11.0)
+        master.services.add(service)
+        schedule = Schedule.objects.create(master=master,
+                                           date=timezone.now() +
+                                                delta(days=1))
+        for minutes in range(10 * 60, 12 * 60, TimeSlot.DURATION):
+            TimeSlot.objects.create(start=minutes, taken=False,
+                                    schedule=schedule)
+        return master
+
+    def test_snapshot_contents(self):
+        vasya = Master.objects.get(first_name='VASYA')
+        snapshot = AvailabilitySnapshot(Master.objects.all(),
+                                        *get_default_date_range())
+
+        self.assertEqual(len(snapshot.services(vasya)), 2)
+        service = vasya.services.first()
+        self.assertEqual(snapshot.services(vasya, [str(service.id)]),
+                         [service])
+
+        schedules = snapshot.schedules(vasya)
+        self.assertEqual(len(schedules), 2)
+        self.assertLess(schedules[0].date, schedules[1].date)
+
+        time_slots = snapshot.time_slots(schedules[0])
+        self.assertEqual([slot.value.hour for slot in time_slots],
+                         [10, 11, 11, 12])
+        self.assertIsNone(
+            snapshot.schedule(vasya, timezone.now().date() + delta(days=10)))
+
+    def test_snapshot_constant_queries(self):
+        service = Master.objects.get(first_name='VASYA').services.first()
+        # masters + services + schedules + time slots
+        with self.assertNumQueries(4):
+            snapshot = AvailabilitySnapshot(Master.objects.all(),
+                                            *get_default_date_range())
+            for master in snapshot.masters:
+                for schedule in snapshot.schedules(master):
+                    snapshot.time_slots(schedule)
+
+        for i in range(5):
+            self._add_master(f'MASTER{i}', service)
+
+        with self.assertNumQueries(4):
+            snapshot = AvailabilitySnapshot(Master.objects.all(),
+                                            *get_default_date_range())
+            for master in snapshot.masters:
+                snapshot.services(master)
+                for schedule in snapshot.schedules(master):
+                    snapshot.time_slots(schedule)
+
+    def test_search_filter_queries(self):
+        service = Master.objects.get(first_name='VASYA').services.first()
+        for i in range(5):
+            self._add_master(f'MASTER{i}', service)
+
+        params = FilteringParams({'coordinates': '10,20'},
+                                 client=make_client())
+        with self.assertNumQueries(4):
+            masters, _ = FilteringFunctions.search(
+                Master.objects.all(), params)
+        # VASYA, PETYA and 5 new guys
+        self.assertEqual(len(masters), 7)
+
+    @override_settings(USE_GMAPS_API=True, USE_TRAVEL_ESTIMATOR=True)
+    def test_slot_map_reachability_queries(self):
+        vasya = Master.objects.get(first_name='VASYA')
+        client = make_client()
+        date = timezone.now() + delta(days=1)
+        make_order(client=client, master=vasya,
+                   service=vasya.services.first(), order_date=date,
+                   order_time=datetime.time(hour=10, minute=30))
+        location = make_client().home_address.location
+
+        # masters + services + schedules + time slots + client addresses
+        with self.assertNumQueries(5):
+            snapshot = AvailabilitySnapshot(Master.objects.all(),
+                                            *get_default_date_range())
+        schedule = snapshot.schedule(vasya, date.date())
+        with self.assertNumQueries(0):
+            slot_map = snapshot.slot_map(schedule)
+            for slot in snapshot.time_slots(schedule):
+                gmaps_utils.can_reach(schedule, location, slot.value,
+                                      slot_map=slot_map)
+
+        taken, prev_location = slot_map[datetime.time(hour=10, minute=30)]
+        self.assertTrue(taken)
+        self.assertEqual(prev_location, client.home_address.location)
+        self.assertEqual(slot_map[datetime.time(hour=11, minute=0)],
+                         (False, None))
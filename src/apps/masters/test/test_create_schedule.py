@@ -1,12 +1,15 @@
 from datetime import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase, APIClient
 
 from src.apps.authentication.models import Token
-from src.apps.masters.models import Master, Schedule, TimeSlot, Time
+from src.apps.masters.models import Master, Schedule, TimeSlot, \
+    DayAvailability
 from src.apps.masters.utils import get_default_date_range
 from src.apps.masters.views import CreateDeleteScheduleView, MeMasterView
 from src.utils.object_creation import make_master
@@ -41,7 +44,7 @@ class CreateScheduleTestCase(APITestCase):
         self.assertEqual(len(schedule.time_slots.all()), len(result_times))
 
         for time_slot in schedule.time_slots.all():
-            self.assertIn(str(time_slot.time), result_times)
+            self.assertIn(time_slot.value.strftime('%H:%M'), result_times)
 
     def test_fail_create_future_date(self):
         master = Master.objects.get(first_name='VASYA')
@@ -54,13 +57,67 @@ class CreateScheduleTestCase(APITestCase):
             }, format='json')
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_fail_create_off_grid_slots(self):
+        master = Master.objects.get(first_name='VASYA')
+        resp = self.client.post(
+            reverse(CreateDeleteScheduleView.view_name, args=[master.id]),
+            data={
+                'date': '2017-11-20',
+                'time_slots': '13:15-15:15'
+            }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fail_create_invalid_slots(self):
+        master = Master.objects.get(first_name='VASYA')
+        resp = self.client.post(
+            reverse(CreateDeleteScheduleView.view_name, args=[master.id]),
+            data={
+                'date': '2017-11-20',
+                'time_slots': '13:00-lunch'
+            }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _create(self, date, time_slots):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(
+                reverse(CreateDeleteScheduleView.view_name,
+                        args=[self.master_object.id]),
+                data={'date': date, 'time_slots': time_slots},
+                format='json')
+        return resp, len(queries)
+
+    def test_create_whole_day_constant_queries(self):
+        resp, short_day_queries = self._create('2017-11-20', '10:00-11:00')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        resp, long_day_queries = self._create('2017-11-21', '08:00-22:00')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(long_day_queries, short_day_queries)
+
+        schedule = self.master_object.schedule.get(date='2017-11-21')
+        self.assertEqual(schedule.time_slots.count(), 29)
+        availability = DayAvailability.objects.get(schedule=schedule)
+        self.assertEqual(availability.longest_free_run, 29)
+        self.assertEqual(str(availability.earliest_free_start), '08:00:00')
+
+    def test_fail_overwrite_slots(self):
+        resp, _ = self._create('2017-11-20', '10:00-11:00')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        resp, _ = self._create('2017-11-20', '09:00-10:30')
+        self.assertEqual(resp.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.data['detail'],
+                         'Trying to overwrite time slot at 10:00:00')
+        # nothing is created
+        schedule = self.master_object.schedule.get(date='2017-11-20')
+        self.assertEqual(schedule.time_slots.count(), 3)
+
     def test_add_slots_to_existing_schedule(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date=timezone.now())
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
 
@@ -84,6 +141,9 @@ class CreateScheduleTestCase(APITestCase):
         self.assertEqual(len(schedule.time_slots.all()), len(result_times))
 
         for time_slot in schedule.time_slots.all():
-            self.assertIn(str(time_slot.time), result_times)
+            self.assertIn(time_slot.value.strftime('%H:%M'), result_times)
         resp = self.client.get(reverse(MeMasterView.view_name))
-        print(resp.data)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([time_slot['time'] for time_slot in
+                          resp.data['schedule'][0]['time_slots']],
+                         result_times)
@@ -0,0 +1,113 @@
+import datetime
+import threading
+from io import StringIO
+from datetime import timedelta as delta
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from src.apps.masters import availability
+from src.apps.masters.models import Master, Schedule, TimeSlot, \
+    DayAvailability
+from src.utils.object_creation import make_everything
+
+
+# availability of booked slots is refreshed after commits
+class DayAvailabilityTestCase(TransactionTestCase):
+    def setUp(self):
+        make_everything()
+        self.vasya = Master.objects.get(first_name='VASYA')
+        self.schedule = self.vasya.get_schedule(
+            timezone.now().date() + delta(days=1))
+
+    def test_created_with_slots(self):
+        day = self.schedule.availability
+        # 10:30 is taken, 11:00-12:00 are free
+        self.assertEqual(day.exists_mask, 0b1111 << 21)
+        self.assertEqual(day.free_mask, 0b1110 << 21)
+        self.assertEqual(day.longest_free_run, 3)
+        self.assertEqual(day.earliest_free_start, datetime.time(hour=11))
+        self.assertEqual(day.master_id, self.vasya.id)
+        self.assertEqual(day.date, self.schedule.date)
+
+    def test_slot_taken_and_deleted(self):
+        slot = self.schedule.get_slot('11:30')
+        slot.taken = True
+        slot.save()
+        day = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(day.free_mask, 0b1010 << 21)
+        self.assertEqual(day.longest_free_run, 1)
+
+        self.schedule.delete_slot('11:00')
+        day = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(day.exists_mask, 0b1101 << 21)
+        self.assertEqual(day.free_mask, 0b1000 << 21)
+        self.assertEqual(day.earliest_free_start, datetime.time(hour=12))
+
+    def test_assign_time(self):
+        self.schedule.assign_time(datetime.time(hour=11),
+                                  datetime.time(hour=12))
+        day = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(day.free_mask, 0b1000 << 21)
+        self.assertEqual(day.longest_free_run, 1)
+
+    def test_assign_time_does_not_lock_availability(self):
+        locked = []
+
+        def lock_availability():
+            try:
+                with transaction.atomic():
+                    DayAvailability.objects.select_for_update(nowait=True) \
+                        .get(schedule_id=self.schedule.id)
+                locked.append(True)
+            except DatabaseError:
+                locked.append(False)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            self.schedule.assign_time(datetime.time(hour=11),
+                                      datetime.time(hour=12))
+            # another booking of the master on the same day
+            thread = threading.Thread(target=lock_availability)
+            thread.start()
+            thread.join()
+        self.assertEqual(locked, [True])
+        day = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(day.free_mask, 0b1000 << 21)
+
+    def test_masters_with_free_run(self):
+        date_from = timezone.now().date()
+        date_to = date_from + delta(days=2)
+        master_ids = {item['master_id'] for item in
+                      availability.masters_with_free_run(3, date_from,
+                                                         date_to)}
+        self.assertEqual(master_ids, {self.vasya.id})
+        self.assertFalse(availability.masters_with_free_run(4, date_from,
+                                                            date_to))
+
+    def test_schedule_delete(self):
+        self.schedule.delete()
+        self.assertEqual(DayAvailability.objects.filter(
+            master=self.vasya).count(), 1)
+
+    def test_rebuild(self):
+        DayAvailability.objects.all().delete()
+        schedule = Schedule.objects.get(pk=self.schedule.id)
+        TimeSlot.objects.filter(schedule=schedule, start=12 * 60).update(
+            taken=True)
+
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertEqual(DayAvailability.objects.count(),
+                         Schedule.objects.count())
+        day = DayAvailability.objects.get(schedule=schedule)
+        self.assertEqual(day.free_mask, 0b0110 << 21)
+        self.assertEqual(day.longest_free_run, 2)
+
+    def test_new_slot(self):
+        TimeSlot.objects.create(start=12 * 60 + 30,
+                                taken=False, schedule=self.schedule)
+        day = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(day.longest_free_run, 4)
@@ -1,11 +1,14 @@
 from datetime import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase, APIClient
 
 from src.apps.authentication.models import Token
-from src.apps.masters.models import Master, Schedule, TimeSlot, Time
+from src.apps.masters.models import Master, Schedule, TimeSlot, \
+    DayAvailability
 from src.apps.masters.views import CreateDeleteScheduleView
 from src.utils.object_creation import make_master
 
@@ -22,13 +25,13 @@ class DeleteScheduleTestCase(APITestCase):
     def test_delete_time_slots(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date='2017-11-20')
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
         resp = self.client.patch(
@@ -53,10 +56,10 @@ class DeleteScheduleTestCase(APITestCase):
     def test_delete_time_slots_and_schedule(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date='2017-11-20')
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
         resp = self.client.patch(
@@ -75,16 +78,16 @@ class DeleteScheduleTestCase(APITestCase):
     def test_delete_time_slots_range(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date='2017-11-20')
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=0),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False,
                                 schedule=schedule),
         resp = self.client.patch(
@@ -110,10 +113,10 @@ class DeleteScheduleTestCase(APITestCase):
     def test_delete_time_slots_wrong_date(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date='2017-11-20')
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
         resp = self.client.patch(
@@ -127,14 +130,14 @@ class DeleteScheduleTestCase(APITestCase):
     def test_delete_time_slots_taken(self):
         schedule = Schedule.objects.create(master=self.master_object,
                                            date='2017-11-20')
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=True,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
-                                taken=False,
+        TimeSlot.objects.create(start=11 * 60 + 30,
+                                taken=True,
                                 schedule=schedule),
         resp = self.client.patch(
             reverse(CreateDeleteScheduleView.view_name,
@@ -144,3 +147,38 @@ class DeleteScheduleTestCase(APITestCase):
             }, format='json')
         self.assertEqual(resp.status_code,
                          status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # all conflicts are reported at once
+        self.assertEqual(resp.data['detail'],
+                         'Slots at 10:30, 11:30 can not be deleted '
+                         'because there are orders at that time')
+        # nothing is deleted
+        self.assertEqual(schedule.time_slots.count(), 3)
+
+    def test_delete_time_slots_queries(self):
+        schedule = Schedule.objects.create(master=self.master_object,
+                                           date='2017-11-20')
+        for start in range(10 * 60, 20 * 60, 30):
+            TimeSlot.objects.create(start=start, taken=False,
+                                    schedule=schedule)
+        url = reverse(CreateDeleteScheduleView.view_name,
+                      args=[self.master_object.id])
+
+        with CaptureQueriesContext(connection) as one_slot:
+            resp = self.client.patch(url, data={
+                'date': '2017-11-20',
+                'time_slots': '10:00'
+            }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        # the number of queries doesn't depend on the number of slots
+        with self.assertNumQueries(len(one_slot.captured_queries)):
+            resp = self.client.patch(url, data={
+                'date': '2017-11-20',
+                'time_slots': '10:30-18:00'
+            }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(schedule.time_slots.values_list('start', flat=True)),
+            [18 * 60 + 30, 19 * 60, 19 * 60 + 30])
+        self.assertEqual(
+            DayAvailability.objects.get(schedule=schedule).exists_mask,
+            0b111 << 37)
@@ -1,14 +1,16 @@
 import datetime
 from unittest import mock
 
+from django.test import override_settings
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
 from src.apps.core.exceptions import ApplicationError
 from src.apps.core.models import Location
-from src.apps.masters import gmaps_utils
-from src.apps.masters.models import Schedule, TimeSlot, Time
+from src.apps.masters import gmaps_utils, eta_cache
+from src.apps.masters.models import Schedule, TimeSlot
 from src.apps.orders.models import OrderItem, Order
+from src.utils.maps_stub import MapsClientStub
 from src.utils.object_creation import make_master, make_category, make_client
 
 
@@ -25,9 +27,9 @@ class GmapsTestCase(APITestCase):
         self.schedule.save()
 
     def test_free_previous_slot(self):
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=self.schedule)
         location = Location.objects.create(lat=10, lon=120)
 
@@ -38,7 +40,7 @@ class GmapsTestCase(APITestCase):
     @mock.patch.object(gmaps_utils, '_calculate_eta')
     def test_can_reach(self, _calculate_eta):
         slot = TimeSlot.objects.create(
-            time=Time.objects.create(hour=10, minute=30),
+            start=10 * 60 + 30,
             taken=True, schedule=self.schedule)
         order = Order.objects.create(client=make_client(), date=timezone.now(),
                                      time=timezone.now().time())
@@ -48,11 +50,11 @@ class GmapsTestCase(APITestCase):
             order=order,
             locked=False)
         slot.save()
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=self.schedule)
         location = Location.objects.create(lat=10, lon=120)
 
@@ -64,7 +66,7 @@ class GmapsTestCase(APITestCase):
     @mock.patch.object(gmaps_utils, '_calculate_eta')
     def test_cant_reach(self, _calculate_eta):
         slot = TimeSlot.objects.create(
-            time=Time.objects.create(hour=10, minute=30),
+            start=10 * 60 + 30,
             taken=True, schedule=self.schedule)
         order = Order.objects.create(client=make_client(), date=timezone.now(),
                                      time=timezone.now().time())
@@ -74,11 +76,11 @@ class GmapsTestCase(APITestCase):
             order=order,
             locked=False)
         slot.save()
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=self.schedule)
         location = Location.objects.create(lat=10, lon=120)
 
@@ -90,7 +92,7 @@ class GmapsTestCase(APITestCase):
     @mock.patch.object(gmaps_utils, '_calculate_eta')
     def test_gmaps_api_unavailable(self, _calculate_eta):
         slot = TimeSlot.objects.create(
-            time=Time.objects.create(hour=10, minute=30),
+            start=10 * 60 + 30,
             taken=True, schedule=self.schedule)
         order = Order.objects.create(client=make_client(), date=timezone.now(),
                                      time=timezone.now().time())
@@ -100,11 +102,11 @@ class GmapsTestCase(APITestCase):
             order=order,
             locked=False)
         slot.save()
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=self.schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=self.schedule)
         location = Location.objects.create(lat=10, lon=120)
 
@@ -112,3 +114,130 @@ class GmapsTestCase(APITestCase):
         with self.assertRaises(ApplicationError):
             gmaps_utils.can_reach(self.schedule, location,
                                   datetime.time(hour=11, minute=00))
+
+
+@override_settings(USE_ETA_CACHE=True)
+class EtaCacheTestCase(APITestCase):
+    def setUp(self):
+        eta_cache.clear()
+        self.departure = datetime.datetime(2018, 2, 5, hour=10, minute=30)
+
+    def tearDown(self):
+        eta_cache.clear()
+
+    @mock.patch.object(gmaps_utils, '_calculate_eta')
+    def test_cached(self, _calculate_eta):
+        _calculate_eta.return_value = 600
+        self.assertEqual(gmaps_utils.calculate_eta(
+            (10, 120), (10.01, 120.01), self.departure), 600)
+        # nearby points, same weekday and time bucket
+        self.assertEqual(gmaps_utils.calculate_eta(
+            (10.0001, 120.0001), (10.01, 120.01),
+            self.departure + datetime.timedelta(days=7, minutes=5)), 600)
+        _calculate_eta.assert_called_once()
+        self.assertEqual(eta_cache.stats(), {
+            'local_hits': 1, 'shared_hits': 0, 'misses': 1
+        })
+
+    @mock.patch.object(gmaps_utils, '_calculate_eta')
+    def test_shared_tier(self, _calculate_eta):
+        _calculate_eta.return_value = 600
+        gmaps_utils.calculate_eta((10, 120), (10.01, 120.01), self.departure)
+        # a different worker has an empty in-process tier
+        eta_cache._local.clear()
+        gmaps_utils.calculate_eta((10, 120), (10.01, 120.01), self.departure)
+        _calculate_eta.assert_called_once()
+        self.assertEqual(eta_cache.stats()['shared_hits'], 1)
+
+    @mock.patch.object(gmaps_utils, '_calculate_eta')
+    def test_different_bucket(self, _calculate_eta):
+        _calculate_eta.return_value = 600
+        gmaps_utils.calculate_eta((10, 120), (10.01, 120.01), self.departure)
+        gmaps_utils.calculate_eta((10, 120), (10.01, 120.01),
+                                  self.departure + datetime.timedelta(hours=1))
+        gmaps_utils.calculate_eta((10, 120), (10.01, 120.01),
+                                  self.departure + datetime.timedelta(days=1))
+        self.assertEqual(_calculate_eta.call_count, 3)
+
+    def test_lru_eviction(self):
+        lru = eta_cache.LRUCache(max_size=2)
+        lru.put('a', 1, timeout=60)
+        lru.put('b', 2, timeout=60)
+        lru.get('a')
+        lru.put('c', 3, timeout=60)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        lru.put('d', 4, timeout=-1)
+        self.assertIsNone(lru.get('d'))
+
+
+class BatchReachabilityTestCase(APITestCase):
+    def setUp(self):
+        self.departure = datetime.datetime(2018, 2, 5, hour=10, minute=30)
+
+    def test_resolve_etas_chunks(self):
+        destinations = [(10, 120 + i / 100) for i in range(30)]
+        origins = [(11, 120 + i / 100) for i in range(5)]
+        trips = [(origin, destination, self.departure)
+                 for origin in origins for destination in destinations]
+        stub = MapsClientStub(
+            eta_function=lambda origin, destination: int(destination[1] * 10))
+
+        etas = gmaps_utils.resolve_etas(trips, maps_client=stub)
+        self.assertEqual(len(etas), len(trips))
+        for (origin, destination, _), eta in etas.items():
+            self.assertEqual(eta, int(destination[1] * 10))
+        # 25 + 5 destinations, 4 + 5 origins per request
+        self.assertEqual(len(stub.requests), 2 + 1)
+        for _, request_origins, request_destinations, _ in stub.requests:
+            self.assertLessEqual(len(request_destinations), 25)
+            self.assertLessEqual(
+                len(request_origins) * len(request_destinations), 100)
+
+    def test_resolve_etas_groups_by_departure(self):
+        trips = [((11, 120), (10, 120), self.departure),
+                 ((11, 120), (10, 120),
+                  self.departure + datetime.timedelta(hours=1))]
+        stub = MapsClientStub()
+        self.assertEqual(len(gmaps_utils.resolve_etas(trips, stub)), 2)
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_can_reach(self):
+        vasya = make_master('VASYA', 120)
+        category = make_category('CATEGORY')
+        schedule = Schedule.objects.create(master=vasya, date=timezone.now())
+        for hour, minute, taken in ((10, 0, True), (10, 30, False),
+                                    (11, 0, False), (11, 30, True),
+                                    (12, 0, False)):
+            slot = TimeSlot.objects.create(
+                start=hour * 60 + minute,
+                taken=taken, schedule=schedule)
+            if taken:
+                client = make_client()
+                location = client.home_address.location
+                location.lat = 10 + hour / 100
+                location.save()
+                order = Order.objects.create(client=client,
+                                             date=timezone.now(),
+                                             time=slot.value)
+                slot.order_item = OrderItem.objects.create(
+                    service=category.services.first(), master=vasya,
+                    order=order, locked=False)
+                slot.save()
+
+        # only the trip from the 11:30 client is too long
+        stub = MapsClientStub(
+            eta_function=lambda origin, destination:
+            10000 if origin[0] == 10.11 else 10)
+        reachability = gmaps_utils.BatchReachability(
+            Location.objects.create(lat=10, lon=120), maps_client=stub)
+        times = [datetime.time(hour=10, minute=30),
+                 datetime.time(hour=11), datetime.time(hour=12)]
+        for time in times:
+            reachability.add(schedule, time)
+        reachability.resolve()
+
+        self.assertEqual([reachability.can_reach(schedule, time)
+                          for time in times], [True, True, False])
+        # two trips at different times
+        self.assertEqual(len(stub.requests), 2)
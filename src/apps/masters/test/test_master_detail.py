@@ -1,11 +1,20 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, \
+    APITransactionTestCase
 
 from src.apps.core import utils
-from src.apps.masters.models import Schedule
-from src.utils.object_creation import make_master, make_token
-from src.apps.masters.views import MasterDetailUpdateView
+from src.apps.masters.models import Master, Schedule, Feedback, TimeSlot
+from src.apps.masters.serializers import CachedMasterSerializer, \
+    MasterSerializer
+from src.utils.object_creation import make_master, make_token, \
+    make_client, make_category, make_order
+from src.apps.masters.views import MasterDetailUpdateView, MeMasterView, \
+    AddFeedbackView
 
 
 class MasterDetailTestCase(APITestCase):
@@ -46,3 +55,148 @@ class MasterDetailTestCase(APITestCase):
                         resp.data['schedule'][1]['date'])
         self.assertLess(resp.data['schedule'][1]['date'],
                         resp.data['schedule'][2]['date'])
+
+    def _add_schedule(self, days, hours):
+        schedule = Schedule.objects.create(master=self.master_object,
+                                           date=utils.get_date(days))
+        for hour in hours:
+            TimeSlot.objects.create(
+                start=hour * 60,
+                schedule=schedule, taken=False)
+
+    def test_rating_is_read_only(self):
+        resp = self.client.patch(
+            reverse(MasterDetailUpdateView.view_name,
+                    args=[self.master_object.id]),
+            data={'rating': 5, 'rating_count': 100, 'about': 'changed'},
+            format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        master = Master.objects.get(pk=self.master_object.id)
+        self.assertEqual(master.about, 'changed')
+        self.assertEqual(master.rating, 0)
+        self.assertEqual(master.rating_count, 0)
+
+    def test_schedule_constant_queries(self):
+        self._add_schedule(1, [12, 10, 11])
+        serializer = MasterSerializer(instance=self.master_object)
+        # schedules + time slots
+        with self.assertNumQueries(2):
+            schedule = serializer.get_schedule(self.master_object)
+        self.assertEqual([slot['time'] for slot in schedule[0]['time_slots']],
+                         ['10:00', '11:00', '12:00'])
+
+        for days in range(2, 10):
+            self._add_schedule(days, range(8, 20))
+        service = make_category('category').services.first()
+        self.master_object.services.add(service)
+        order, _ = make_order(client=make_client(), service=service,
+                              master=self.master_object,
+                              order_date=utils.get_date(1),
+                              order_time=datetime.time(hour=11))
+        with self.assertNumQueries(2):
+            schedule = serializer.get_schedule(self.master_object)
+        self.assertEqual(len(schedule), 9)
+        self.assertEqual(schedule[0]['time_slots'][1]['order_id'], order.id)
+
+
+# versions are bumped after commits
+class MasterDetailCacheTestCase(APITransactionTestCase):
+    def setUp(self):
+        # cached entries outlive the data of other tests
+        cache.clear()
+        self.master_object = make_master('123', 3)
+        self.schedule = Schedule.objects.create(master=self.master_object,
+                                                date=utils.get_date(1))
+        token = make_token(master=self.master_object)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.url = reverse(MasterDetailUpdateView.view_name,
+                           args=[self.master_object.id])
+
+    def _get(self, url=None):
+        resp = self.client.get(url or self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_same_as_master_serializer(self):
+        data = self._get()
+        # built from the cache
+        self.assertEqual(self._get(), data)
+        expected = MasterSerializer(
+            instance=Master.objects.get(pk=self.master_object.id),
+            context={'request': mock.Mock(
+                build_absolute_uri=lambda url: f'http://testserver{url}')}
+        ).data
+        self.assertEqual(list(data.keys()), list(expected.keys()))
+        self.assertEqual(data, expected)
+        self.assertEqual(self._get(reverse(MeMasterView.view_name)), data)
+
+    def test_fragments_are_cached(self):
+        self._get()
+        with mock.patch.object(CachedMasterSerializer,
+                               'get_portfolio') as portfolio_mock, \
+                mock.patch.object(CachedMasterSerializer,
+                                  'get_schedule') as schedule_mock:
+            self._get()
+            portfolio_mock.assert_not_called()
+            schedule_mock.assert_not_called()
+
+    def test_invalidated_on_changes(self):
+        self._get()
+        self.master_object.about = 'changed'
+        self.master_object.save()
+        self.assertEqual(self._get()['about'], 'changed')
+
+        TimeSlot.objects.create(start=10 * 60,
+                                schedule=self.schedule, taken=False)
+        self.assertEqual(len(self._get()['schedule'][0]['time_slots']), 1)
+
+        self.master_object.portfolio.first().delete()
+        self.assertEqual(self._get()['portfolio'], [])
+
+        client = make_client()
+        Feedback.objects.create(client=client, master=self.master_object,
+                                rating=4, text='nice',
+                                date=utils.get_date(0))
+        self.assertEqual(self._get()['feedback'][0]['text'], 'nice')
+        client.first_name = 'renamed'
+        client.save()
+        self.assertEqual(self._get()['feedback'][0]['client']['first_name'],
+                         'renamed')
+
+        service = make_category('category').services.first()
+        self.master_object.services.add(service)
+        self.assertEqual(len(self._get()['services']), 1)
+        service.name = 'renamed'
+        service.save()
+        self.assertEqual(self._get()['services'][0]['name'], 'renamed')
+
+    def test_invalidated_on_feedback(self):
+        self.assertEqual(self._get()['rating'], 0)
+
+        service = make_category('category').services.first()
+        self.master_object.services.add(service)
+        TimeSlot.objects.create(start=11 * 60, schedule=self.schedule,
+                                taken=False)
+        client = make_client()
+        order, _ = make_order(client, service, self.master_object,
+                              order_time=datetime.time(hour=11),
+                              order_date=self.schedule.date)
+        client_api = APIClient()
+        client_api.credentials(
+            HTTP_AUTHORIZATION=f'Token {make_token(client=client).key}')
+        resp = client_api.post(
+            reverse(AddFeedbackView.view_name, args=[self.master_object.id]),
+            data={
+                'rating': 4.0,
+                'text': 'nice',
+                'date': utils.get_date(0),
+                'order_id': order.id
+            }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        data = self._get()
+        self.assertEqual(data['rating'], 4.0)
+        self.assertEqual(data['rating_count'], 1)
+        self.assertEqual(data['feedback'][0]['text'], 'nice')
@@ -3,15 +3,18 @@ from datetime import timedelta as delta
 
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.core import utils
-from src.apps.masters.models import Master
-from src.apps.masters.serializers import SimpleMasterSerializer
+from src.apps.masters.models import Master, Schedule, TimeSlot
+from src.apps.masters.serializers import SimpleMasterSerializer, \
+    serialize_master_list
 from src.apps.masters.views import MasterListCreateView
-from src.utils.object_creation import make_everything, make_client, make_order
+from src.utils.object_creation import make_everything, make_client, \
+    make_order, make_master
 
 
 class MasterListTestCase(APITestCase):
@@ -36,6 +39,39 @@ class MasterListTestCase(APITestCase):
         self.assertEqual(data['location']['lon'], master.location.lon)
         self.assertEqual(data['distance'], serializer.DISTANCE_NOT_AVAILABLE)
 
+    def test_serialize_master_list_output(self):
+        # a master without a location, avatar and `about`
+        make_master('EMPTY', about='').services.add(
+            Master.objects.get(first_name='VASYA').services.first())
+        Master.objects.filter(first_name='EMPTY').update(
+            location=None, avatar=None)
+        masters = list(Master.objects.order_by('id'))
+        request = APIRequestFactory().get('/')
+        renderer = JSONRenderer()
+        contexts = [{}, {'request': request}, {
+            'request': request,
+            'coordinates': (10.03, 12.43),
+            'distances': {masters[0].id: 0, masters[1].id: 12.5},
+            'available_slots': {masters[0].id: ['10:30', '11:00']}
+        }]
+        for context in contexts:
+            expected = SimpleMasterSerializer(masters, many=True,
+                                              context=context).data
+            self.assertEqual(
+                renderer.render(serialize_master_list(masters, context)),
+                renderer.render(expected))
+
+    def test_serialize_master_list_queries(self):
+        for i in range(5):
+            make_master(f'MASTER{i}').services.add(
+                *Master.objects.get(first_name='VASYA').services.all())
+        # masters + locations + services with categories
+        with self.assertNumQueries(3):
+            data = serialize_master_list(Master.objects.all(), {})
+        self.assertEqual(len(data), 7)
+        # dicts of the same service are shared
+        self.assertIs(data[-1]['services'][0], data[-2]['services'][0])
+
     def test_filtering_distance(self):
         url = f'{reverse(MasterListCreateView.view_name)}?' \
               f'distance=200&' \
@@ -86,6 +122,17 @@ class MasterListTestCase(APITestCase):
         # both do at least one service in the following week
         self.assertEqual(len(others), 2)
 
+    def test_filtering_date_ignores_single_date(self):
+        # nobody works on the 6th day, but the search filter
+        # looks for slots within the whole range
+        url = f"{reverse(MasterListCreateView.view_name)}?" \
+              f"date_range={utils.get_date(0)},{utils.get_date(7)}&" \
+              f"date={utils.get_date(6)}&" \
+              f"coordinates=10.03,12.43"
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['others']), 2)
+
     def test_filtering_date_favorites(self):
         # manually creating an order with vasya
         vasya = Master.objects.get(first_name='VASYA')
@@ -141,3 +188,45 @@ class MasterListTestCase(APITestCase):
         self.assertEqual(len(others), 1)
 
         self.assertEqual(others[0]['first_name'], 'VASYA')
+
+    def test_pagination(self):
+        make_master('GRISHA', 12.4, lat=10.03).services.add(
+            *Master.objects.get(first_name='PETYA').services.all())
+        schedule = Schedule.objects.create(
+            master=Master.objects.get(first_name='GRISHA'),
+            date=timezone.now() + delta(days=1))
+        for minute in (0, 30):
+            TimeSlot.objects.create(start=10 * 60 + minute,
+                                    taken=False, schedule=schedule)
+        vasya = Master.objects.get(first_name='VASYA')
+        make_order(client=self.client_object, master=vasya,
+                   service=vasya.services.all()[0],
+                   order_date=timezone.now() + delta(days=1),
+                   order_time=datetime.time(hour=10, minute=30))
+
+        url = f'{reverse(MasterListCreateView.view_name)}?' \
+              f'coordinates=10.03,12.43&limit=2'
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        # favorites go first
+        self.assertEqual([m['first_name'] for m in resp.data['favorites']],
+                         ['VASYA'])
+        # the closest one out of others
+        self.assertEqual([m['first_name'] for m in resp.data['others']],
+                         ['GRISHA'])
+        self.assertIsNotNone(resp.data['next'])
+
+        resp = self.client.get(f'{url}&cursor={resp.data["next"]}')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['favorites'], [])
+        self.assertEqual([m['first_name'] for m in resp.data['others']],
+                         ['PETYA'])
+        self.assertIsNone(resp.data['next'])
+
+    def test_pagination_invalid_params(self):
+        url = f'{reverse(MasterListCreateView.view_name)}?' \
+              f'coordinates=10.03,12.43'
+        resp = self.client.get(f'{url}&limit=0')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(f'{url}&limit=2&cursor=garbage')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
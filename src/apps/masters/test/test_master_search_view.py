@@ -11,8 +11,9 @@ from rest_framework.test import APIClient
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.core import utils
 from src.apps.masters import gmaps_utils
-from src.apps.masters.models import Master, Time, TimeSlot, Schedule
+from src.apps.masters.models import Master, TimeSlot, Schedule
 from src.apps.masters.views import MasterSearchView, MasterBestMatchView
+from src.utils.maps_stub import MapsClientStub
 from src.utils.object_creation import make_everything, make_client, make_order
 
 
@@ -25,8 +26,9 @@ class MasterSearchViewTestCase(TestCase):
         self.client = APIClient()
         self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
 
-    @mock.patch.object(gmaps_utils, '_calculate_eta')
-    def test_master_search_only_service(self, _calculate_eta):
+    # assume all slots are reachable
+    @mock.patch.object(gmaps_utils, 'gmaps', MapsClientStub(eta_seconds=10))
+    def test_master_search_only_service(self):
         master = Master.objects.get(first_name='VASYA')
         service = master.services.all()[0]
         # manually creating an order
@@ -34,9 +36,6 @@ class MasterSearchViewTestCase(TestCase):
                    order_date=timezone.now() + delta(days=1),
                    order_time=datetime.time(hour=10, minute=30))
 
-        # assume all slots are reachable
-        _calculate_eta.return_value = 10
-
         url = reverse(MasterSearchView.view_name)
         resp = self.client.get(f"{url}?service={service.id}&coordinates=10,20")
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -53,8 +52,9 @@ class MasterSearchViewTestCase(TestCase):
         self.assertEqual(len(day_one_slots), 2)
 
     # TODO MORE TESTS
-    @mock.patch.object(gmaps_utils, '_calculate_eta')
-    def test_master_search_two_services(self, _calculate_eta):
+    # assume all slots are reachable
+    @mock.patch.object(gmaps_utils, 'gmaps', MapsClientStub(eta_seconds=10))
+    def test_master_search_two_services(self):
         master = Master.objects.get(first_name='VASYA')
         schedule = master.get_schedule(utils.get_date(1))
         schedule.delete()
@@ -62,22 +62,19 @@ class MasterSearchViewTestCase(TestCase):
                                                                + delta(days=1))
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+        TimeSlot.objects.create(start=13 * 60,
                                 taken=False, schedule=schedule)
 
-        # assume all slots are reachable
-        _calculate_eta.return_value = 10
-
         url = reverse(MasterSearchView.view_name)
         service_ids = ','.join(
             [str(service.id) for service in master.services.all()[0:2]])
@@ -106,13 +103,13 @@ class MasterSearchViewTestCase(TestCase):
                                            date=timezone.now() + delta(days=1))
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=schedule)
 
         service = master.services.all()[0]
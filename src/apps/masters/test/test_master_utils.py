@@ -1,9 +1,19 @@
+import datetime
+import math
+from datetime import timedelta as delta
 from unittest import skip
 from unittest.mock import MagicMock, PropertyMock
 
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from src.apps.core.geo import EARTH_RADIUS_KM
+from src.apps.core.models import Location
 from src.apps.masters import master_utils
+from src.apps.masters.filtering import FilteringParams
+from src.apps.masters.models import Master
+from src.utils.object_creation import make_everything, make_client, \
+    make_order
 
 
 def make_generic_mock(**kwargs):
@@ -18,6 +28,10 @@ def make_master_mock(id=None, distance=None, rating=None, times_served=None):
     mock = MagicMock()
     if distance is not None:
         mock.distance.return_value = distance
+        # a point `distance` km to the north of (10, 10)
+        location_prop = PropertyMock(return_value=Location(
+            lat=10 + math.degrees(distance / EARTH_RADIUS_KM), lon=10))
+        type(mock).location = location_prop
     if rating is not None:
         rating_prop = PropertyMock(return_value=rating)
         type(mock).rating = rating_prop
@@ -40,12 +54,20 @@ class SortTestCase(APITestCase):
                    make_master_mock(id=3, distance=1, rating=0.4)]
         result = master_utils.sort_masters(masters, coordinates=(10, 10),
                                            max_distance=10)
+        # scores are 4.2, 8.8, 5.7, 3.26
+        self.assertEqual([master.id for master in result], [1, 2, 0, 3])
+
+    def test_rank_distances(self):
+        masters = [make_master_mock(id=0, distance=10, rating=3),
+                   make_master_mock(id=1, distance=4, rating=5)]
+        result, distances = master_utils.rank_masters(
+            masters, coordinates=(10, 10), max_distance=10)
+        self.assertEqual([master.id for master in result], [1, 0])
+        self.assertAlmostEqual(distances[0], 10)
+        self.assertAlmostEqual(distances[1], 4)
+        # distances are computed in a single batch
         for master in masters:
-            master.distance.assert_called_once()
-        self.assertEqual(result[0].id, 1)
-        self.assertEqual(result[1].id, 0)
-        self.assertEqual(result[2].id, 2)
-        self.assertEqual(result[3].id, 3)
+            master.distance.assert_not_called()
 
 
 class SearchFilteringTestCase(APITestCase):
@@ -53,6 +75,27 @@ class SearchFilteringTestCase(APITestCase):
     pass
 
 
+class SearchRadiusTestCase(APITestCase):
+    def setUp(self):
+        make_everything()
+
+    def test_masters_outside_radius_are_not_evaluated(self):
+        evaluated = []
+
+        def filter_function(masters, params):
+            evaluated.extend(masters)
+            return masters, {}
+
+        # VASYA lives at 10,11 and PETYA at 10,12 - about 110 km away
+        params = FilteringParams({'coordinates': '10,11.05',
+                                  'distance': '20'}, client=make_client())
+        masters, _ = master_utils.search(params, filter_function)
+        self.assertEqual([master.first_name for master in evaluated],
+                         ['VASYA'])
+        self.assertEqual([master.first_name for master in masters],
+                         ['VASYA'])
+
+
 class DateTimeFilteringTestCase(APITestCase):
     # TODO test
     pass
@@ -63,6 +106,34 @@ class AnytimeFilteringTestCase(APITestCase):
     pass
 
 
+class FavoritesTestCase(APITestCase):
+    def setUp(self):
+        make_everything()
+        self.vasya = Master.objects.get(first_name='VASYA')
+        self.petya = Master.objects.get(first_name='PETYA')
+        self.client_object = make_client()
+        make_order(client=self.client_object, master=self.vasya,
+                   service=self.vasya.services.all()[0],
+                   order_date=timezone.now() + delta(days=1),
+                   order_time=datetime.time(hour=10, minute=30))
+
+    def test_favorite_master_ids(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                master_utils.favorite_master_ids(self.client_object),
+                {self.vasya.id})
+        self.assertEqual(master_utils.favorite_master_ids(make_client()),
+                         set())
+        self.assertEqual(master_utils.favorite_master_ids(None), set())
+
+    def test_split(self):
+        with self.assertNumQueries(1):
+            favorites, regular = master_utils.split(
+                [self.vasya, self.petya], self.client_object)
+        self.assertEqual(favorites, [self.vasya])
+        self.assertEqual(regular, [self.petya])
+
+
 # TODO rewrite and unskip
 class SplitTestCase(APITestCase):
     @skip
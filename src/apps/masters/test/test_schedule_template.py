@@ -0,0 +1,142 @@
+import datetime
+from datetime import timedelta as delta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase, APIClient
+
+from src.apps.authentication.models import Token
+from src.apps.masters import schedule_templates
+from src.apps.masters.models import Schedule, TimeSlot, ScheduleTemplate, \
+    DayAvailability
+from src.apps.masters.views import ScheduleTemplateView
+from src.utils.object_creation import make_master
+
+
+class ScheduleTemplateTestCase(APITestCase):
+    def setUp(self):
+        self.master_object = make_master('VASYA', 10)
+        token, _ = Token.objects.get_or_create(master=self.master_object)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.url = reverse(ScheduleTemplateView.view_name,
+                           args=[self.master_object.id])
+        self.today = timezone.now().date()
+
+    def test_put_and_get(self):
+        resp = self.client.put(self.url, data=[
+            {'weekday': 0, 'time_slots': '10:00-11:00,15:00'},
+            {'weekday': 3, 'time_slots': '12:00-13:00'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        # a schedule for every monday and thursday within two weeks
+        schedules = Schedule.objects.filter(master=self.master_object)
+        expected_dates = [self.today + delta(days=i) for i in range(15)
+                          if (self.today + delta(days=i)).weekday() in (0, 3)]
+        self.assertEqual(sorted(schedule.date for schedule in schedules),
+                         expected_dates)
+        for schedule in schedules:
+            starts = list(schedule.time_slots.order_by('start')
+                          .values_list('start', flat=True))
+            if schedule.date.weekday() == 0:
+                self.assertEqual(starts, [600, 630, 660, 900])
+            else:
+                self.assertEqual(starts, [720, 750, 780])
+            availability = DayAvailability.objects.get(schedule=schedule)
+            self.assertEqual(availability.master_id, self.master_object.id)
+            self.assertEqual(availability.free_mask,
+                             availability.exists_mask)
+            self.assertEqual(availability.longest_free_run, 3)
+
+        # the old template is replaced
+        resp = self.client.put(self.url, data=[
+            {'weekday': 3, 'time_slots': '09:00'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, [{'weekday': 3, 'time_slots': '09:00'}])
+
+    def test_put_invalid(self):
+        resp = self.client.put(self.url, data=[
+            {'weekday': 0, 'time_slots': '10:00'},
+            {'weekday': 0, 'time_slots': '11:00'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.put(self.url, data=[
+            {'weekday': 7, 'time_slots': '10:00'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.put(self.url, data=[
+            {'weekday': 1, 'time_slots': '10:15'},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ScheduleTemplate.objects.exists())
+
+    def test_expand_skips_existing_schedules(self):
+        existing_date = self.today + delta(days=1)
+        new_date = self.today + delta(days=2)
+        for date in (existing_date, new_date):
+            ScheduleTemplate.objects.create(master=self.master_object,
+                                            weekday=date.weekday(),
+                                            time_slots='10:00-11:00')
+        schedule = Schedule.objects.create(master=self.master_object,
+                                           date=existing_date)
+        TimeSlot.objects.create(schedule=schedule, start=8 * 60, taken=False)
+
+        schedule_templates.expand(master_ids=[self.master_object.id],
+                                  date_range=(existing_date, new_date))
+
+        self.assertEqual(list(schedule.time_slots.values_list('start',
+                                                              flat=True)),
+                         [8 * 60])
+        new = Schedule.objects.get(master=self.master_object, date=new_date)
+        self.assertEqual(sorted(new.time_slots.values_list('start',
+                                                           flat=True)),
+                         [600, 630, 660])
+        availability = DayAvailability.objects.get(schedule=new)
+        self.assertEqual(availability.earliest_free_start,
+                         datetime.time(hour=10))
+
+    def test_command_keeps_edited_days(self):
+        self._make_templates(self.master_object)
+        call_command('expand_schedule_templates', stdout=StringIO())
+
+        # the master takes a day off in the morning
+        date = self.today + delta(days=1)
+        schedule = Schedule.objects.get(master=self.master_object, date=date)
+        TimeSlot.objects.filter(schedule=schedule, start__lt=14 * 60).delete()
+        call_command('expand_schedule_templates', stdout=StringIO())
+
+        schedule = Schedule.objects.get(master=self.master_object, date=date)
+        self.assertEqual(schedule.time_slots.order_by('start').first().start,
+                         14 * 60)
+        availability = DayAvailability.objects.get(schedule=schedule)
+        self.assertEqual(availability.earliest_free_start,
+                         datetime.time(hour=14))
+
+    def _make_templates(self, master):
+        for weekday in range(7):
+            ScheduleTemplate.objects.create(master=master, weekday=weekday,
+                                            time_slots='10:00-18:00')
+
+    def test_command_queries(self):
+        self._make_templates(self.master_object)
+        with CaptureQueriesContext(connection) as one_master:
+            call_command('expand_schedule_templates', stdout=StringIO())
+
+        for i in range(5):
+            self._make_templates(make_master(f'MASTER{i}', 10))
+        Schedule.objects.all().delete()
+        # the number of queries doesn't depend on the number of masters
+        with self.assertNumQueries(len(one_master.captured_queries)):
+            call_command('expand_schedule_templates', stdout=StringIO())
+        self.assertEqual(Schedule.objects.count(), 6 * 15)
+        self.assertEqual(TimeSlot.objects.count(), 6 * 15 * 17)
+        self.assertEqual(DayAvailability.objects.count(), 6 * 15)
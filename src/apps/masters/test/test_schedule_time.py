@@ -1,29 +1,32 @@
 import datetime
 
-from django.test import TestCase
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from src.apps.masters.models import TimeSlot, Schedule, Time
+from src.apps.masters.models import TimeSlot, Schedule, DayAvailability
 from src.utils.object_creation import make_master
 
 
-class ScheduleTestCase(TestCase):
+# availability of booked slots is refreshed after commits
+class ScheduleTestCase(TransactionTestCase):
     def test_schedule_assign_time(self):
         master = make_master('master', 100)
         schedule = Schedule.objects.create(master=master, date=timezone.now())
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
 
@@ -33,26 +36,26 @@ class ScheduleTestCase(TestCase):
 
         self.assertEqual(datetime.time(hour=12, minute=00), next_time)
         slots = schedule.time_slots.filter(
-            time__value__in=['10:30', '11:00', '11:30'],
+            start__in=[10 * 60 + 30, 11 * 60, 11 * 60 + 30],
             taken=True)
         self.assertEqual(len(slots), 3)
 
     def test_schedule_assign_time_end_of_day(self):
         master = make_master('master', 100)
         schedule = Schedule.objects.create(master=master, date=timezone.now())
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
 
@@ -61,29 +64,71 @@ class ScheduleTestCase(TestCase):
             end_time=datetime.time(hour=13, minute=00))
 
         self.assertIsNone(next_time)
-        slots = schedule.time_slots.filter(time__value__in=['12:00', '12:30'],
+        slots = schedule.time_slots.filter(start__in=[12 * 60, 12 * 60 + 30],
                                            taken=True)
         self.assertEqual(len(slots), 2)
 
     def test_schedule_assign_time_time_not_found(self):
         master = make_master('master', 100)
         schedule = Schedule.objects.create(master=master, date=timezone.now())
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False,
                                 schedule=schedule),
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False,
                                 schedule=schedule),
 
         with self.assertRaises(ValueError):
             schedule.assign_time(start_time=datetime.time(hour=21, minute=10),
                                  end_time=datetime.time(hour=22, minute=00))
+
+    def _make_schedule(self, starts):
+        master = make_master('master', 100)
+        schedule = Schedule.objects.create(master=master, date=timezone.now())
+        for start in starts:
+            TimeSlot.objects.create(start=start, taken=False,
+                                    schedule=schedule)
+        return schedule
+
+    def test_schedule_assign_time_queries(self):
+        schedule = self._make_schedule(range(10 * 60, 16 * 60, 30))
+        with CaptureQueriesContext(connection) as short_range:
+            schedule.assign_time(start_time=datetime.time(hour=15),
+                                 end_time=datetime.time(hour=15, minute=30))
+        # the number of queries doesn't depend on the length of the range
+        with self.assertNumQueries(len(short_range.captured_queries)):
+            next_time = schedule.assign_time(
+                start_time=datetime.time(hour=10),
+                end_time=datetime.time(hour=14))
+        self.assertEqual(next_time, datetime.time(hour=14))
+        self.assertEqual(schedule.time_slots.filter(taken=True).count(), 9)
+
+        availability = DayAvailability.objects.get(schedule=schedule)
+        self.assertEqual(availability.longest_free_run, 2)
+        self.assertEqual(availability.earliest_free_start,
+                         datetime.time(hour=14))
+
+    def test_schedule_assign_time_gap(self):
+        # no slot at 11:00
+        schedule = self._make_schedule([10 * 60, 10 * 60 + 30, 11 * 60 + 30,
+                                        12 * 60])
+        with self.assertRaises(ValueError):
+            schedule.assign_time(start_time=datetime.time(hour=10),
+                                 end_time=datetime.time(hour=12))
+        # nothing is taken
+        self.assertFalse(schedule.time_slots.filter(taken=True).exists())
+
+        next_time = schedule.assign_time(
+            start_time=datetime.time(hour=10),
+            end_time=datetime.time(hour=11))
+        # next slot after the gap
+        self.assertEqual(next_time, datetime.time(hour=11, minute=30))
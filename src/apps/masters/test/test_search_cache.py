@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.test import APITransactionTestCase
+
+from src.apps.masters import cache_versions, master_utils, search_cache
+from src.apps.masters.filtering import FilteringParams, FilteringFunctions
+from src.apps.masters.models import Master
+from src.utils.object_creation import make_everything, make_client
+
+
+# versions are bumped after commits
+class SearchCacheTestCase(APITransactionTestCase):
+    def setUp(self):
+        # cached entries outlive the data of other tests
+        cache.clear()
+        make_everything()
+        self.client_object = make_client()
+
+    def _params(self, coordinates='10,11', client=None):
+        return FilteringParams({'coordinates': coordinates},
+                               client=client or self.client_object)
+
+    def test_cached_results(self):
+        masters, _ = master_utils.cached_search(self._params(),
+                                                FilteringFunctions.search)
+        self.assertEqual(len(masters), 2)
+
+        with mock.patch.object(master_utils, 'search') as search_mock:
+            # a nearby point and another client
+            cached, _ = master_utils.cached_search(
+                self._params(coordinates='10.0001,11.0001',
+                             client=make_client()),
+                FilteringFunctions.search)
+            search_mock.assert_not_called()
+        self.assertEqual({master.id for master in cached},
+                         {master.id for master in masters})
+
+    def test_invalidated_on_schedule_change(self):
+        master_utils.cached_search(self._params(), FilteringFunctions.search)
+        vasya = Master.objects.get(first_name='VASYA')
+        vasya.schedule.first().time_slots.first().delete()
+
+        with mock.patch.object(master_utils, 'search',
+                               return_value=([], {})) as search_mock:
+            master_utils.cached_search(self._params(),
+                                       FilteringFunctions.search)
+            search_mock.assert_called_once()
+
+    def test_invalidated_after_commit(self):
+        version = cache_versions.get(search_cache.VERSION_KEY)
+        with transaction.atomic():
+            search_cache.invalidate()
+            search_cache.invalidate()
+            self.assertEqual(cache_versions.get(search_cache.VERSION_KEY),
+                             version)
+        self.assertEqual(cache_versions.get(search_cache.VERSION_KEY),
+                         version + 1)
+
+        # versions are not evicted along with cached results
+        cache.clear()
+        self.assertEqual(cache_versions.get(search_cache.VERSION_KEY),
+                         version + 1)
+
+    def test_key_depends_on_client_home_for_anytime(self):
+        other_client = make_client()
+        location = other_client.home_address.location
+        location.lat = 20
+        location.save()
+
+        params = self._params()
+        other_params = self._params(client=other_client)
+        self.assertEqual(
+            search_cache.make_key(params, FilteringFunctions.search),
+            search_cache.make_key(other_params, FilteringFunctions.search))
+        self.assertNotEqual(
+            search_cache.make_key(params, FilteringFunctions.anytime),
+            search_cache.make_key(other_params, FilteringFunctions.anytime))
+
+    def test_key_depends_on_services(self):
+        params = self._params()
+        service_params = FilteringParams({'coordinates': '10,11',
+                                          'services': str(params.services[0])},
+                                         client=self.client_object)
+        self.assertNotEqual(
+            search_cache.make_key(params, FilteringFunctions.search),
+            search_cache.make_key(service_params, FilteringFunctions.search))
@@ -7,7 +7,6 @@ from src.apps.core import utils
 from src.apps.masters import time_slot_utils
 from src.apps.masters.models import TimeSlot
 from src.apps.masters.time_slot_utils import add_time
-from src.utils.object_creation import _make_time
 
 
 class TimeUtilsTestCase(TestCase):
@@ -25,11 +24,11 @@ class TimeUtilsTestCase(TestCase):
 
     def test_find_avaiable_slots(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # TimeSlot.objects.bulk_create(time)
         # max - 60 - 2+1 slots
@@ -43,11 +42,11 @@ class TimeUtilsTestCase(TestCase):
 
     def test_find_avaiable_slots_no_slots(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=True),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=True),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=True),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=True),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # TimeSlot.objects.bulk_create(time)
         # max - 60 - 2+1 slots
@@ -57,11 +56,11 @@ class TimeUtilsTestCase(TestCase):
 
     def test_find_avaiable_slots_end_of_day_slot(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=True),
-            TimeSlot(time=_make_time(11, 30), taken=True),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=True),
+            TimeSlot(start=11 * 60 + 30, taken=True),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # TimeSlot.objects.bulk_create(time)
         # max - 60 - 2+1 slots
@@ -72,11 +71,11 @@ class TimeUtilsTestCase(TestCase):
 
     def test_find_avaiable_slots_mid_day_slot(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=True),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=True),
         ]
         # TimeSlot.objects.bulk_create(time)
         # max - 60 - 2+1 slots
@@ -101,11 +100,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_fits(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         result = time_slot_utils.service_fits_into_slots(
@@ -116,11 +115,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_no_fit(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=True),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=True),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=True),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=True),
         ]
         # max - 60 - 2+1 slots
         result = time_slot_utils.service_fits_into_slots(
@@ -131,11 +130,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_fits_end_of_day(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=True),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=True),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         result = time_slot_utils.service_fits_into_slots(
@@ -146,11 +145,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_no_fit_filter(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         result = time_slot_utils.service_fits_into_slots(
@@ -161,11 +160,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_fits_same_time(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         result = time_slot_utils.service_fits_into_slots(
@@ -175,11 +174,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_doesnt_fit_duration(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         time_from = datetime.time(hour=10, minute=30)
@@ -192,11 +191,11 @@ class ScheduleFitTestCase(TestCase):
 
     def test_fits_duration(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=True),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=True),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         # max - 60 - 2+1 slots
         time_from = datetime.time(hour=11, minute=30)
@@ -252,15 +251,42 @@ class TestParseTimeSlots(TestCase):
         self.assertEqual(slots[3].hour, 12)
         self.assertEqual(slots[3].minute, 30)
 
+    def test_range_past_midnight(self):
+        self.assertEqual(
+            sorted(time_slot_utils.parse_slot_starts('23:00-01:00',
+                                                     include_last=True)),
+            [0, 30, 60, 23 * 60, 23 * 60 + 30])
+
+    def test_invalid(self):
+        for slots_string in ('', '10:00-', '25:00', 'ab', '10:00-11:00-12:00',
+                             '10:15-11:00'):
+            with self.assertRaises(ValueError):
+                time_slot_utils.parse_time_slots(slots_string)
+
+
+class TestAddTime(TestCase):
+    def test_add_time(self):
+        self.assertEqual(add_time(datetime.time(hour=10), minutes=90),
+                         datetime.time(hour=11, minute=30))
+        self.assertEqual(add_time(datetime.time(hour=23, minute=45),
+                                  minutes=30),
+                         datetime.time(hour=0, minute=15))
+        self.assertEqual(add_time(datetime.time(hour=10, second=30),
+                                  minutes=-30),
+                         datetime.time(hour=9, minute=30, second=30))
+        self.assertEqual(add_time(datetime.datetime(2018, 1, 1, hour=10),
+                                  hours=1, seconds=5),
+                         datetime.time(hour=11, second=5))
+
 
 class TestSplitSlots(TestCase):
     def test_ok_split(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(11, 30), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=11 * 60 + 30, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
         ]
         split = time_slot_utils.split_slots(time_slots)
         self.assertEqual(len(split), 1)
@@ -271,11 +297,11 @@ class TestSplitSlots(TestCase):
 
     def test_split_two_groups(self):
         time_slots = [
-            TimeSlot(time=_make_time(10, 30), taken=False),
-            TimeSlot(time=_make_time(11, 00), taken=False),
-            TimeSlot(time=_make_time(12, 00), taken=False),
-            TimeSlot(time=_make_time(12, 30), taken=False),
-            TimeSlot(time=_make_time(13, 00), taken=False),
+            TimeSlot(start=10 * 60 + 30, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+            TimeSlot(start=12 * 60, taken=False),
+            TimeSlot(start=12 * 60 + 30, taken=False),
+            TimeSlot(start=13 * 60, taken=False),
         ]
         split = time_slot_utils.split_slots(time_slots)
         self.assertEqual(len(split), 2)
@@ -286,3 +312,90 @@ class TestSplitSlots(TestCase):
         self.assertEqual(split[1][0].value, datetime.time(hour=12, minute=00))
         self.assertEqual(split[1][1].value, datetime.time(hour=12, minute=30))
         self.assertEqual(split[1][2].value, datetime.time(hour=13, minute=00))
+
+
+class DayMaskTestCase(TestCase):
+    def _make_slots(self, taken):
+        # contiguous day starting at 10:00
+        return [TimeSlot(start=(10 + i // 2) * 60 + (i % 2) * 30,
+                         taken=is_taken) for i, is_taken in enumerate(taken)]
+
+    def test_make_day_mask(self):
+        time_slots = self._make_slots([False, True, False])
+        day_mask = time_slot_utils.make_day_mask(time_slots)
+        first = time_slot_utils.slot_index(datetime.time(hour=10))
+        self.assertEqual(first, 20)
+        self.assertEqual(day_mask.exists, 0b111 << first)
+        self.assertEqual(day_mask.free, 0b101 << first)
+        self.assertEqual(time_slot_utils.slot_time(first + 1),
+                         datetime.time(hour=10, minute=30))
+
+    def test_starting_slots_match_reference(self):
+        patterns = [
+            [False] * 5,
+            [False, True, False, True, False],
+            [True, True, True, False, False],
+            [True, False, False, False, True],
+            [False, False, True, False, False, False, False, True],
+            [False],
+        ]
+        for taken in patterns:
+            time_slots = self._make_slots(taken)
+            day_mask = time_slot_utils.make_day_mask(time_slots)
+            for duration in (30, 60, 90, 120):
+                for ignore_taken in (False, True):
+                    expected = [
+                        slot.value for slot in time_slot_utils
+                        .find_available_starting_slots_for_duration(
+                            duration, time_slots, ignore_taken)]
+                    mask = time_slot_utils.find_available_starting_slots_mask(
+                        duration, day_mask, ignore_taken)
+                    actual = [time_slot_utils.slot_time(index) for index in
+                              time_slot_utils.mask_indices(mask)]
+                    self.assertEqual(actual, expected,
+                                     f'{taken} {duration} {ignore_taken}')
+
+    def test_fits_match_reference(self):
+        time_slots = self._make_slots([True, False, False, True, False, False])
+        day_mask = time_slot_utils.make_day_mask(time_slots)
+        ranges = [
+            (None, None),
+            (datetime.time(hour=10, minute=30), None),
+            (datetime.time(hour=10, minute=30),
+             datetime.time(hour=11, minute=30)),
+            (datetime.time(hour=10, minute=15),
+             datetime.time(hour=12, minute=0)),
+            (datetime.time(hour=12, minute=0), None),
+            (datetime.time(hour=13, minute=0), None),
+        ]
+        for time_from, time_to in ranges:
+            for duration in (30, 60, 90):
+                expected = time_slot_utils.duration_fits_into_slots(
+                    duration, time_slots, time_from, time_to)
+                actual = time_slot_utils.duration_fits_into_mask(
+                    duration, day_mask, time_from, time_to)
+                self.assertEqual(actual, expected,
+                                 f'{time_from} {time_to} {duration}')
+
+    def test_fits_empty_and_invalid(self):
+        self.assertFalse(time_slot_utils.duration_fits_into_mask(
+            30, time_slot_utils.DayMask(free=0, exists=0)))
+        day_mask = time_slot_utils.make_day_mask(self._make_slots([False] * 3))
+        with self.assertRaises(ValueError):
+            time_slot_utils.duration_fits_into_mask(
+                30, day_mask, time_from=datetime.time(hour=11),
+                time_to=datetime.time(hour=10))
+
+    def test_gap_breaks_sequence(self):
+        time_slots = [
+            TimeSlot(start=10 * 60, taken=False),
+            TimeSlot(start=11 * 60, taken=False),
+        ]
+        day_mask = time_slot_utils.make_day_mask(time_slots)
+        self.assertFalse(time_slot_utils.duration_fits_into_mask(60, day_mask))
+
+    def test_split_mask(self):
+        mask = 0b1110011 << 10
+        self.assertEqual(time_slot_utils.split_mask(mask),
+                         [[10, 11], [14, 15, 16]])
+        self.assertEqual(time_slot_utils.split_mask(0), [])
@@ -0,0 +1,106 @@
+import datetime
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from src.apps.core.models import Location
+from src.apps.masters import gmaps_utils, travel_estimator
+from src.apps.masters.models import Schedule, TimeSlot
+from src.apps.orders.models import OrderItem, Order
+from src.utils.object_creation import make_master, make_category, make_client
+
+
+class TravelEstimatorTestCase(APITestCase):
+    def setUp(self):
+        travel_estimator.reset()
+        self.night = datetime.datetime(2018, 2, 5, hour=2)
+        self.rush_hour = datetime.datetime(2018, 2, 5, hour=8)
+
+    def tearDown(self):
+        travel_estimator.reset()
+
+    def test_estimate(self):
+        near = travel_estimator.estimate((10, 120), (10, 120.01), self.night)
+        far = travel_estimator.estimate((10, 120), (10, 120.1), self.night)
+        self.assertLess(near, far)
+        self.assertLess(far, travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.rush_hour))
+
+    def test_calibrate(self):
+        before = travel_estimator.estimate((10, 120), (10, 120.1),
+                                           self.night)
+        rush_hour_before = travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.rush_hour)
+        for _ in range(10):
+            # it took two hours
+            travel_estimator.calibrate((10, 120), (10, 120.1), self.night,
+                                       2 * 60 * 60)
+        self.assertGreater(travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.night), before)
+        # other hours are not affected
+        self.assertEqual(travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.rush_hour), rush_hour_before)
+
+    def test_calibrate_ignores_garbage(self):
+        before = travel_estimator.estimate((10, 120), (10, 120.1),
+                                           self.night)
+        travel_estimator.calibrate((10, 120), (10, 120.1), self.night, 1)
+        travel_estimator.calibrate((10, 120), (10, 120.0001), self.night, 1)
+        # a day to get there
+        travel_estimator.calibrate((10, 120), (10, 120.1), self.night,
+                                   24 * 60 * 60)
+        self.assertEqual(travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.night), before)
+
+    def test_calibrate_ignores_no_route(self):
+        before = travel_estimator.estimate((10, 120), (10, 120.1),
+                                           self.night)
+        for _ in range(10):
+            travel_estimator.calibrate((10, 120), (10, 120.1), self.night,
+                                       gmaps_utils.MAX_DURATION)
+        self.assertEqual(travel_estimator.estimate(
+            (10, 120), (10, 120.1), self.night), before)
+
+
+@override_settings(USE_TRAVEL_ESTIMATOR=True)
+class EstimatedReachabilityTestCase(APITestCase):
+    def setUp(self):
+        travel_estimator.reset()
+        travel_estimator.start_counting()
+        vasya = make_master('VASYA', 120)
+        self.schedule = Schedule.objects.create(master=vasya,
+                                                date=timezone.now())
+        slot = TimeSlot.objects.create(
+            start=13 * 60 + 30,
+            taken=True, schedule=self.schedule)
+        order = Order.objects.create(client=make_client(), date=timezone.now(),
+                                     time=slot.value)
+        slot.order_item = OrderItem.objects.create(
+            service=make_category('CATEGORY').services.first(),
+            master=vasya, order=order, locked=False)
+        slot.save()
+        TimeSlot.objects.create(start=14 * 60,
+                                taken=False, schedule=self.schedule)
+        # the previous client lives at 10, 10
+        self.time = datetime.time(hour=14)
+
+    def _can_reach(self, lat, lon):
+        return gmaps_utils.can_reach(self.schedule,
+                                     Location(lat=lat, lon=lon), self.time)
+
+    @mock.patch.object(gmaps_utils, '_calculate_eta')
+    def test_obvious_answers(self, _calculate_eta):
+        self.assertTrue(self._can_reach(10.001, 10))
+        self.assertFalse(self._can_reach(11, 10))
+        _calculate_eta.assert_not_called()
+        self.assertEqual(travel_estimator.counters(), (2, 0))
+
+    @mock.patch.object(gmaps_utils, '_calculate_eta')
+    def test_uncertain_answer(self, _calculate_eta):
+        _calculate_eta.return_value = 10
+        # about 14 km by road, half an hour at 30 km/h
+        self.assertTrue(self._can_reach(10.09, 10))
+        _calculate_eta.assert_called_once()
+        self.assertEqual(travel_estimator.counters(), (0, 1))
@@ -1,17 +1,22 @@
 import datetime
 import logging
-import time
+import re
 from collections import namedtuple
 from typing import Iterator, List
 
 from django.db.models import QuerySet
-from django.utils import timezone
 
 from src.apps.categories.models import Service
 from .models import TimeSlot
 
 logger = logging.getLogger(__name__)
 
+MINUTES_PER_DAY = 24 * 60
+# number of slots in a day, i.e. the width of a day bitmask
+SLOTS_PER_DAY = MINUTES_PER_DAY // TimeSlot.DURATION
+
+_MICROSECONDS_PER_DAY = MINUTES_PER_DAY * 60 * 10 ** 6
+
 
 def find_available_starting_slots(service: Service,
                                   time_slots: Iterator[TimeSlot]):
@@ -33,7 +38,7 @@ def find_available_starting_slots(service: Service,
 def find_available_starting_slots_for_duration(max_duration,
                                                time_slots: Iterator[TimeSlot],
                                                ignore_taken_slots=False):
-    time_slots = sorted(time_slots, key=lambda slot: slot.value)
+    time_slots = sorted(time_slots, key=lambda slot: slot.start)
     block_size = 0
     start_index = 0
 
@@ -41,7 +46,7 @@ def find_available_starting_slots_for_duration(max_duration,
     slot_number = int(max_duration / TimeSlot.DURATION + 1)
     logger.info(f'Looking for a slot to start doing services that last '
                 f'({slot_number-1} + 1(extra) slots) in '
-                f'{[slot.time for slot in time_slots]}')
+                f'{[str(slot.value) for slot in time_slots]}')
 
     indices = []
     for i in range(len(time_slots)):
@@ -70,20 +75,42 @@ def find_available_starting_slots_for_duration(max_duration,
 
     result = [time_slots[index] for index in indices]
     logger.info(f'Found {len(result)} slots,  '
-                f'{[slot.time for slot in result]}')
+                f'{[str(slot.value) for slot in result]}')
     return result
 
 
+def _ceil_minutes(time_: datetime.time):
+    # minutes after midnight of the first whole minute at `time_` or later
+    minutes = time_.hour * 60 + time_.minute
+    if time_.second or time_.microsecond:
+        minutes += 1
+    return minutes
+
+
 def add_time(source_time, **kwargs):
     """
     Adds timedelta **kwargs to the source_time and returns the
-    resulting `datetime.time` value
+    resulting `datetime.time` value, wrapping around midnight
     """
     if isinstance(source_time, datetime.datetime):
         source_time = source_time.time()
-    # TODO timezone fails
-    source_time = datetime.datetime.combine(timezone.now().date(), source_time)
-    return (source_time + datetime.timedelta(**kwargs)).time()
+    minutes = kwargs.get('minutes')
+    if len(kwargs) == 1 and isinstance(minutes, int) and \
+            not source_time.second and not source_time.microsecond:
+        # the common case, whole minutes are added to a whole minute
+        total = (source_time.hour * 60 + source_time.minute +
+                 minutes) % MINUTES_PER_DAY
+        return datetime.time(hour=total // 60, minute=total % 60)
+
+    delta = datetime.timedelta(**kwargs)
+    total = (((source_time.hour * 60 + source_time.minute) * 60 +
+              source_time.second) * 10 ** 6 + source_time.microsecond +
+             delta // datetime.timedelta(microseconds=1)
+             ) % _MICROSECONDS_PER_DAY
+    seconds, microsecond = divmod(total, 10 ** 6)
+    minutes, second = divmod(seconds, 60)
+    return datetime.time(hour=minutes // 60, minute=minutes % 60,
+                         second=second, microsecond=microsecond)
 
 
 def service_fits_into_slots(service: Service, time_slots: List[TimeSlot],
@@ -132,29 +159,38 @@ def duration_fits_into_slots(max_duration, time_slots: List[TimeSlot],
         logger.info(f'time_slots are empty, returning False')
         return False
 
-    time_slots = sorted(time_slots, key=lambda slot: slot.value)
+    time_slots = sorted(time_slots, key=lambda slot: slot.start)
     logger.info(f'Checking if duration={max_duration} '
                 f'can fit into {time_slots}')
 
+    # slot starts are whole minutes, so are the bounds
     if time_from:
+        start_from = _ceil_minutes(time_from)
         # invalid input parameters, okay
-        if time_from > time_slots[-1].value:
+        if start_from > time_slots[-1].start:
             return False
     else:
         # otherwise make it default
-        time_from = time_slots[0].value
+        start_from = time_slots[0].start
 
     if time_to is None:
         # because we're using the exclusive comparison '<'
-        time_to = add_time(time_slots[-1].value, minutes=TimeSlot.DURATION)
+        start_to = time_slots[-1].start + TimeSlot.DURATION
         logger.info(f'time_to is None, setting to the '
-                    f'last work day slot f{time_to}')
+                    f'end of the last work day slot')
+    else:
+        start_to = _ceil_minutes(time_to)
 
-    if time_to > time_from:
-        logger.info(f'Filtering slots {[slot.time for slot in time_slots]}'
+    if time_from and time_to is not None:
+        valid = time_to > time_from
+    else:
+        valid = start_to > start_from
+    if valid:
+        logger.info(f'Filtering slots '
+                    f'{[str(slot.value) for slot in time_slots]}'
                     f'that lie between {time_from} and {time_to}')
-        good_slots = list(
-            filter(lambda slot: time_from <= slot.value < time_to, time_slots))
+        good_slots = [slot for slot in time_slots
+                      if start_from <= slot.start < start_to]
         logger.info(f'{len(good_slots)} slots are OK - {good_slots}')
     else:
         raise ValueError('time_to argument must be '
@@ -166,6 +202,42 @@ def duration_fits_into_slots(max_duration, time_slots: List[TimeSlot],
 
 TimeTuple = namedtuple('TimeTuple', ['hour', 'minute'])
 
+_TIME_PATTERN = r'(\d{1,2}):(\d{1,2})'
+# a single time or a range of times, e.g. '10:00' or '13:00 - 15:00'
+_SLOTS_PIECE = re.compile(
+    rf'\s*{_TIME_PATTERN}\s*(?:-\s*{_TIME_PATTERN}\s*)?')
+
+
+def _parse_minutes(hour: str, minute: str):
+    hour, minute = int(hour), int(minute)
+    if hour > 23 or minute > 59:
+        raise ValueError(f'Invalid time {hour:02}:{minute:02}')
+    return hour * 60 + minute
+
+
+def parse_slot_starts(slots_string: str, include_last=False):
+    """
+    Same as `parse_time_slots`, but returns a set of slot starts
+    in minutes after midnight
+
+    :param include_last: whether to include the last slot in the range or not
+    :param slots_string: source string
+    :return: set of ints
+    """
+    result = set()
+    for piece in slots_string.split(','):
+        match = _SLOTS_PIECE.fullmatch(piece)
+        if not match:
+            raise ValueError(f'Invalid time slots \'{piece}\'')
+        start_hour, start_minute, end_hour, end_minute = match.groups()
+        start = _parse_minutes(start_hour, start_minute)
+        if end_hour is None:
+            result.add(start)
+        else:
+            result.update(_range_starts(
+                start, _parse_minutes(end_hour, end_minute), include_last))
+    return result
+
 
 def parse_time_slots(slots_string: str, include_last=False):
     """
@@ -176,71 +248,226 @@ def parse_time_slots(slots_string: str, include_last=False):
 
     :param include_last: whether to include the last slot in the range or not
     :param slots_string: source string
-    :return: list of TimeTuple instances
+    :return: set of TimeTuple instances
     """
-    # TODO maybe return time struct instead of timetuple?
     logger.info(f'Parsing time slots from '
                 f'\'{slots_string}\', include_last={include_last}')
 
-    result = set()
-    pieces = slots_string.split(',')
-    for piece in pieces:
-        times = [time_piece.strip() for time_piece in piece.strip().split('-')]
-        if len(times) == 2:
-            times = _get_times(times[0], times[1], include_last=include_last)
-        elif len(times) == 1:
-            times = _get_times(times[0], times[0], include_last=True)
-
-        for time_object in times:
-            result.add(time_object)
+    result = {TimeTuple(hour=start // 60, minute=start % 60)
+              for start in parse_slot_starts(slots_string, include_last)}
     logger.info(f'Parsed slots: {result}')
     return result
 
 
-def _get_times(start_time_s: str, end_time_s: str, include_last=False):
+def _range_starts(start: int, end: int, include_last=False):
     """
-    Returns a list of created Time objects with values
-    in between `start_time_s` and `end_time_s`
+    Returns a list of slot starts between `start` and `end` minutes.
+    A range which ends before it starts goes past midnight
     """
-    # TODO shitty?? yes shitty
-    result = []
-
-    end_time = _get_time(time.strptime(end_time_s, '%H:%M'))
-
-    current_time = _get_time(time.strptime(start_time_s, '%H:%M'))
-
-    while current_time != end_time:
-        result.append(TimeTuple(hour=current_time.hour,
-                                minute=current_time.minute))
-        current_time = add_time(current_time, minutes=TimeSlot.DURATION)
-
+    if (end - start) % TimeSlot.DURATION:
+        raise ValueError(f'Time range from {start} to {end} minutes is not '
+                         f'a multiple of {TimeSlot.DURATION} minutes')
+    if end < start:
+        end += MINUTES_PER_DAY
     if include_last:
-        result.append(TimeTuple(hour=current_time.hour,
-                                minute=current_time.minute))
-    return result
-
-
-def _get_time(_time):
-    return datetime.time(hour=_time.tm_hour, minute=_time.tm_min)
+        end += TimeSlot.DURATION
+    return [minutes % MINUTES_PER_DAY
+            for minutes in range(start, end, TimeSlot.DURATION)]
 
 
 def split_slots(slots):
-    #TODO docs
+    """
+    Splits a sorted list of slots into groups of adjacent slots
+
+    :return: list of lists of slots
+    """
     groups = []
     group = []
     if not slots:
         return []
-    last_group_time = datetime.datetime.combine(timezone.now().date(),
-                                                slots[0].value)
-    for i in range(0, len(slots)):
-        source_time = datetime.datetime.combine(timezone.now().date(),
-                                                slots[i].value)
-        if source_time - last_group_time > datetime.timedelta(
-                minutes=TimeSlot.DURATION):
+    last_group_start = slots[0].start
+    for slot in slots:
+        if slot.start - last_group_start > TimeSlot.DURATION:
             groups.append(group)
             group = []
-        group.append(slots[i])
-        last_group_time = source_time
+        group.append(slot)
+        last_group_start = slot.start
     if group:
         groups.append(group)
     return groups
+
+
+# Bitmask representation of a work day.
+#
+# Bit `i` of a mask stands for the slot starting at `i * TimeSlot.DURATION`
+# minutes after midnight. `exists` marks slots present in the schedule,
+# `free` marks the ones which are present and not taken.
+# The functions above are kept as a reference implementation, the ones below
+# do the same job with a couple of integer operations per day.
+#
+# *NOTE* unlike the reference implementation, which treats any two
+# neighbouring slots of a sorted list as adjacent, a gap in the schedule
+# breaks a sequence of slots here
+DayMask = namedtuple('DayMask', ['free', 'exists'])
+
+_SLOT_MICROSECONDS = TimeSlot.DURATION * 60 * 10 ** 6
+
+
+def slot_index(time_: datetime.time):
+    """
+    Returns the index of the slot that starts at `time_`
+    """
+    return (time_.hour * 60 + time_.minute) // TimeSlot.DURATION
+
+
+def slot_time(index: int):
+    """
+    Returns the `datetime.time` at which the slot with `index` starts
+    """
+    minutes = index * TimeSlot.DURATION
+    return datetime.time(hour=minutes // 60, minute=minutes % 60)
+
+
+def _first_index_from(time_: datetime.time):
+    # index of the first slot that starts at `time_` or later
+    microseconds = (((time_.hour * 60 + time_.minute) * 60 + time_.second)
+                    * 10 ** 6 + time_.microsecond)
+    return -(-microseconds // _SLOT_MICROSECONDS)
+
+
+def make_day_mask(time_slots: Iterator[TimeSlot]):
+    """
+    Builds a DayMask out of `time_slots`
+    """
+    free = 0
+    exists = 0
+    for slot in time_slots:
+        bit = 1 << slot_index(slot.value)
+        exists |= bit
+        if not slot.taken:
+            free |= bit
+    return DayMask(free=free, exists=exists)
+
+
+def mask_indices(mask: int):
+    """
+    Returns a list of indices of set bits of the `mask` in ascending order
+    """
+    result = []
+    while mask:
+        low_bit = mask & -mask
+        result.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return result
+
+
+def longest_run(mask: int):
+    """
+    Returns the length of the longest sequence of set bits of the `mask`
+    """
+    length = 0
+    while mask:
+        mask &= mask >> 1
+        length += 1
+    return length
+
+
+def _runs(mask: int, length: int):
+    """
+    Returns a mask where bit `i` is set if bits `i`..`i+length-1`
+    of the `mask` are all set
+    """
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        mask &= mask >> step
+        covered += step
+    return mask
+
+
+def clip_mask(day_mask: DayMask, time_from: datetime.time = None,
+              time_to: datetime.time = None):
+    """
+    Drops all slots which do not lie between `time_from` and `time_to`.
+    Slot at `time_to` is excluded
+    """
+    window = (1 << SLOTS_PER_DAY) - 1
+    if time_from is not None:
+        window &= ~((1 << _first_index_from(time_from)) - 1)
+    if time_to is not None:
+        window &= (1 << _first_index_from(time_to)) - 1
+    return DayMask(free=day_mask.free & window,
+                   exists=day_mask.exists & window)
+
+
+def find_available_starting_slots_mask(max_duration, day_mask: DayMask,
+                                       ignore_taken_slots=False):
+    """
+    Bitmask version of `find_available_starting_slots_for_duration`.
+
+    Returns a mask of slots which can be the first slots
+    for a service that lasts `max_duration` minutes.
+    An extra slot, used to get to the next client, is required
+    unless the service ends right before a slot which is missing
+    from the schedule, e.g. at the end of the work day
+    """
+    slot_number = int(max_duration / TimeSlot.DURATION)
+    if ignore_taken_slots:
+        free = day_mask.exists
+        taken = 0
+    else:
+        free = day_mask.free
+        taken = day_mask.exists & ~day_mask.free
+    return _runs(free, slot_number) & ~(taken >> slot_number)
+
+
+def duration_fits_into_mask(max_duration, day_mask: DayMask,
+                            time_from: datetime.time = None,
+                            time_to: datetime.time = None,
+                            ignore_taken_slots=False):
+    """
+    Bitmask version of `duration_fits_into_slots`
+
+    *NOTE* slot at `time_to` is excluded because of common sense
+
+    :param time_to: if None, equals to the end of the last slot of the day
+    """
+    if not day_mask.exists:
+        logger.info(f'time_slots are empty, returning False')
+        return False
+
+    last_index = day_mask.exists.bit_length() - 1
+    if time_from:
+        # invalid input parameters, okay
+        if time_from > slot_time(last_index):
+            return False
+    if time_to is not None and time_from is not None and \
+            time_to <= time_from:
+        raise ValueError('time_to argument must be '
+                         'greater or equal than time_from')
+
+    day_mask = clip_mask(day_mask, time_from, time_to)
+    return find_available_starting_slots_mask(
+        max_duration, day_mask, ignore_taken_slots) != 0
+
+
+def split_mask(mask: int):
+    """
+    Bitmask version of `split_slots`.
+
+    Splits set bits of the `mask` into groups of adjacent slots
+    :return: list of lists of slot indices
+    """
+    groups = []
+    index = 0
+    while mask:
+        # skipping unset bits
+        zeros = (mask & -mask).bit_length() - 1
+        mask >>= zeros
+        index += zeros
+        # counting set ones
+        ones = (mask ^ (mask + 1)).bit_length() - 1
+        groups.append(list(range(index, index + ones)))
+        mask >>= ones
+        index += ones
+    return groups
@@ -0,0 +1,91 @@
+import logging
+import threading
+from datetime import datetime
+
+from src.apps.core import geo
+
+logger = logging.getLogger(__name__)
+
+# roads are never straight
+ROAD_FACTOR = 1.4
+# average speed in km/h by hour of the day
+DEFAULT_SPEED_PROFILE = [45] * 6 + [35, 20, 20, 20] + [30] * 7 + \
+                        [20, 20, 20] + [30, 35, 40, 45]
+# weight of a new sample when calibrating the profile
+CALIBRATION_WEIGHT = 0.1
+# shorter trips are dominated by parking and say nothing about speed
+MIN_CALIBRATION_DISTANCE_KM = 0.5
+# a speed that no one achieves in a city
+MAX_SPEED = 120
+# slower than walking, the API must have got it wrong
+MIN_SPEED = 5
+
+_speed_profile = list(DEFAULT_SPEED_PROFILE)
+_lock = threading.Lock()
+_counters = threading.local()
+
+
+def _road_distance(coords_from: tuple, coords_to: tuple):
+    return geo.distances(*coords_from, [coords_to])[0] * ROAD_FACTOR
+
+
+def estimate(coords_from: tuple, coords_to: tuple, departure_time: datetime):
+    """
+    Estimates time of travel in seconds between two pairs of coordinates
+    at specified `departure_time` without calling any external API
+    """
+    speed = _speed_profile[departure_time.hour]
+    return _road_distance(coords_from, coords_to) / speed * 60 * 60
+
+
+def calibrate(coords_from: tuple, coords_to: tuple, departure_time: datetime,
+              eta_seconds):
+    """
+    Adjusts the speed profile with a real ETA returned by the API.
+    `No route` responses and implausible speeds are ignored
+    """
+    # gmaps_utils depends on this module
+    from src.apps.masters.gmaps_utils import MAX_DURATION
+
+    distance = _road_distance(coords_from, coords_to)
+    if distance < MIN_CALIBRATION_DISTANCE_KM or eta_seconds <= 0 or \
+            eta_seconds >= MAX_DURATION:
+        return
+    speed = distance / eta_seconds * 60 * 60
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        logger.debug(f'Ignoring an implausible speed {speed:.1f} km/h')
+        return
+    with _lock:
+        hour = departure_time.hour
+        _speed_profile[hour] += (speed - _speed_profile[hour]) * \
+                                CALIBRATION_WEIGHT
+
+
+def reset():
+    """
+    Restores the default speed profile
+    """
+    with _lock:
+        _speed_profile[:] = DEFAULT_SPEED_PROFILE
+
+
+def count(avoided: bool):
+    """
+    Counts a reachability check, that was either answered by the estimator
+    or required an API call
+    """
+    attr = 'avoided' if avoided else 'made'
+    setattr(_counters, attr, getattr(_counters, attr, 0) + 1)
+
+
+def start_counting():
+    _counters.avoided = 0
+    _counters.made = 0
+
+
+def counters():
+    """
+    Returns a tuple of numbers of avoided and made API calls
+    since the last `start_counting` in the current thread
+    """
+    return getattr(_counters, 'avoided', 0), getattr(_counters, 'made', 0)
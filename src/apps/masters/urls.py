@@ -3,7 +3,8 @@ from django.conf.urls import url
 from .views import MasterListCreateView, MasterDetailUpdateView, \
     MasterSearchView, MasterBestMatchView, AddPortfolioItemsView, \
     CreateDeleteScheduleView, MeMasterView, AddPortfolioItemDescriptionView, \
-    MasterAvatarUpdateView, AddFeedbackView, DeletePortfolioItemView
+    MasterAvatarUpdateView, AddFeedbackView, DeletePortfolioItemView, \
+    ScheduleTemplateView
 
 urlpatterns = [
     url(r'^$', MasterListCreateView.as_view(),
@@ -29,4 +30,6 @@ urlpatterns = [
         name=DeletePortfolioItemView.view_name),
     url(r'^(?P<pk>[0-9]+)/schedule$', CreateDeleteScheduleView.as_view(),
         name=CreateDeleteScheduleView.view_name),
+    url(r'^(?P<pk>[0-9]+)/schedule/template$', ScheduleTemplateView.as_view(),
+        name=ScheduleTemplateView.view_name),
 ]
@@ -1,6 +1,7 @@
 import datetime
 import logging
 
+from django.db import transaction
 from rest_framework import generics, permissions, parsers, status, mixins
 from rest_framework.exceptions import ValidationError, NotFound, \
     PermissionDenied
@@ -15,11 +16,14 @@ from src.apps.core.serializers import ImageListSerializer, \
     DescriptionImageSerializer, ImageSerializer
 from src.apps.masters import time_slot_utils
 from src.apps.masters.permissions import IsMasterIDCorrect
-from . import master_utils
+from . import master_utils, schedule_templates
 from .filtering import FilteringFunctions, FilteringParams
-from .models import Master, PortfolioImage, Schedule, MasterStatus
+from .models import Master, PortfolioImage, Schedule, MasterStatus, \
+    ScheduleTemplate
 from .serializers import MasterSerializer, CreateScheduleSerializer, \
-    MasterCreateSerializer, CreateFeedbackSerializer, MasterUpdateSerializer
+    MasterCreateSerializer, CreateFeedbackSerializer, \
+    MasterUpdateSerializer, CachedMasterSerializer, \
+    ScheduleTemplateSerializer
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +54,11 @@ class MasterListCreateView(generics.ListCreateAPIView):
 
         `distance` - maximum distance in km. default is 20km
 
+        `limit` - maximum number of masters in the response. if set,
+        the response contains a `next` cursor
+
+        `cursor` - the `next` value from the previous page
+
         The output is also sorted according to the rating of the master
         and distance to the `coordinates`
 
@@ -60,6 +69,8 @@ class MasterListCreateView(generics.ListCreateAPIView):
           //each element of the array is an instance of **Master**
           'favorites:':[]
           'others':[]
+          //only if `limit` is set, null on the last page
+          'next': 'opaque-cursor'
         }
         ```
         **Master** model
@@ -80,12 +91,17 @@ class MasterListCreateView(generics.ListCreateAPIView):
         400 Bad Request
         """
         params = FilteringParams(request.query_params, request=request)
-        masters, slots = master_utils.search(params, FilteringFunctions.search)
+        masters, slots = master_utils.cached_search(params,
+                                                    FilteringFunctions.search)
         favorites, others = master_utils.split(masters,
                                                request.user.is_client(
                                                    request) and
                                                request.user.client)
 
+        if params.limit:
+            return Response(data=master_utils.paginate_and_serialize_masters(
+                request, favorites, others, params, slots))
+
         return Response(data={
             'favorites': master_utils.sort_and_serialize_masters(
                 request, favorites, params, slots),
@@ -167,6 +183,11 @@ class MasterSearchView(generics.ListAPIView):
 
         `time` - format 11:30
 
+        `limit` - maximum number of masters in the response. if set,
+        the response contains a `next` cursor
+
+        `cursor` - the `next` value from the previous page
+
         Response:
         200 OK
         ```
@@ -174,6 +195,8 @@ class MasterSearchView(generics.ListAPIView):
           //each element of the array is an instance of **Master**
           'favorites:':[]
           'others':[]
+          //only if `limit` is set, null on the last page
+          'next': 'opaque-cursor'
         }
         ```
         **Master** model
@@ -198,14 +221,18 @@ class MasterSearchView(generics.ListAPIView):
         params = FilteringParams(request.query_params, request=request)
         if params.date and params.time:
             # here default date_range is used
-            masters, slots = master_utils.search(
+            masters, slots = master_utils.cached_search(
                 params, FilteringFunctions.datetime)
         else:
-            masters, slots = master_utils.search(
+            masters, slots = master_utils.cached_search(
                 params, FilteringFunctions.anytime)
 
         favorites, others = master_utils.split(masters, request.user.client)
 
+        if params.limit:
+            return Response(data=master_utils.paginate_and_serialize_masters(
+                request, favorites, others, params, slots))
+
         return Response(data={
             'favorites': master_utils.sort_and_serialize_masters(
                 request, favorites, params, slots),
@@ -312,6 +339,9 @@ class MasterDetailUpdateView(mixins.RetrieveModelMixin,
             'status': 'ON_MODERATION/ACCEPTED',
           },...]
           'rating':4.3,
+          'rating_count':12,
+          // number of feedbacks by stars
+          'rating_histogram':{'1':0, '2':0, '3':1, '4':4, '5':7},
           'gender':'F'
           'date_of_birth':'1980-10-20'
         }
@@ -352,7 +382,7 @@ class MasterDetailUpdateView(mixins.RetrieveModelMixin,
 
         if self.request.method == 'PATCH':
             return MasterUpdateSerializer
-        return MasterSerializer
+        return CachedMasterSerializer
 
     def get_permissions(self):
         if self.request.method == 'PATCH':
@@ -428,7 +458,7 @@ class MasterAvatarUpdateView(APIView):
 class MeMasterView(generics.RetrieveAPIView):
     view_name = 'me-master'
     permission_classes = (IsAuthenticated, IsMaster)
-    serializer_class = MasterSerializer
+    serializer_class = CachedMasterSerializer
 
     def get_object(self):
         return self.request.user.master
@@ -583,7 +613,9 @@ class CreateDeleteScheduleView(mixins.CreateModelMixin,
     # to adapt to a proper endpoint, instead he chose to stick with this
     def patch(self, request, *args, **kwargs):
         """
-        Deletes time slots of schedule at `date`
+        Deletes time slots of schedule at `date`.
+        Nothing is deleted if any of the slots is taken.
+        The schedule is deleted along with its last time slot
 
         ```
         [{
@@ -608,16 +640,72 @@ class CreateDeleteScheduleView(mixins.CreateModelMixin,
         except Schedule.DoesNotExist:
             raise NotFound(detail=f'Schedule at {date} was not found')
         else:
-            for time_tuple in time_tuples:
-                schedule.delete_slot(datetime.
-                                     time(hour=time_tuple.hour,
-                                          minute=time_tuple.minute))
-            if len(schedule.time_slots.all()) == 0:
-                schedule.delete()
+            with transaction.atomic():
+                schedule.delete_slots(
+                    datetime.time(hour=time_tuple.hour,
+                                  minute=time_tuple.minute)
+                    for time_tuple in time_tuples)
+                if not schedule.time_slots.exists():
+                    schedule.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ScheduleTemplateView(generics.GenericAPIView):
+    view_name = 'schedule-template'
+    serializer_class = ScheduleTemplateSerializer
+    queryset = Master.objects.all()
+    permission_classes = (IsAuthenticated, IsMasterIDCorrect)
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns weekly working hours of the master, weekdays start with
+        Monday, which is 0
+
+        Response:
+        200 OK
+        ```
+        [{
+          'weekday': 0,
+          'time_slots': '10:00-13:30,15:00'
+        }]
+        ```
+        """
+        templates = request.user.master.schedule_templates.order_by(
+            'weekday')
+        serializer = self.get_serializer(templates, many=True)
+        return Response(serializer.data)
+
+    def put(self, request, *args, **kwargs):
+        """
+        Replaces weekly working hours of the master and creates
+        schedules for the following two weeks out of them.
+        Dates that already have a schedule are not changed.
+        Schedules are updated every night as well
+
+        ```
+        [{
+          'weekday': 0,
+          'time_slots': '10:00-13:30,15:00'
+        }]
+        ```
+        Response:
+        200 OK
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        master = request.user.master
+        logger.info(f'Replacing schedule templates of master '
+                    f'{master.first_name}, id={master.id}')
+        with transaction.atomic():
+            master.schedule_templates.all().delete()
+            ScheduleTemplate.objects.bulk_create(
+                ScheduleTemplate(master=master, **template)
+                for template in serializer.validated_data)
+            schedule_templates.expand(master_ids=[master.id])
+        return Response(serializer.data)
+
+
 class AddFeedbackView(generics.CreateAPIView):
     view_name = 'add-feedback'
     serializer_class = CreateFeedbackSerializer
@@ -655,7 +743,7 @@ class AddFeedbackView(generics.CreateAPIView):
         """
         client = request.user.client
         master = self.get_object()
-        if master.times_served(client) == 0:
+        if not master_utils.has_served(master, client):
             raise PermissionDenied(
                 detail='You may not leave feedback '
                        'to masters who did not serve you')
@@ -9,7 +9,7 @@ from src.apps.categories.models import Service
 from src.apps.clients.models import Client
 from src.apps.core import sms_ru, sms_templates
 from src.apps.finances.models import TransactionEntry, TransactionEntryType
-from src.apps.masters.models import Master
+from src.apps.masters.models import Master, TimeSlot
 from src.apps.orders import notifications
 
 logger = logging.getLogger(__name__)
@@ -116,6 +116,10 @@ class Order(models.Model):
 
     def activate(self):
         self.status = OrderStatus.ACTIVATED
+        # the order is paid for, its time slots are not released anymore
+        TimeSlot.objects.filter(order_item__order=self,
+                                held_until__isnull=False).update(
+            held_until=None)
         processed_masters = set()
 
         for item in self.order_items.all():
@@ -184,3 +188,7 @@ class OrderItem(models.Model):
                               related_name='order_items')
 
     locked = models.BooleanField()
+
+
+# DON'T DELETE
+from .receivers import *
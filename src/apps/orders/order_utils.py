@@ -2,12 +2,17 @@ import datetime
 import logging
 from typing import Iterable
 
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework.exceptions import PermissionDenied
 
-from src.apps.masters import master_utils, time_slot_utils
+from src.apps.masters import availability, detail_cache, master_utils, \
+    search_cache, time_slot_utils
 from src.apps.masters.filtering import FilteringParams, FilteringFunctions
-from src.apps.masters.models import Master
-from src.apps.orders.models import Order, OrderStatus
+from src.apps.masters.models import Master, Schedule, TimeSlot
+from src.apps.orders.models import Order, OrderItem, OrderStatus, \
+    CPTransactionStatus
 
 logger = logging.getLogger(__name__)
 
@@ -124,3 +129,84 @@ def find_replacement_masters(order, order_items, old_master):
         order_item.master = replacement
         order_item.save()
     return True
+
+
+def payment_hold_deadline():
+    """
+    Returns the time until which time slots of an unpaid order are held
+    """
+    return timezone.now() + datetime.timedelta(
+        minutes=settings.ORDER_PAYMENT_HOLD_MINUTES)
+
+
+def extend_hold(order: Order):
+    """
+    Prolongs the hold of time slots of the unpaid `order`
+    for the rest of the payment, e.g. 3-D Secure authorization
+
+    :return: False if the hold has already expired
+    """
+    with transaction.atomic():
+        # the lock keeps release_expired_holds away until the hold
+        # is extended, it waits for us and then skips the slots
+        slots = TimeSlot.objects.select_for_update().filter(
+            order_item__order=order)
+        holds = list(slots.values_list('held_until', flat=True))
+        now = timezone.now()
+        # no slots left means they have already been released
+        if not holds or any(held_until is not None and held_until < now
+                            for held_until in holds):
+            return False
+        slots.filter(held_until__isnull=False).update(
+            held_until=payment_hold_deadline())
+    return True
+
+
+def release_expired_holds():
+    """
+    Frees time slots of unpaid orders whose hold has expired
+    and drops those orders.
+    The slots are released with a single UPDATE, since held slots
+    are taken, they become available for search again.
+    Payments in progress lock the slots with `extend_hold`
+    and are waited for, orders with a finished transaction are kept
+
+    :return: number of released time slots
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        paid_items = OrderItem.objects.filter(
+            order__transaction__status=CPTransactionStatus.FINISHED)
+        expired = TimeSlot.objects.filter(held_until__lt=now).exclude(
+            order_item__in=paid_items)
+        rows = list(expired.select_for_update().values_list(
+            'schedule_id', 'order_item_id'))
+        if not rows:
+            return 0
+        released = expired.update(taken=False, order_item=None,
+                                  held_until=None)
+
+        schedule_ids = {schedule_id for schedule_id, _ in rows}
+        for schedule_id in schedule_ids:
+            availability.refresh_schedule(schedule_id)
+
+        # the orders haven't been paid for in time
+        orders = Order.objects.filter(
+            status=OrderStatus.CREATED,
+            order_items__in={order_item_id for _, order_item_id in rows}
+        ).distinct()
+        for order in orders:
+            logger.info(f'Hold of order {order.id} has expired, '
+                        f'dropping the order')
+            for order_item in OrderItem.objects.filter(
+                    order=order).select_related('master', 'service'):
+                order_item.master.cancel_order_payment(order, order_item)
+            order.delete()
+
+    search_cache.invalidate()
+    for master_id in set(Schedule.objects.filter(
+            pk__in=schedule_ids).values_list('master_id', flat=True)):
+        detail_cache.invalidate(master_id, detail_cache.SCHEDULE)
+    logger.info(f'Released {released} time slots of '
+                f'{len(schedule_ids)} schedules')
+    return released
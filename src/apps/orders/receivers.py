@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from django.db import models
+from django.dispatch import receiver
+
+from src.apps.masters import search_cache
+from .models import OrderItem
+
+
+@receiver(models.signals.post_save, sender=OrderItem)
+@receiver(models.signals.post_delete, sender=OrderItem)
+def invalidate_search_cache(sender, instance, **kwargs):
+    """
+    Drops cached search results, since an order was created or canceled
+    """
+    search_cache.invalidate()
@@ -1,5 +1,6 @@
 import logging
 
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, PermissionDenied
 
@@ -9,7 +10,7 @@ from src.apps.core.exceptions import ApplicationError
 from src.apps.masters import time_slot_utils
 from src.apps.masters.models import Master, TimeSlot
 from src.apps.masters.time_slot_utils import add_time
-from src.apps.orders import notifications
+from src.apps.orders import notifications, order_utils
 from .models import Order, OrderItem, PaymentType, CloudPaymentsTransaction, \
     OrderStatus
 
@@ -80,22 +81,28 @@ class OrderCreateSerializer(serializers.Serializer):
     def create(self, validated_data):
         order_items = validated_data.pop('order_items')
         client = self.context['request'].user.client
-        order = Order.objects.create(client=client, **validated_data)
-        logger.info(f'Creating order for client={client.first_name} at '
-                    f'date={order.date} and time={order.time}')
-
-        for item in order_items:
-            self._create_order_item(item, order)
-
-        # because mobile developers refused to call an endpoint
-        # I'm putting the same call in three different unrelated places
-        if order.payment_type == PaymentType.CASH:
-            order.activate()
-
-        order.save()
+        # time slots stay locked until the order is saved
+        with transaction.atomic():
+            order = Order.objects.create(client=client, **validated_data)
+            logger.info(f'Creating order for client={client.first_name} at '
+                        f'date={order.date} and time={order.time}')
+
+            # unpaid orders keep their time slots for a while
+            held_until = None
+            if order.payment_type != PaymentType.CASH:
+                held_until = order_utils.payment_hold_deadline()
+            for item in order_items:
+                self._create_order_item(item, order, held_until)
+
+            # because mobile developers refused to call an endpoint
+            # I'm putting the same call in three different unrelated places
+            if order.payment_type == PaymentType.CASH:
+                order.activate()
+
+            order.save()
         return order
 
-    def _create_order_item(self, item, order):
+    def _create_order_item(self, item, order, held_until=None):
         master_id = item['master_id']
         logger.info(f'Creating order_item for order={order.id}, '
                     f'master_id={master_id}')
@@ -113,14 +120,29 @@ class OrderCreateSerializer(serializers.Serializer):
         order_item = None
         start_time = None
 
+        # slots of all services and the extra one after them
+        # can't be booked by anyone else until the order is saved
+        end = TimeSlot.minutes(order.time) + TimeSlot.DURATION + sum(
+            service.max_duration for service in services)
+        slots = schedule.lock_slots(
+            order.time, TimeSlot.time_of(end)
+            if end < time_slot_utils.MINUTES_PER_DAY else None)
+
         for service in services:
             start_time = start_time or order.time
             next_slot_time = add_time(start_time, minutes=service.max_duration)
 
             # master's schedule could have changed after the search
             if not time_slot_utils.service_fits_into_slots(
-                    service, schedule.time_slots.all(),
-                    start_time, next_slot_time):
+                    service, slots, start_time, next_slot_time):
+                start = TimeSlot.minutes(start_time)
+                if any(slot.taken for slot in slots
+                       if start <= slot.start < start + service.max_duration):
+                    raise ApplicationError(
+                        'Unable to create order. '
+                        'The time has just been booked by someone else',
+                        error_type=ApplicationError.ErrorTypes.
+                            ORDER_SLOT_TAKEN)
                 raise ApplicationError(
                     'Unable to create order. '
                     'Master\'s schedule has changed ',
@@ -140,14 +162,15 @@ class OrderCreateSerializer(serializers.Serializer):
                         f'schedule_date={schedule.date}')
 
             start_time = schedule.assign_time(
-                start_time, next_slot_time, order_item)
+                start_time, next_slot_time, order_item, held_until=held_until)
 
         # add +1 if it's not end of the day
         if start_time:
             next_slot_time = add_time(start_time, minutes=TimeSlot.DURATION)
             schedule.assign_time(start_time,
                                  next_slot_time,
-                                 order_item=order_item)
+                                 order_item=order_item,
+                                 held_until=held_until)
 
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
@@ -11,7 +11,7 @@ from rest_framework.test import APITestCase
 
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.core import utils
-from src.apps.masters.models import Master, Schedule, TimeSlot, Time
+from src.apps.masters.models import Master, Schedule, TimeSlot
 from src.apps.orders.models import Order, PaymentType
 from src.apps.orders.views import OrderCancelView
 from src.utils.object_creation import make_everything, make_client, \
@@ -38,13 +38,13 @@ class MasterCancelOrderTestCase(APITestCase):
         schedule = Schedule.objects.create(master=vasya, date=timezone.now())
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+        TimeSlot.objects.create(start=12 * 60,
                                 taken=False, schedule=schedule)
 
         # PETYA works on 0th
@@ -52,13 +52,13 @@ class MasterCancelOrderTestCase(APITestCase):
                                            date=timezone.now())
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False, schedule=schedule)
 
         self.user = PhoneAuthUser.objects.create(phone='777')
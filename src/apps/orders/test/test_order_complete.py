@@ -9,7 +9,7 @@ from rest_framework.test import APITestCase
 
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.core import utils
-from src.apps.masters.models import Master, Schedule, TimeSlot, Time
+from src.apps.masters.models import Master, Schedule, TimeSlot
 from src.apps.orders.models import OrderStatus, Order, CloudPaymentsTransaction, \
     OrderItem, PaymentType
 from src.apps.orders.views import CompleteOrderView
@@ -101,11 +101,11 @@ class CompleteOrderTestCase(APITestCase):
                                            date=date)
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=True, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
 
         vasya = Master.objects.get(first_name='VASYA')
@@ -1,6 +1,10 @@
 import datetime
+import threading
+from io import StringIO
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.reverse import reverse
@@ -9,7 +13,8 @@ from rest_framework.test import APIClient
 from src.apps.authentication.models import PhoneAuthUser, Token
 from src.apps.categories.models import ServiceCategory
 from src.apps.core import utils
-from src.apps.masters.models import Master, TimeSlot, Time, Schedule
+from src.apps.core.exceptions import ApplicationError
+from src.apps.masters.models import Master, TimeSlot, Schedule
 from src.apps.orders.models import Order
 from src.apps.orders.views import OrderListCreateView
 from src.utils.object_creation import make_everything, make_master, make_client
@@ -45,7 +50,7 @@ class OrderCreateTestCase(TestCase):
 
         # assert timeslots are correctly set
         slots = schedule.time_slots.filter(
-            time__value__in=['11:00', '11:30', '12:00'], taken=True)
+            start__in=[11 * 60, 11 * 60 + 30, 12 * 60], taken=True)
         self.assertEqual(len(slots), 3)
 
         # assert order is created
@@ -88,7 +93,7 @@ class OrderCreateTestCase(TestCase):
 
         # assert timeslots are correctly set
         slots = schedule.time_slots.filter(
-            time__value__in=['11:00', '11:30', '12:00'], taken=True)
+            start__in=[11 * 60, 11 * 60 + 30, 12 * 60], taken=True)
         self.assertEqual(len(slots), 3)
 
         # assert order is created
@@ -115,9 +120,9 @@ class OrderCreateTestCase(TestCase):
     def test_create_order__one_master_many_services(self):
         master = Master.objects.get(first_name='VASYA')
         schedule = master.get_schedule(utils.get_date(1))
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+        TimeSlot.objects.create(start=13 * 60,
                                 taken=False, schedule=schedule)
         services = master.services.all()
         # two services, 5 slots, no+1
@@ -136,10 +141,9 @@ class OrderCreateTestCase(TestCase):
         master = Master.objects.get(first_name='VASYA')
         schedule = master.schedule.get(date=target_date)
         # assert timeslots are correctly set
-        slots = schedule.time_slots.filter(time__value__in=['11:00', '11:30',
-                                                            '12:00', '12:30',
-                                                            '13:00'],
-                                           taken=True)
+        slots = schedule.time_slots.filter(
+            start__in=[11 * 60, 11 * 60 + 30, 12 * 60, 12 * 60 + 30, 13 * 60],
+            taken=True)
         self.assertEqual(len(slots), 5)
         # assert order is created
         orders = Order.objects.all()
@@ -160,9 +164,9 @@ class OrderCreateTestCase(TestCase):
     def test_create_order__one_master_many_services_does_not_fit(self):
         master = Master.objects.get(first_name='VASYA')
         schedule = master.get_schedule(utils.get_date(1))
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=True, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+        TimeSlot.objects.create(start=13 * 60,
                                 taken=False, schedule=schedule)
         services = master.services.all()
         # two services, 5 slots, no+1
@@ -196,11 +200,11 @@ class OrderCreateTestCase(TestCase):
         schedule = Schedule.objects.create(master=sanya, date=target_date)
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+        TimeSlot.objects.create(start=10 * 60 + 30,
                                 taken=True, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+        TimeSlot.objects.create(start=11 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+        TimeSlot.objects.create(start=11 * 60 + 30,
                                 taken=False, schedule=schedule)
 
         # two services, 2+1 for vasya, 2 for sanya
@@ -226,15 +230,14 @@ class OrderCreateTestCase(TestCase):
         vasya = Master.objects.get(first_name='VASYA')
         schedule = vasya.schedule.get(date=target_date)
         # assert timeslots are correctly set
-        slots = schedule.time_slots.filter(time__value__in=['11:00', '11:30',
-                                                            '12:00'],
-                                           taken=True)
+        slots = schedule.time_slots.filter(
+            start__in=[11 * 60, 11 * 60 + 30, 12 * 60], taken=True)
         self.assertEqual(len(slots), 3)
 
         sanya = Master.objects.get(first_name='SANYA')
         schedule = sanya.schedule.get(date=target_date)
         # assert timeslots are correctly set
-        slots = schedule.time_slots.filter(time__value__in=['11:00', '11:30'],
+        slots = schedule.time_slots.filter(start__in=[11 * 60, 11 * 60 + 30],
                                            taken=True)
         self.assertEqual(len(slots), 2)
 
@@ -263,3 +266,95 @@ class OrderCreateTestCase(TestCase):
         self.assertEqual(sanya.balance.future,
                          sanya.services.first().masters_share(
                              self.client_object.tip_multiplier()))
+
+    def test_create_order__slot_taken(self):
+        master = Master.objects.get(first_name='VASYA')
+        service = master.services.first()
+        target_date = utils.get_date(1)
+        # someone has just booked 11:30
+        master.get_schedule(target_date).time_slots.filter(
+            start=11 * 60 + 30).update(taken=True)
+        resp = self.client.post(reverse(OrderListCreateView.view_name), data={
+            'date': target_date,
+            'payment_type': 'CARD',
+            'time': '11:00',
+            'order_items': [{
+                'locked': False,
+                'master_id': master.id,
+                'service_ids': [service.id]
+            }, ]
+        }, format='json')
+        self.assertEqual(resp.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.data['error_code'],
+                         ApplicationError.ErrorTypes.ORDER_SLOT_TAKEN.value)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+@override_settings(BOOKING_LOCK_RETRY_DELAY_SECONDS=0.01)
+class OrderCreateConcurrencyTestCase(TransactionTestCase):
+    def setUp(self):
+        make_everything()
+        self.client_object = make_client()
+        token, _ = Token.objects.get_or_create(client=self.client_object)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_create_order__slots_locked(self):
+        master = Master.objects.get(first_name='VASYA')
+        service = master.services.first()
+        target_date = utils.get_date(1)
+        schedule = master.get_schedule(target_date)
+
+        locked = threading.Event()
+        release = threading.Event()
+
+        def book_concurrently():
+            # another order is holding the slot at 11:30
+            try:
+                with transaction.atomic():
+                    list(schedule.time_slots.select_for_update().filter(
+                        start=11 * 60 + 30))
+                    locked.set()
+                    release.wait(timeout=10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=book_concurrently)
+        thread.start()
+        try:
+            locked.wait(timeout=10)
+            resp = self.client.post(
+                reverse(OrderListCreateView.view_name), data={
+                    'date': target_date,
+                    'payment_type': 'CARD',
+                    'time': '11:00',
+                    'order_items': [{
+                        'locked': False,
+                        'master_id': master.id,
+                        'service_ids': [service.id]
+                    }, ]
+                }, format='json')
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(resp.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.data['error_code'],
+                         ApplicationError.ErrorTypes.ORDER_SLOT_TAKEN.value)
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertFalse(schedule.time_slots.filter(taken=True,
+                                                    start__gte=11 * 60)
+                         .exists())
+
+    def test_benchmark_booking(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('benchmark_booking', threads=6, times=2,
+                     stdout=stdout, stderr=stderr)
+        self.assertIn('OK: 2 orders, no double bookings', stdout.getvalue())
+        self.assertEqual(stderr.getvalue(), '')
+        # temporary objects are deleted
+        self.assertFalse(Master.objects.filter(
+            first_name='BENCHMARK').exists())
+        self.assertEqual(Order.objects.count(), 0)
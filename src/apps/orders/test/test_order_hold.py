@@ -0,0 +1,165 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from src.apps.authentication.models import PhoneAuthUser, Token
+from src.apps.core import utils
+from src.apps.core.exceptions import ApplicationError
+from src.apps.masters.models import Master, DayAvailability
+from src.apps.orders import order_utils
+from src.apps.orders.models import Order, CloudPaymentsTransaction, \
+    CPTransactionStatus
+from src.apps.orders.views import OrderListCreateView
+from src.apps.orders.views_payment import PayForOrderView, FinishS3DView
+from src.utils.object_creation import make_everything, make_client
+
+
+# availability of booked slots is refreshed after commits
+class OrderHoldTestCase(TransactionTestCase):
+    def setUp(self):
+        make_everything()
+        self.user = PhoneAuthUser.objects.create(phone='777')
+        self.client_object = make_client(self.user)
+        token, _ = Token.objects.get_or_create(client=self.client_object)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.master = Master.objects.get(first_name='VASYA')
+        self.target_date = utils.get_date(1)
+        self.schedule = self.master.get_schedule(self.target_date)
+
+    def _create_order(self, payment_type):
+        resp = self.client.post(reverse(OrderListCreateView.view_name), data={
+            'date': self.target_date,
+            'payment_type': payment_type,
+            'time': '11:00',
+            'order_items': [{
+                'locked': False,
+                'master_id': self.master.id,
+                'service_ids': [self.master.services.first().id]
+            }, ]
+        }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return Order.objects.get(pk=resp.data['id'])
+
+    def _expire(self, order):
+        self.schedule.time_slots.filter(order_item__order=order).update(
+            held_until=timezone.now() - datetime.timedelta(minutes=1))
+
+    def test_card_order_is_held(self):
+        order = self._create_order('CARD')
+        slots = self.schedule.time_slots.filter(order_item__order=order)
+        self.assertEqual(len(slots), 3)
+        for slot in slots:
+            self.assertTrue(slot.taken)
+            self.assertGreater(slot.held_until, timezone.now())
+
+        # the payment confirms the hold
+        order.activate()
+        self.assertFalse(self.schedule.time_slots.filter(
+            held_until__isnull=False).exists())
+
+    def test_cash_order_is_not_held(self):
+        order = self._create_order('CASH')
+        self.assertEqual(order.status, 'ACTIVATED')
+        self.assertFalse(self.schedule.time_slots.filter(
+            held_until__isnull=False).exists())
+
+    def test_release_expired_holds(self):
+        order = self._create_order('CARD')
+        # held slots are not available
+        availability = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(availability.free_mask, 0)
+        self._expire(order)
+
+        stdout = StringIO()
+        call_command('release_expired_holds', stdout=stdout)
+        self.assertIn('Released 3 time slots', stdout.getvalue())
+
+        self.assertFalse(Order.objects.filter(pk=order.id).exists())
+        # 10:30 is taken by someone else
+        self.assertEqual(list(self.schedule.time_slots.filter(taken=False)
+                              .values_list('start', flat=True)
+                              .order_by('start')),
+                         [11 * 60, 11 * 60 + 30, 12 * 60])
+        availability = DayAvailability.objects.get(schedule=self.schedule)
+        self.assertEqual(availability.free_mask, 0b1110 << 21)
+        master = Master.objects.get(pk=self.master.id)
+        self.assertEqual(master.balance.future, 0)
+
+        # nothing to release
+        call_command('release_expired_holds', stdout=stdout)
+        self.assertIn('Released 0 time slots', stdout.getvalue())
+
+    def test_pay_for_expired_order(self):
+        order = self._create_order('CARD')
+        self._expire(order)
+        card = self.client_object.payment_cards.first()
+        resp = self.client.post(
+            reverse(PayForOrderView.view_name, args=[order.id]),
+            data={'card_id': card.id}, format='json')
+        self.assertEqual(resp.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.data['error_code'],
+                         ApplicationError.ErrorTypes.ORDER_HOLD_EXPIRED.value)
+
+    def test_extend_hold(self):
+        order = self._create_order('CARD')
+        slots = self.schedule.time_slots.filter(order_item__order=order)
+        slots.update(held_until=timezone.now() + datetime.timedelta(seconds=1))
+        self.assertTrue(order_utils.extend_hold(order))
+        for slot in slots:
+            self.assertGreater(slot.held_until,
+                               timezone.now() + datetime.timedelta(minutes=1))
+
+    def test_extend_hold_after_release(self):
+        order = self._create_order('CARD')
+        self._expire(order)
+        # the hold expires and is released right before the payment
+        order_utils.release_expired_holds()
+        self.assertFalse(order_utils.extend_hold(order))
+        self.assertFalse(self.schedule.time_slots.filter(
+            held_until__isnull=False).exists())
+
+    @mock.patch('src.apps.orders.cloudpayments.client'
+                '.finish_3d_secure_authentication')
+    def test_finish_s3d_after_expiry(self, finish_mock):
+        order = self._create_order('CARD')
+        self._expire(order)
+        url = reverse(FinishS3DView.view_name)
+        resp = self.client.post(f'{url}?order_id={order.id}',
+                                data='MD=100500&PaRes=smth',
+                                content_type='application/'
+                                             'x-www-form-urlencoded')
+        self.assertEqual(resp.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.data['error_code'],
+                         ApplicationError.ErrorTypes.ORDER_HOLD_EXPIRED.value)
+
+        # the order is gone
+        order_utils.release_expired_holds()
+        resp = self.client.post(f'{url}?order_id={order.id}',
+                                data='MD=100500&PaRes=smth',
+                                content_type='application/'
+                                             'x-www-form-urlencoded')
+        self.assertEqual(resp.data['error_code'],
+                         ApplicationError.ErrorTypes.ORDER_HOLD_EXPIRED.value)
+        # the card is not charged
+        finish_mock.assert_not_called()
+
+    def test_paid_order_is_not_released(self):
+        order = self._create_order('CARD')
+        order.transaction = CloudPaymentsTransaction.objects.create(
+            transaction_id=100500, transaction_info={},
+            status=CPTransactionStatus.FINISHED)
+        order.save()
+        self._expire(order)
+
+        self.assertEqual(order_utils.release_expired_holds(), 0)
+        self.assertTrue(Order.objects.filter(pk=order.id).exists())
@@ -33,17 +33,17 @@ class ListOrderTestCase(APITestCase):
                                            date=timezone.now() + delta(days=2))
         schedule.save()
 
-        TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+        TimeSlot.objects.create(start=12 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+        TimeSlot.objects.create(start=13 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=30),
+        TimeSlot.objects.create(start=13 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=14, minute=00),
+        TimeSlot.objects.create(start=14 * 60,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=14, minute=30),
+        TimeSlot.objects.create(start=14 * 60 + 30,
                                 taken=False, schedule=schedule)
-        TimeSlot.objects.create(time=Time.objects.create(hour=15, minute=00),
+        TimeSlot.objects.create(start=15 * 60,
                                 taken=False, schedule=schedule)
         service = master.services.all()[0]
         # manually creating an order
@@ -6,8 +6,9 @@ from rest_framework.reverse import reverse
 
 from src.apps.clients.models import PaymentCard
 from src.apps.core import utils as core_utils
+from src.apps.core.exceptions import ApplicationError
 from src.apps.core.permissions import IsClient
-from . import cloudpayments
+from . import cloudpayments, order_utils
 from .models import Order, CloudPaymentsTransaction, CPTransactionStatus
 from .serializers import OrderListSerializer, CloudPaymentsTransactionSerializer
 
@@ -21,6 +22,8 @@ class PayForOrderView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         """
         Charges the card `card_id` for the price of the order.
+        Time slots of the order are held for a limited time after
+        its creation and are released if it's not paid for.
 
         IP address is required by the CloudPayments API
 
@@ -62,6 +65,12 @@ class PayForOrderView(generics.GenericAPIView):
         card = PaymentCard.objects.get(pk=card_id)
         if card not in request.user.client.payment_cards.all():
             raise ValidationError('Trying to use someone else\'s card')
+        # the time slots must stay held till the end of the payment
+        if not order_utils.extend_hold(order):
+            raise ApplicationError(
+                'Unable to pay for the order. '
+                'The time reserved for the payment has expired',
+                error_type=ApplicationError.ErrorTypes.ORDER_HOLD_EXPIRED)
         s3d_url = request.build_absolute_uri(reverse(FinishS3DView.view_name))
         return cloudpayments.process_payment(card, order, ip_address,
                                              s3d_url)
@@ -141,7 +150,14 @@ class FinishS3DView(generics.GenericAPIView):
         pa_res = self.request.data['PaRes']
         order_id = self.request.query_params['order_id']
 
-        order = Order.objects.get(pk=order_id)
+        # the authorization is not finished once the slots are released,
+        # so the card is never charged for an order that is gone
+        order = Order.objects.filter(pk=order_id).first()
+        if order is None or not order_utils.extend_hold(order):
+            raise ApplicationError(
+                'Unable to finish the payment. '
+                'The time reserved for the payment has expired',
+                error_type=ApplicationError.ErrorTypes.ORDER_HOLD_EXPIRED)
         order = cloudpayments.finish_s3d(order, transaction_id, pa_res)
 
         # because mobile developers refused to call an endpoint
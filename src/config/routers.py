@@ -0,0 +1,33 @@
+from django.conf import settings
+
+# a connection of its own, which is not a part of request transactions
+CACHE_DATABASE = 'cache'
+CACHE_APP_LABEL = 'django_cache'
+
+
+class CacheRouter:
+    """
+    Sends queries of the database cache to the `cache` connection
+    if it's configured, so that cache writes don't lock rows
+    till the end of a request
+    """
+
+    def _is_routed(self, app_label):
+        return app_label == CACHE_APP_LABEL and \
+               CACHE_DATABASE in settings.DATABASES
+
+    def db_for_read(self, model, **hints):
+        if self._is_routed(model._meta.app_label):
+            return CACHE_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if CACHE_DATABASE not in settings.DATABASES:
+            return None
+        if app_label == CACHE_APP_LABEL:
+            return db == CACHE_DATABASE
+        # the same database, models are migrated through `default`
+        return db != CACHE_DATABASE
@@ -66,9 +66,29 @@ CLOUDPAYMENTS_API_SECRET = get_env_variable('CLOUDPAYMENTS_API_SECRET')
 ORDER_CANCELLATION_WINDOW_HOURS = 3
 ORDER_START_WINDOW_MINUTES = 60
 MAX_DISTANCE_KM = 20.0
+# search results are also dropped on any schedule, order or master change
+SEARCH_CACHE_TIMEOUT_SECONDS = 60
+# parts of master profiles are dropped on any change to them
+DETAIL_CACHE_TIMEOUT_SECONDS = 60 * 10
+# time slots which are being booked by another order are waited for
+# a couple of times before the order fails
+BOOKING_LOCK_RETRIES = 2
+BOOKING_LOCK_RETRY_DELAY_SECONDS = 0.05
+# time slots of an order paid by card are held for that long,
+# the payment prolongs the hold, expired ones are released by the
+# `release_expired_holds` command, which should be run every minute
+ORDER_PAYMENT_HOLD_MINUTES = 15
 USE_GMAPS_API = get_env_variable('USE_GMAPS_API', default=False,
                                  raise_exception=False,
                                  type=bool_)
+# travel times returned by the Google Maps API
+USE_ETA_CACHE = True
+ETA_CACHE_TIMEOUT_SECONDS = 60 * 60 * 24
+ETA_CACHE_LRU_SIZE = 4096
+# gmaps is called only when the local estimate of the travel time
+# is within the band around the slot duration, e.g. 30 +- 50% minutes
+USE_TRAVEL_ESTIMATOR = True
+TRAVEL_ESTIMATE_BAND = 0.5
 
 ENABLE_SMS_CONFIRMATION = get_env_variable('ENABLE_SMS_CONFIRMATION',
                                            default=False,
@@ -181,6 +201,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# the table is created by `manage.py createcachetable --database cache`,
+# cached data is culled by key order when the table is full,
+# versions of cached data are kept in `masters.CacheVersion`
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+DATABASE_ROUTERS = ['src.config.routers.CacheRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -19,3 +19,6 @@ DATABASES = {
         'ATOMIC_REQUESTS': True
     }
 }
+
+# the same database, but cache writes are committed immediately
+DATABASES['cache'] = dict(DATABASES['default'], ATOMIC_REQUESTS=False)
@@ -3,6 +3,9 @@ from .base import *
 DEBUG = True
 
 USE_GMAPS_API = True
+# gmaps calls are mocked differently in each test
+USE_ETA_CACHE = False
+USE_TRAVEL_ESTIMATOR = False
 MAX_DISTANCE_KM = 10 ** 6
 
 DATABASES = {
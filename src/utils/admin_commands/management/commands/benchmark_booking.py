@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta as delta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from src.apps.authentication.models import PhoneAuthUser
+from src.apps.clients.models import Address
+from src.apps.core.exceptions import ApplicationError
+from src.apps.core.models import Location
+from src.apps.masters.models import Schedule, TimeSlot
+from src.apps.orders.models import Order, OrderItem
+from src.apps.orders.serializers import OrderCreateSerializer
+from src.utils.object_creation import make_category, make_client, make_master
+
+
+class Command(BaseCommand):
+    help = 'Books the same master from parallel threads and reports ' \
+           'throughput and double bookings. Creates a temporary master ' \
+           'and clients in the database and deletes them afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20,
+                            help='Number of parallel bookings')
+        parser.add_argument('--times', type=int, default=4,
+                            help='Number of distinct times the bookings '
+                                 'are spread over')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        master, service, clients = self._make_fixtures(threads)
+        # non overlapping orders, including the extra slot after each
+        step = service.max_duration + TimeSlot.DURATION
+        times = [8 * 60 + i * step for i in range(options['times'])]
+        date = timezone.now().date() + delta(days=1)
+
+        try:
+            outcomes = []
+            barrier = threading.Barrier(threads)
+            workers = [threading.Thread(
+                target=self._book,
+                args=(barrier, outcomes, client, master, service, date,
+                      TimeSlot.time_of(times[i % len(times)])))
+                for i, client in enumerate(clients)]
+            started = time.monotonic()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(f'{threads} bookings in {elapsed:.2f} s, '
+                              f'{threads / elapsed:.1f} bookings/s')
+            for outcome, count in sorted(Counter(outcomes).items()):
+                self.stdout.write(f'  {outcome}: {count}')
+            self._check(master, service, outcomes, min(threads, len(times)))
+        finally:
+            self._cleanup(master, clients, service)
+
+    def _make_fixtures(self, threads):
+        master = make_master('BENCHMARK', make_portfolio=False)
+        service = make_category('Benchmark').services.first()
+        master.services.add(service)
+        schedule = Schedule.objects.create(
+            master=master, date=timezone.now().date() + delta(days=1))
+        TimeSlot.objects.bulk_create(
+            TimeSlot(schedule=schedule, start=start, taken=False)
+            for start in range(8 * 60, 22 * 60, TimeSlot.DURATION))
+        clients = [make_client(first_name=f'client{i}', make_card=False)
+                   for i in range(threads)]
+        return master, service, clients
+
+    def _book(self, barrier, outcomes, client, master, service, date,
+              order_time):
+        serializer = OrderCreateSerializer(data={
+            'date': date,
+            'time': order_time.strftime('%H:%M'),
+            'payment_type': 'CARD',
+            'order_items': [{
+                'locked': False,
+                'master_id': master.id,
+                'service_ids': [service.id]
+            }]
+        }, context={'request': SimpleNamespace(user=client.user)})
+        barrier.wait()
+        try:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            outcomes.append('booked')
+        except ApplicationError as error:
+            outcomes.append(ApplicationError.ErrorTypes(error.error_code).name)
+        except Exception as error:
+            outcomes.append(type(error).__name__)
+        finally:
+            connection.close()
+
+    def _check(self, master, service, outcomes, expected):
+        booked = outcomes.count('booked')
+        slots_per_order = service.max_duration // TimeSlot.DURATION + 1
+        taken = TimeSlot.objects.filter(schedule__master=master, taken=True)
+        owners = Counter(taken.values_list('order_item_id', flat=True))
+        items = OrderItem.objects.filter(master=master).count()
+
+        correct = (booked == expected == items and
+                   len(owners) == items and
+                   all(count == slots_per_order
+                       for count in owners.values()))
+        if correct:
+            self.stdout.write(f'OK: {booked} orders, no double bookings')
+        else:
+            self.stderr.write(f'FAILED: {booked} orders booked, '
+                              f'{expected} expected, {items} order items, '
+                              f'slots per order item {dict(owners)}')
+
+    def _cleanup(self, master, clients, service):
+        location_ids = [master.location_id] + list(
+            Address.objects.filter(client__in=clients)
+            .values_list('location_id', flat=True))
+        Order.objects.filter(client__in=clients).delete()
+        PhoneAuthUser.objects.filter(
+            pk__in=[master.user_id] + [client.user_id for client in clients]
+        ).delete()
+        Location.objects.filter(pk__in=location_ids).delete()
+        service.category.delete()
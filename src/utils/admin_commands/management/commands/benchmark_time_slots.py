@@ -0,0 +1,111 @@
+import datetime
+import time
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from src.apps.masters import time_slot_utils
+from src.apps.masters.models import TimeSlot
+
+SLOTS_STRING = '08:00-12:30,13:00,14:00-19:30,21:00'
+
+
+# implementations based on `datetime` and `strptime`,
+# which time_slot_utils used before switching to minutes after midnight
+def _legacy_add_time(source_time, **kwargs):
+    if isinstance(source_time, datetime.datetime):
+        source_time = source_time.time()
+    source_time = datetime.datetime.combine(timezone.now().date(), source_time)
+    return (source_time + datetime.timedelta(**kwargs)).time()
+
+
+def _legacy_get_time(_time):
+    return datetime.time(hour=_time.tm_hour, minute=_time.tm_min)
+
+
+def _legacy_get_times(start_time_s, end_time_s, include_last=False):
+    result = []
+    end_time = _legacy_get_time(time.strptime(end_time_s, '%H:%M'))
+    current_time = _legacy_get_time(time.strptime(start_time_s, '%H:%M'))
+    while current_time != end_time:
+        result.append(time_slot_utils.TimeTuple(hour=current_time.hour,
+                                                minute=current_time.minute))
+        current_time = _legacy_add_time(current_time,
+                                        minutes=TimeSlot.DURATION)
+    if include_last:
+        result.append(time_slot_utils.TimeTuple(hour=current_time.hour,
+                                                minute=current_time.minute))
+    return result
+
+
+def _legacy_parse_time_slots(slots_string, include_last=False):
+    result = set()
+    for piece in slots_string.split(','):
+        times = [time_piece.strip() for time_piece in piece.strip().split('-')]
+        if len(times) == 2:
+            times = _legacy_get_times(times[0], times[1],
+                                      include_last=include_last)
+        elif len(times) == 1:
+            times = _legacy_get_times(times[0], times[0], include_last=True)
+        for time_object in times:
+            result.add(time_object)
+    return result
+
+
+def _legacy_split_slots(slots):
+    groups = []
+    group = []
+    if not slots:
+        return []
+    last_group_time = datetime.datetime.combine(timezone.now().date(),
+                                                slots[0].value)
+    for i in range(0, len(slots)):
+        source_time = datetime.datetime.combine(timezone.now().date(),
+                                                slots[i].value)
+        if source_time - last_group_time > datetime.timedelta(
+                minutes=TimeSlot.DURATION):
+            groups.append(group)
+            group = []
+        group.append(slots[i])
+        last_group_time = source_time
+    if group:
+        groups.append(group)
+    return groups
+
+
+class Command(BaseCommand):
+    help = 'Compares the speed of time slot helpers with their ' \
+           'datetime based implementations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000,
+                            help='Number of calls of each function')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        slots = [TimeSlot(start=start, taken=False)
+                 for start in sorted(time_slot_utils.parse_slot_starts(
+                     SLOTS_STRING, include_last=True))]
+        start_time = datetime.time(hour=10, minute=30)
+
+        cases = (
+            ('add_time',
+             lambda: _legacy_add_time(start_time, minutes=90),
+             lambda: time_slot_utils.add_time(start_time, minutes=90)),
+            ('parse_time_slots',
+             lambda: _legacy_parse_time_slots(SLOTS_STRING, True),
+             lambda: time_slot_utils.parse_time_slots(SLOTS_STRING, True)),
+            ('split_slots',
+             lambda: _legacy_split_slots(slots),
+             lambda: time_slot_utils.split_slots(slots)),
+        )
+        for name, legacy, current in cases:
+            if legacy() != current():
+                self.stderr.write(f'{name}: results differ')
+            legacy_time = timeit.timeit(legacy, number=number)
+            current_time = timeit.timeit(current, number=number)
+            self.stdout.write(
+                f'{name}: {legacy_time * 10 ** 6 / number:.2f} us -> '
+                f'{current_time * 10 ** 6 / number:.2f} us per call, '
+                f'x{legacy_time / current_time:.1f}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from src.apps.masters import schedule_templates
+from src.apps.masters.utils import get_default_date_range
+
+
+class Command(BaseCommand):
+    help = 'Creates schedules out of weekly templates of all masters ' \
+           'for the following days. Meant to be run every night'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14,
+                            help='Number of days after today to create '
+                                 'schedules for')
+
+    def handle(self, *args, **options):
+        date_range = get_default_date_range(options['days'])
+        expanded = schedule_templates.expand(date_range=date_range)
+        self.stdout.write(f'Expanded {expanded} schedules between '
+                          f'{date_range[0]} and {date_range[1]}')
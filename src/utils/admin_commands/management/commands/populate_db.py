@@ -42,32 +42,32 @@ def _make_everything():
     schedule = Schedule.objects.create(master=vasya, date=utils.get_date(1))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+    TimeSlot.objects.create(start=11 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+    TimeSlot.objects.create(start=11 * 60 + 30,
                             taken=False, schedule=schedule)
 
     schedule = Schedule.objects.create(master=vasya, date=utils.get_date(2))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+    TimeSlot.objects.create(start=10 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+    TimeSlot.objects.create(start=11 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+    TimeSlot.objects.create(start=11 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+    TimeSlot.objects.create(start=12 * 60,
                             taken=False, schedule=schedule)
 
     schedule = Schedule.objects.create(master=vasya,
                                        date=utils.get_date(3))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+    TimeSlot.objects.create(start=12 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+    TimeSlot.objects.create(start=13 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=30),
+    TimeSlot.objects.create(start=13 * 60 + 30,
                             taken=False, schedule=schedule)
 
     # PETYA works on +2th, +3th does pedicure, got all slots on +2, none on +3
@@ -75,13 +75,13 @@ def _make_everything():
                                        date=utils.get_date(2))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+    TimeSlot.objects.create(start=10 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+    TimeSlot.objects.create(start=11 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+    TimeSlot.objects.create(start=11 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+    TimeSlot.objects.create(start=12 * 60 + 30,
                             taken=False, schedule=schedule)
 
     schedule = Schedule.objects.create(master=petya,
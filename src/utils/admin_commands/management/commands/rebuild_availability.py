@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from src.apps.masters import availability
+from src.apps.masters.models import Schedule
+
+
+class Command(BaseCommand):
+    help = 'Recomputes availability of every schedule from its time slots'
+
+    def handle(self, *args, **options):
+        schedule_ids = list(Schedule.objects.values_list('id', flat=True))
+        with transaction.atomic():
+            for schedule_id in schedule_ids:
+                availability.refresh_schedule(schedule_id)
+        self.stdout.write(f'Rebuilt availability of '
+                          f'{len(schedule_ids)} schedules')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from src.apps.masters import detail_cache
+from src.apps.masters.models import Feedback, Master
+
+
+class Command(BaseCommand):
+    help = 'Recomputes rating aggregates of masters from their feedback'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Number of masters locked at once')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        repaired = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # feedback is counted after the masters are locked,
+                # so `add_rating` of a new one waits and adds to the result
+                masters = list(Master.objects.select_for_update()
+                               .filter(id__gt=last_id).order_by('id')
+                               .values_list('id', 'rating_sum',
+                                            'rating_count')[:chunk_size])
+                if not masters:
+                    break
+                last_id = masters[-1][0]
+                aggregates = {
+                    master_id: (rating_sum, rating_count)
+                    for master_id, rating_sum, rating_count in
+                    Feedback.objects.filter(
+                        master_id__in=[master[0] for master in masters])
+                    .values('master_id')
+                    .annotate(Sum('rating'), Count('id'))
+                    .values_list('master_id', 'rating__sum', 'id__count')
+                }
+                for master_id, rating_sum, rating_count in masters:
+                    new_sum, new_count = aggregates.get(master_id, (0.0, 0))
+                    if (new_sum, new_count) == (rating_sum, rating_count):
+                        continue
+                    Master.objects.filter(pk=master_id).update(
+                        rating_sum=new_sum, rating_count=new_count,
+                        rating=new_count and new_sum / new_count)
+                    detail_cache.invalidate(master_id, detail_cache.PROFILE)
+                    repaired += 1
+        self.stdout.write(f'Recomputed ratings of {repaired} masters')
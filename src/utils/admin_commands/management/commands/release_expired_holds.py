@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from src.apps.orders import order_utils
+
+
+class Command(BaseCommand):
+    help = 'Releases time slots of unpaid orders whose hold has expired. ' \
+           'Meant to be run every minute'
+
+    def handle(self, *args, **options):
+        released = order_utils.release_expired_holds()
+        self.stdout.write(f'Released {released} time slots')
@@ -151,24 +151,24 @@ def make_everything():
                                                           + delta(days=1))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+    TimeSlot.objects.create(start=10 * 60 + 30,
                             taken=True, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+    TimeSlot.objects.create(start=11 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+    TimeSlot.objects.create(start=11 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=00),
+    TimeSlot.objects.create(start=12 * 60,
                             taken=False, schedule=schedule)
 
     schedule = Schedule.objects.create(master=vasya,
                                        date=timezone.now() + delta(days=2))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+    TimeSlot.objects.create(start=12 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=00),
+    TimeSlot.objects.create(start=13 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=13, minute=30),
+    TimeSlot.objects.create(start=13 * 60 + 30,
                             taken=False, schedule=schedule)
 
     # PETYA works on +2th, +3th does pedicure, got all slots on +2, none on +3
@@ -176,20 +176,20 @@ def make_everything():
                                        date=timezone.now() + delta(days=3))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=10, minute=30),
+    TimeSlot.objects.create(start=10 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=00),
+    TimeSlot.objects.create(start=11 * 60,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=11, minute=30),
+    TimeSlot.objects.create(start=11 * 60 + 30,
                             taken=False, schedule=schedule)
-    TimeSlot.objects.create(time=Time.objects.create(hour=12, minute=30),
+    TimeSlot.objects.create(start=12 * 60 + 30,
                             taken=True, schedule=schedule)
 
     schedule = Schedule.objects.create(master=petya,
                                        date=timezone.now() + delta(days=4))
     schedule.save()
 
-    TimeSlot.objects.create(time=Time.objects.create(hour=16, minute=30),
+    TimeSlot.objects.create(start=16 * 60 + 30,
                             taken=False, schedule=schedule)
 
 
@@ -235,8 +235,3 @@ def make_order_services(client, services, master, order_time,
         slot.save()
         order_time += delta(minutes=TimeSlot.DURATION)
     return order
-
-
-def _make_time(hour: int, minute: int) -> Time:
-    return Time(hour=hour, minute=minute,
-                value=time(hour=hour, minute=minute))